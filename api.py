@@ -0,0 +1,222 @@
+"""
+This is a module with a local HTTP API of a running scanner so other tools can get what it found without requesting game servers:
+    GET  /scan              <-  matched players on servers of the latest cycle;
+    GET  /names             <-  inverted index of tracked names to where they are (servers, player names, scores, durations);
+    GET  /names/{name}      <-  where a tracked name or a player name is;
+    GET  /health            <-  stats of the latest cycle;
+    GET  /exclusions        <-  runtime exclusions (see exclusions.py);
+    POST /exclusions        <-  adds an exclusion, body is {"address": "1.1.1.1:1" or "__all__", "name": "name" or "__all__"};
+    DELETE /exclusions      <-  removes an exclusion, body is the same as it was added with.
+
+Async server parser's event loop only exists while a cycle runs (asyncio.run) so the API has its own loop in a daemon thread.
+The main thread publishes a LiveState after every cycle by swapping the reference, so requests always see a whole cycle.
+"""
+
+import asyncio
+from threading import Event, Thread
+from time import time
+from typing import Any, Iterable, NamedTuple, Optional
+
+from aiohttp import web
+
+from exclusions import ALL, ExclusionIndex
+from helpers import CONFIG, validate_address
+from scan_results import ServerScan
+
+
+API_ENABLED = CONFIG['API']['ENABLED']
+API_HOST = CONFIG['API']['HOST']    # keep it 127.0.0.1 unless you want others to be able to add exclusions
+API_PORT = CONFIG['API']['PORT']
+
+
+class LiveState(NamedTuple):
+    servers: dict[str, dict[str, Any]]          # Server names to their scans (see ServerScan.as_dict)
+    names_index: dict[str, list[dict[str, Any]]]    # Tracked names to where they are
+    player_names_index: dict[str, list[dict[str, Any]]]     # Player names to where they are
+    health: dict[str, Any]
+
+
+def get_live_state(server_scans: Iterable[ServerScan], health: dict[str, Any]) -> LiveState:
+    """
+    Builds the state of a cycle with inverted indexes of names to their locations.
+    """
+    servers, names_index, player_names_index = {}, {}, {}
+    for server_scan in server_scans:
+        servers[server_scan.server_name] = server_scan.as_dict()
+        for player_record in server_scan:
+            location = {'server_name': server_scan.server_name, 'address': server_scan.address, 'scan_time': server_scan.scan_time,
+                        **player_record.as_dict()}
+            names_index.setdefault(player_record.name, []).append(location)
+            player_names_index.setdefault(player_record.player_name, []).append(location)
+    return LiveState(servers, names_index, player_names_index, {'published_at': time(), **health})
+
+
+class ApiServer:
+    exclusion_index: ExclusionIndex
+    host: str
+    port: int
+    state: LiveState                # Replaced whole after every cycle
+    _loop: Optional[asyncio.AbstractEventLoop]
+    _thread: Optional[Thread]
+
+    def __init__(self, exclusion_index: ExclusionIndex, host=API_HOST, port=API_PORT):
+        self.exclusion_index = exclusion_index
+        self.host = host
+        self.port = port
+        self.state = LiveState({}, {}, {}, {'cycle': 0})
+        self._loop = None
+        self._thread = None
+
+    def publish(self, state: LiveState):
+        self.state = state
+
+    async def get_scan(self, request: web.Request) -> web.Response:
+        return web.json_response(self.state.servers)
+
+    async def get_names(self, request: web.Request) -> web.Response:
+        return web.json_response(self.state.names_index)
+
+    async def get_name(self, request: web.Request) -> web.Response:
+        state, name = self.state, request.match_info['name']
+        locations = state.names_index.get(name) or state.player_names_index.get(name)
+        if locations is None:
+            raise web.HTTPNotFound(text=f'{name} is not on any server')
+        return web.json_response(locations)
+
+    async def get_health(self, request: web.Request) -> web.Response:
+        return web.json_response(self.state.health)
+
+    async def get_exclusions(self, request: web.Request) -> web.Response:
+        return web.json_response({address: sorted(names) for address, names in self.exclusion_index.get_exclusions_map().items()})
+
+    async def get_exclusion(self, request: web.Request) -> tuple[str, str]:
+        """
+        Gets address and name of an exclusion from the body of a request. Raises HTTPBadRequest if they're invalid.
+        """
+        try:
+            body = await request.json()
+            address, name = body['address'], body['name']
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text='Body must be {"address": "ip:port" or "__all__", "name": "name" or "__all__"}.')
+        if not (isinstance(address, str) and isinstance(name, str) and name and (address == ALL or validate_address(address))):
+            raise web.HTTPBadRequest(text=f'Address {address!r} or name {name!r} is invalid.')
+        return address, name
+
+    async def add_exclusion(self, request: web.Request) -> web.Response:
+        address, name = await self.get_exclusion(request)
+        try:
+            self.exclusion_index.add(address, name)     # takes the index lock so it's safe from this thread
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        return await self.get_exclusions(request)
+
+    async def remove_exclusion(self, request: web.Request) -> web.Response:
+        address, name = await self.get_exclusion(request)
+        if not self.exclusion_index.remove(address, name):
+            raise web.HTTPNotFound(text=f'There is no exclusion of {name} on {address}.')
+        return await self.get_exclusions(request)
+
+    def get_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/scan', self.get_scan)
+        app.router.add_get('/names', self.get_names)
+        app.router.add_get('/names/{name}', self.get_name)
+        app.router.add_get('/health', self.get_health)
+        app.router.add_get('/exclusions', self.get_exclusions)
+        app.router.add_post('/exclusions', self.add_exclusion)
+        app.router.add_delete('/exclusions', self.remove_exclusion)
+        return app
+
+    def start(self):
+        """
+        Starts serving in a daemon thread. Raises OSError if the port can't be bound.
+        """
+        started = Event()
+        errors: list[OSError] = []
+
+        def run():
+            loop = self._loop = asyncio.new_event_loop()
+            runner = web.AppRunner(self.get_app(), access_log=None)
+            try:
+                loop.run_until_complete(runner.setup())
+                loop.run_until_complete(web.TCPSite(runner, self.host, self.port).start())
+            except OSError as e:
+                errors.append(e)
+                loop.run_until_complete(runner.cleanup())
+                loop.close()
+                return
+            finally:
+                started.set()
+            loop.run_forever()
+            loop.run_until_complete(runner.cleanup())
+            loop.close()
+
+        self._thread = Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            self._thread = None
+            raise errors[0]
+
+    def close(self):
+        if self._thread is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+            self._thread = None
+
+
+# TESTING
+
+
+def test_api_procedure(port: int = 8767):
+    from os.path import join
+    from tempfile import TemporaryDirectory
+
+    import requests
+
+    from cache.cacheable_data import PickleCacheableData
+    from helpers import CONSOLE
+    from scan_results import PlayerRecord
+
+    CONSOLE.print('[START API TEST PROCEDURE]')
+    with TemporaryDirectory() as directory:
+        api_server = ApiServer(ExclusionIndex(PickleCacheableData(join(directory, 'exclusions.bin'))), '127.0.0.1', port)
+        api_server.start()
+        url = f'http://127.0.0.1:{port}'
+        try:
+            assert requests.get(f'{url}/health').json() == {'cycle': 0}
+            api_server.publish(get_live_state([
+                ServerScan('server', '1.1.1.1:1', 100., [PlayerRecord('[TAG] Gordon', 'Gordon', 5, 60.)]),
+                ServerScan('другой', '2.2.2.2:2', 101., [PlayerRecord('gordon', 'Gordon', 0, 1.), PlayerRecord('Alyx', 're:^aly', 1, 2.)])],
+                {'cycle': 1}))
+            assert requests.get(f'{url}/scan').json()['другой']['players'][1]['name'] == 're:^aly'
+            assert [location['address'] for location in requests.get(f'{url}/names/Gordon').json()] == ['1.1.1.1:1', '2.2.2.2:2']
+            assert requests.get(f'{url}/names/[TAG] Gordon').json()[0]['score'] == 5
+            assert requests.get(f'{url}/names/Nobody').status_code == 404
+            assert set(requests.get(f'{url}/names').json()) == {'Gordon', 're:^aly'}
+            assert requests.get(f'{url}/health').json()['cycle'] == 1
+
+            assert requests.post(f'{url}/exclusions', json={'address': '1.1.1.1:1', 'name': ALL}).json() == {'1.1.1.1:1': [ALL]}
+            assert requests.post(f'{url}/exclusions', json={'address': ALL, 'name': ALL}).status_code == 400
+            assert requests.post(f'{url}/exclusions', json={'address': 'nowhere', 'name': 'Gordon'}).status_code == 400
+            assert requests.post(f'{url}/exclusions', data='not json').status_code == 400
+            assert api_server.exclusion_index.is_server_excluded('1.1.1.1:1')
+            assert requests.get(f'{url}/exclusions').json() == {'1.1.1.1:1': [ALL]}
+            assert requests.post(f'{url}/exclusions', json={'address': '1.1.1.1:', 'name': 'Gordon'}).status_code == 400
+            assert requests.delete(f'{url}/exclusions', json={'address': '1.1.1.1:1', 'name': ALL}).json() == {}
+            assert requests.delete(f'{url}/exclusions', json={'address': '1.1.1.1:1', 'name': ALL}).status_code == 404
+            assert not api_server.exclusion_index.is_server_excluded('1.1.1.1:1')
+            try:
+                ApiServer(api_server.exclusion_index, '127.0.0.1', port).start()
+            except OSError:
+                pass
+            else:
+                raise AssertionError('Port was bound twice')
+        finally:
+            api_server.close()
+    CONSOLE.print('Endpoints answer from the published state, exclusions are added and removed')
+    CONSOLE.print('[END API TEST PROCEDURE]')
+
+
+if __name__ == '__main__':
+    test_api_procedure()
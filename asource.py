@@ -7,6 +7,8 @@ from os.path import join
 
 from rich.traceback import install
 from cache.cacheable_data import PickleCacheableData, TextFileCacheableData
+from cache.write_behind_cacheable_data import WriteBehindCacheableData
+from cache.sharing import SHARED, HOT_COPY
 
 from name_parsers import AsyncNameParser
 
@@ -22,4 +24,4 @@ if __name__ == '__main__':
     #      AsyncNameParser(PickleCacheableData(join(BASE_DIR, 'data/async_names_cache.bin')), is_silent=True))
     main(AsyncServerNameParser(),
          AsyncServerParser(),
-         AsyncNameParser(TextFileCacheableData(join(BASE_DIR, 'data/async_names_cache.txt')), is_silent=True))
+         AsyncNameParser(WriteBehindCacheableData(TextFileCacheableData(join(BASE_DIR, 'data/async_names_cache.txt'), shared=SHARED, hot_copy=HOT_COPY)), is_silent=True))
@@ -0,0 +1,212 @@
+"""
+This is a module with the offline benchmark suite of caches and serializers.
+
+Unlike benchmarks in name_parsers.py it doesn't need the Internet: all data is synthetic (see cache/synthetic_data.py).
+Usage:
+    python benchmarks.py run [--sizes 1000,10000] [--repeat 3] [--output data/benchmarks.json]
+    python benchmarks.py compare data/benchmarks_baseline.json data/benchmarks.json [--threshold 0.15]
+Compare exits with code 1 if there are regressions so it can be used in scripts.
+
+Some benchmarks are superlinear (bazed_strings loads) or just slow (hjson) so they are skipped for sizes above their limit.
+"""
+
+import json
+import platform
+import sys
+from argparse import ArgumentParser
+from collections import OrderedDict
+from os.path import join
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import asctime, perf_counter
+from typing import Any, Callable, NamedTuple, Optional
+
+from rich.table import Table
+
+from cache.abstract_cacheable_data import AbstractFileCacheableData
+from cache.bazed_strings import deserializers, disorders, serializers
+from cache.cache_managers import ServerNameParserCacheManager
+from cache.cacheable_data import HJSONFileCacheableData, PickleCacheableData, TextFileCacheableData
+from cache.synthetic_data import make_links_info_map, make_servers_info_map
+from helpers import BASE_DIR, CONSOLE
+
+
+SIZES = [1000, 10000, 100000, 1000000]
+REPEAT = 3
+RESULTS_PATH = join(BASE_DIR, 'data', 'benchmarks.json')
+REGRESSION_THRESHOLD = 0.15     # relative slowdown of the best time to count as a regression
+SLOW_MAX_SIZE = 10000           # for superlinear benchmarks
+HJSON_MAX_SIZE = 100000
+
+DATASETS_MAKERS_MAP = {
+    'links_info_map': make_links_info_map,
+    'servers_info_map': make_servers_info_map,
+}
+
+
+class Benchmark(NamedTuple):
+    name: str
+    run: Callable[[OrderedDict[str, Any], str], float]  # (dataset, temp directory) -> elapsed secs of one run
+    datasets: tuple[str, ...]
+    max_size: Optional[int] = None
+
+
+def new_cacheable_data(cacheable_data_type: type, directory: str, data: OrderedDict[str, Any]) -> AbstractFileCacheableData:
+    """
+    Creates cacheable data of the given type with a new file (so nothing is loaded) filled with data.
+    """
+    path = join(directory, f'{cacheable_data_type.__name__}-{len(data)}-{perf_counter()}.cache')
+    cacheable_data = cacheable_data_type(path)
+    cacheable_data._data = OrderedDict(data)
+    return cacheable_data
+
+
+def get_save_benchmark(cacheable_data_type: type) -> Callable[[OrderedDict[str, Any], str], float]:
+    def save_benchmark(data, directory):
+        cacheable_data = new_cacheable_data(cacheable_data_type, directory, data)
+        start_time = perf_counter()
+        cacheable_data.update_external_cache()
+        return perf_counter() - start_time
+    return save_benchmark
+
+
+def get_load_benchmark(cacheable_data_type: type) -> Callable[[OrderedDict[str, Any], str], float]:
+    def load_benchmark(data, directory):
+        cacheable_data = new_cacheable_data(cacheable_data_type, directory, data)
+        cacheable_data.update_external_cache()
+        start_time = perf_counter()
+        cacheable_data.update_internal_cache()
+        return perf_counter() - start_time
+    return load_benchmark
+
+
+def reorder_by_benchmark(data, directory):
+    cacheable_data = new_cacheable_data(PickleCacheableData, directory, data)
+    keys = list(reversed(data.keys()))
+    start_time = perf_counter()
+    cacheable_data.reorder_by(keys)
+    return perf_counter() - start_time
+
+
+def remove_duplicates_benchmark(data, directory):
+    cache_manager = ServerNameParserCacheManager.__new__(ServerNameParserCacheManager)  # __init__ removes duplicates already
+    cache_manager._servers_info_map = new_cacheable_data(PickleCacheableData, directory, data)
+    start_time = perf_counter()
+    cache_manager.remove_duplicates()
+    return perf_counter() - start_time
+
+
+def bazed_dumps_benchmark(data, directory):
+    start_time = perf_counter()
+    serializers.dumps(disorders.disorder_value(data))
+    return perf_counter() - start_time
+
+
+def bazed_loads_benchmark(data, directory):
+    text = serializers.dumps(disorders.disorder_value(data))
+    start_time = perf_counter()
+    deserializers.loads(text)
+    return perf_counter() - start_time
+
+
+ALL_DATASETS = tuple(DATASETS_MAKERS_MAP)
+BENCHMARKS = [
+    Benchmark('pickle_save', get_save_benchmark(PickleCacheableData), ALL_DATASETS),
+    Benchmark('pickle_load', get_load_benchmark(PickleCacheableData), ALL_DATASETS),
+    Benchmark('text_save', get_save_benchmark(TextFileCacheableData), ALL_DATASETS, SLOW_MAX_SIZE),
+    Benchmark('text_load', get_load_benchmark(TextFileCacheableData), ALL_DATASETS, SLOW_MAX_SIZE),
+    Benchmark('hjson_save', get_save_benchmark(HJSONFileCacheableData), ALL_DATASETS, HJSON_MAX_SIZE),
+    Benchmark('hjson_load', get_load_benchmark(HJSONFileCacheableData), ALL_DATASETS, HJSON_MAX_SIZE),
+    Benchmark('reorder_by', reorder_by_benchmark, ('links_info_map',)),
+    Benchmark('remove_duplicates', remove_duplicates_benchmark, ('servers_info_map',)),
+    Benchmark('bazed_dumps', bazed_dumps_benchmark, ALL_DATASETS, SLOW_MAX_SIZE),
+    Benchmark('bazed_loads', bazed_loads_benchmark, ALL_DATASETS, SLOW_MAX_SIZE),
+]
+
+
+def run_benchmarks(sizes: list[int], repeat: int, slow_max_size: int, only: Optional[set[str]] = None) -> dict[str, Any]:
+    """
+    Runs every benchmark for every dataset and size. Returns results keyed by 'benchmark/dataset/size'.
+    """
+    results = {}
+    with TemporaryDirectory() as directory:
+        for size in sizes:
+            for dataset_name, make_dataset in DATASETS_MAKERS_MAP.items():
+                data = make_dataset(size)
+                for benchmark in BENCHMARKS:
+                    if dataset_name not in benchmark.datasets or (only and benchmark.name not in only):
+                        continue
+                    max_size = slow_max_size if benchmark.max_size == SLOW_MAX_SIZE else benchmark.max_size
+                    if max_size is not None and size > max_size:
+                        continue
+                    times = [benchmark.run(data, directory) for _ in range(repeat)]
+                    key = f'{benchmark.name}/{dataset_name}/{size}'
+                    results[key] = {'min': min(times), 'median': median(times)}
+                    CONSOLE.print(f'{key:<45} min {min(times)*1000:10.2f} ms   median {median(times)*1000:10.2f} ms')
+                del data
+    return results
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any], threshold: float) -> list[str]:
+    """
+    Prints a comparison table of best times and returns keys of regressed benchmarks.
+    """
+    table = Table(title=f'Benchmarks comparison (threshold {threshold:.0%})')
+    for column in ('Benchmark', 'Baseline, ms', 'Current, ms', 'Change', 'Verdict'):
+        table.add_column(column)
+    regressions = []
+    for key in sorted(baseline.keys() & current.keys(), key=lambda k: (k.rsplit('/', 1)[0], int(k.rsplit('/', 1)[1]))):
+        baseline_time, current_time = baseline[key]['min'], current[key]['min']
+        change = current_time/baseline_time - 1 if baseline_time else 0.0
+        if change > threshold:
+            verdict = '[red]REGRESSION[/red]'
+            regressions.append(key)
+        elif change < -threshold:
+            verdict = '[green]faster[/green]'
+        else:
+            verdict = 'same'
+        table.add_row(key, f'{baseline_time*1000:.2f}', f'{current_time*1000:.2f}', f'{change:+.1%}', verdict)
+    CONSOLE.print(table)
+    for key in sorted(baseline.keys() ^ current.keys()):
+        CONSOLE.print(f'{key} is only in {"baseline" if key in baseline else "current"} results')
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = ArgumentParser(description='Offline benchmark suite of caches and serializers.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='run benchmarks and save results as JSON')
+    run_parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='comma separated dataset sizes')
+    run_parser.add_argument('--repeat', type=int, default=REPEAT)
+    run_parser.add_argument('--slow-max-size', type=int, default=SLOW_MAX_SIZE, help='max size for superlinear benchmarks')
+    run_parser.add_argument('--only', default='', help='comma separated benchmark names to run')
+    run_parser.add_argument('--output', default=RESULTS_PATH)
+    compare_parser = subparsers.add_parser('compare', help='compare results with a baseline and flag regressions')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current', nargs='?', default=RESULTS_PATH)
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        sizes = [int(size) for size in args.sizes.split(',')]
+        results = run_benchmarks(sizes, args.repeat, args.slow_max_size, set(filter(None, args.only.split(','))))
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'time': asctime(), 'python': sys.version, 'platform': platform.platform(), 'repeat': args.repeat,
+                       'results': results}, f, indent=2)
+        CONSOLE.print(f'Results are saved to {args.output}')
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)['results']
+    regressions = compare_results(baseline, current, args.threshold)
+    if regressions:
+        CONSOLE.print(f'{len(regressions)} REGRESSIONS: {", ".join(regressions)}', style='bold red')
+        return 1
+    CONSOLE.print('NO REGRESSIONS', style='bold green')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,10 +3,21 @@ This is a module with Cacheable Data protocol for typing and ABC for common func
 """
 
 from collections import OrderedDict
+from copy import copy
+from time import time
 from typing import Any, Generator, Iterable, KeysView, Protocol, Optional, Sequence, ValuesView
 from abc import ABC, abstractmethod
+from os import stat
+from os.path import exists
+
+from .sharing import SharedMemoryHotCopy, file_lock
+from .compressors import compress, decompress, get_codec_by_path, validate_codec
 
 from helpers import create_file_if_file_does_not_exist
+from scan_log import SCAN_LOG
+
+
+EVICTION_POLICIES = ('lru', 'age')
 
 
 class CacheableData(Protocol):
@@ -18,10 +29,11 @@ class CacheableData(Protocol):
 
     Btw, file-based external cache doesn't use aiofiles because it's very unstable
     and makes lots of garbage lines. Plus pickle doesn't support async IO either.
-
-    TODO: Probably will have to make an async version of CacheableData if I get my hands on databases. Or not.
+    For async code there's a write-behind wrapper (see write_behind_cacheable_data.py) that writes from a thread instead.
     """
     _data: dict[str, Any]
+    evicted_count: int  # Amount of keys evicted during runtime if the cache is bounded
+    is_shared: bool     # Whether the external cache is shared with other processes
 
     def __iter__(self) -> Generator[str, None, None]:
         ...
@@ -65,6 +77,21 @@ class CacheableData(Protocol):
         Sets the value of the given key in internal cache.
         """
 
+    def evict(self) -> int:
+        """
+        Evicts stale keys from the internal cache if it's bounded. Returns the amount of evicted keys.
+        """
+
+    def get_age(self, key: str) -> Optional[float]:
+        """
+        Returns time in secs since the key was last updated or None if it's unknown.
+        """
+
+    def refresh(self):
+        """
+        Merges the changes other processes made to the shared external cache into the internal cache.
+        """
+
     def update_internal_cache(self):
         """
         Updates the internal cache from the external cache.
@@ -75,6 +102,11 @@ class CacheableData(Protocol):
         Updates the external cache from the internal cache.
         """
 
+    def flush(self):
+        """
+        Blocks until all requested external cache updates are done.
+        """
+
 
 class AbstractFileCacheableData(ABC):
     """
@@ -84,16 +116,55 @@ class AbstractFileCacheableData(ABC):
     It is very important to note that all previous keys will also stay unless you delete the file.
     Values, however, can be rewritten by key when you update the external cache
     with different value assigned to the corresponding key in the internal cache.
+
+    To get rid of stale keys make the cache bounded with capacity and/or ttl.
+    Bounded cache tracks last access and last update time of every key (persisted in a sidecar .meta file)
+    and evicts keys before every file cache update, so evicted keys are never written.
+    Eviction policy is either 'lru' (by last access time) or 'age' (by last update time).
+
+    Shared cache can be used by several processes with the same file at once (see sharing.py).
+    Its file cache updates are read-modify-write cycles under an advisory file lock:
+    keys set or deleted by this process since the last update win, everything else is taken from the file.
+    So all writers of a shared cache file must be shared too. Shared cache always tracks update times.
+
+    Files can be compressed with a stdlib codec (see compressors.py) given explicitly or picked by the file extension.
+
+    Subclasses only define how the memory data is converted from and to bytes, file operations are done here.
     """
     path: str
+    capacity: Optional[int]                 # Max amount of keys. Unbounded if None
+    ttl: Optional[float]                    # Max time in secs since the last access or update (see eviction). Never expire if None
+    eviction: str                           # Eviction policy: 'lru' or 'age'
+    evicted_count: int                      # Amount of keys evicted during runtime
+    is_shared: bool                         # Whether the file cache is shared with other processes
+    codec: Optional[str]                    # Compression codec of the files. Not compressed if None
     _data: OrderedDict[str, Any]
-
-    def __init__(self, path):
+    _accessed: OrderedDict[str, float]      # Keys' last access timestamps in ascending order. Only tracked if bounded
+    _updated: OrderedDict[str, float]       # Keys' last update timestamps in ascending order. Only tracked if bounded or shared
+    _changed_keys: set[str]                 # Keys set since the last shared file cache update
+    _deleted_keys: set[str]                 # Keys deleted since the last shared file cache update
+    _hot_copy: Optional[SharedMemoryHotCopy]
+
+    def __init__(self, path, capacity=None, ttl=None, eviction='lru', shared=False, hot_copy=False, codec=None):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f'Eviction policy must be one of {EVICTION_POLICIES}.')
+        validate_codec(codec)
         self.path = path
+        self.codec = codec if codec else get_codec_by_path(path)
+        self.capacity = capacity
+        self.ttl = ttl
+        self.eviction = eviction
+        self.evicted_count = 0
+        self.is_shared = shared
         self._data = OrderedDict()
+        self._accessed = OrderedDict()
+        self._updated = OrderedDict()
+        self._changed_keys = set()
+        self._deleted_keys = set()
+        self._hot_copy = SharedMemoryHotCopy(path) if shared and hot_copy else None
         create_file_if_file_does_not_exist(self.path)
         self.update_internal_cache()
-        print(self._data)
+        SCAN_LOG.debug(self._data)
         # sleep(10)
 
     def __repr__(self):     # Can't use fstrings here.
@@ -103,13 +174,37 @@ class AbstractFileCacheableData(ABC):
         return self.iterator()
 
     def __setitem__(self, key: str, value: Any):
-        self._data[key] = value
+        self.set(key, value)
 
     def __getitem__(self, key: str) -> Any:
-        return self._data[key]
+        value = self._data[key]
+        if self.is_bounded:
+            self._touch(key)
+        return value
 
     def __delitem__(self, key: str):
         del self._data[key]
+        self._accessed.pop(key, None)
+        self._updated.pop(key, None)
+        if self.is_shared:
+            self._deleted_keys.add(key)
+            self._changed_keys.discard(key)
+
+    @property
+    def is_bounded(self) -> bool:
+        return self.capacity is not None or self.ttl is not None
+
+    @property
+    def tracks_timestamps(self) -> bool:
+        return self.is_bounded or self.is_shared
+
+    @property
+    def meta_path(self) -> str:
+        return self.path + '.meta'
+
+    @property
+    def lock_path(self) -> str:
+        return self.path + '.lock'
 
     def iterator(self) -> Generator[str, None, None]:
         for key in self._data:
@@ -128,42 +223,222 @@ class AbstractFileCacheableData(ABC):
     def reorder_by(self, keys: Sequence):
         """
         Reorders memory data based on some sequence containing memory data keys.
+        Keys that are not in the sequence (i.e. put by other processes into a shared cache) go last.
         """
-        try:
-            sort_map = dict(zip(keys, range(len(keys))))
-            self._data = OrderedDict(sorted(self._data.items(), key=lambda x: sort_map[x[0]]))
-        except KeyError as e:
-            print('KEYS DO NOT MATCH')
-            print(sort_map)
-            print(self._data)
-            print(e)
+        sort_map = dict(zip(keys, range(len(keys))))
+        self._data = OrderedDict(sorted(self._data.items(), key=lambda x: sort_map.get(x[0], len(sort_map))))
 
     def get(self, key: str, default: Optional[Any] = None) -> Any:
         """
         Returns the value of the given key in the memory data or the default value.
         """
         if key in self._data:
-            value = self._data[key]
+            value = self[key]
         else:
             value = default
         return value
 
+    def get_age(self, key: str) -> Optional[float]:
+        """
+        Returns time in secs since the key was last updated (by any process if shared). None if it's unknown.
+        """
+        updated = self._updated.get(key)
+        return time() - updated if updated is not None else None
+
     def set(self, key: str, value: Any):
         """
         Sets the value of the given key in the memory data.
+        Evicts the least recently used (or the oldest) key if it exceeds capacity.
         """
         if self._data is None:
             self._data = OrderedDict()
         self._data[key] = value
+        if self.is_shared:
+            self._changed_keys.add(key)
+            self._deleted_keys.discard(key)
+        if self.tracks_timestamps:
+            self._touch(key, is_update=True)
+        if self.capacity is not None and len(self._data) > self.capacity:
+            self._evict_over_capacity()
+
+    def evict(self) -> int:
+        """
+        Evicts expired keys and then keys over capacity. Returns the amount of evicted keys.
+        """
+        if not self.is_bounded:
+            return 0
+        evicted_count = self.evicted_count
+        if self.ttl is not None:
+            timestamps = self._get_eviction_timestamps()
+            deadline = time() - self.ttl
+            for key, timestamp in list(timestamps.items()):    # ascending so can stop on the first fresh key
+                if timestamp >= deadline:
+                    break
+                self._evict_key(key)
+        if self.capacity is not None:
+            self._evict_over_capacity()
+        return self.evicted_count - evicted_count
+
+    def snapshot(self) -> 'AbstractFileCacheableData':
+        """
+        Returns a shallow copy which doesn't share the memory data dict with this instance.
+        Values are shared so they must be replaced and not mutated in place while the copy is in use.
+        Changes made since the last shared file cache update are handed over to the copy which is supposed to write them.
+        Call restore_changes with the copy if its write fails.
+        """
+        snapshot = copy(self)
+        snapshot._data = OrderedDict(self._data)
+        snapshot._accessed = OrderedDict(self._accessed)
+        snapshot._updated = OrderedDict(self._updated)
+        self._changed_keys, self._deleted_keys = set(), set()
+        return snapshot
+
+    def restore_changes(self, snapshot: 'AbstractFileCacheableData'):
+        """
+        Takes back changes handed over to a snapshot that failed to write them, so the next update writes them.
+        Changes made since the snapshot was taken win.
+        """
+        self._changed_keys |= {key for key in snapshot._changed_keys if key in self._data}
+        self._deleted_keys |= {key for key in snapshot._deleted_keys if key not in self._data}
+
+    def flush(self):
+        """
+        Does nothing since updating the file cache is done right away.
+        """
+
+    def refresh(self):
+        """
+        Merges what other processes have written to the shared file cache since the last refresh or update.
+        Does nothing if the cache isn't shared.
+        """
+        if not self.is_shared:
+            return
+        with file_lock(self.lock_path, exclusive=False):
+            self._merge_file_cache()
 
-    @abstractmethod
     def update_internal_cache(self):
         """
         Updates the memory data from the file cache.
         """
+        if self.is_shared:
+            with file_lock(self.lock_path, exclusive=False):
+                raw, raw_meta = self._read_file_cache()
+        else:
+            raw, raw_meta = self._read_file_cache()
+        data = self.deserialize(raw)
+        if data is not None:
+            self._data = data
+        if self.tracks_timestamps:
+            self._load_timestamps(self._deserialize_meta(raw_meta))
+        self._changed_keys, self._deleted_keys = set(), set()
 
-    @abstractmethod
     def update_external_cache(self):
         """
-        Updates the file cache from the memory data.
+        Updates the file cache from the memory data. Evicts keys beforehand if bounded.
+        Shared file cache is merged with the memory data first.
+        """
+        self.evict()
+        if not self.is_shared:
+            self._write_file_cache()
+            return
+        with file_lock(self.lock_path):
+            self._merge_file_cache()
+            self.evict()    # keys from other processes might be stale too
+            self._write_file_cache()
+        self._changed_keys, self._deleted_keys = set(), set()
+
+    @abstractmethod
+    def serialize(self, data: OrderedDict[str, Any]) -> bytes:
+        """
+        Converts the memory data to the file cache contents.
+        """
+
+    @abstractmethod
+    def deserialize(self, raw: bytes) -> Optional[OrderedDict[str, Any]]:
+        """
+        Converts the file cache contents to the memory data. Returns None if there is nothing valid to load.
+        """
+
+    def _read_file_cache(self) -> tuple[bytes, bytes]:
+        """
+        Reads the data and meta contents from the hot copy if it's there or from the files.
+        """
+        if self._hot_copy:
+            contents = self._hot_copy.read(stat(self.path).st_mtime_ns)
+            if contents:
+                return contents
+        with open(self.path, 'rb') as f:
+            raw = decompress(f.read(), self.codec)
+        raw_meta = b''
+        if self.tracks_timestamps and exists(self.meta_path):
+            with open(self.meta_path, 'rb') as f:
+                raw_meta = decompress(f.read(), self.codec)
+        return raw, raw_meta
+
+    def _write_file_cache(self):
+        raw = self.serialize(self._data)
+        with open(self.path, 'wb') as f:
+            f.write(compress(raw, self.codec))
+        raw_meta = b''
+        if self.tracks_timestamps:
+            raw_meta = self.serialize(OrderedDict((key, [self._accessed.get(key, 0.0), self._updated[key]]) for key in self._data))
+            with open(self.meta_path, 'wb') as f:
+                f.write(compress(raw_meta, self.codec))
+        if self._hot_copy:
+            self._hot_copy.publish(raw, raw_meta, stat(self.path).st_mtime_ns)
+
+    def _merge_file_cache(self):
+        """
+        Merges the shared file cache into the memory data. Must be called under the file lock.
+        Keys changed or deleted by this process since the last update win. Other keys missing in the file were deleted by other processes.
+        """
+        if self._hot_copy and self._hot_copy.is_current(stat(self.path).st_mtime_ns):
+            return  # nobody wrote anything since this process did
+        raw, raw_meta = self._read_file_cache()
+        data = self.deserialize(raw) or OrderedDict()
+        meta = self._deserialize_meta(raw_meta)
+        for key in self._deleted_keys:
+            data.pop(key, None)
+            meta.pop(key, None)
+        for key in self._changed_keys:
+            data[key] = self._data[key]
+            meta[key] = [0.0, self._updated[key]]
+        now = time()
+        timestamps = {}
+        for key in data:    # access times of known keys are local, update times are shared
+            accessed, updated = meta.get(key, (now, now))
+            timestamps[key] = [self._accessed.get(key, accessed), updated]
+        self._data = data
+        self._load_timestamps(timestamps)
+
+    def _deserialize_meta(self, raw_meta: bytes) -> dict[str, list[float]]:
+        return dict(self.deserialize(raw_meta) or {}) if raw_meta else {}
+
+    def _load_timestamps(self, meta: dict[str, list[float]]):
+        """
+        Loads keys' timestamps from meta. Keys without them are considered accessed and updated just now.
         """
+        now = time()
+        timestamps = {key: meta.get(key, (now, now)) for key in self._data}
+        self._accessed = OrderedDict(sorted(((key, ts[0]) for key, ts in timestamps.items()), key=lambda x: x[1]))
+        self._updated = OrderedDict(sorted(((key, ts[1]) for key, ts in timestamps.items()), key=lambda x: x[1]))
+
+    def _touch(self, key: str, is_update: bool = False):
+        now = time()
+        self._accessed[key] = now
+        self._accessed.move_to_end(key)
+        if is_update or key not in self._updated:
+            self._updated[key] = now
+            self._updated.move_to_end(key)
+
+    def _get_eviction_timestamps(self) -> OrderedDict[str, float]:
+        return self._accessed if self.eviction == 'lru' else self._updated
+
+    def _evict_over_capacity(self):
+        timestamps = self._get_eviction_timestamps()
+        while len(self._data) > self.capacity:  # type: ignore # only called when there is capacity
+            self._evict_key(next(iter(timestamps)))
+
+    def _evict_key(self, key: str):
+        del self[key]
+        self.evicted_count += 1
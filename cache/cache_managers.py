@@ -5,11 +5,13 @@ These classes exist mainly to extract the code relating to caching of child clas
 since they are already way too big.
 """
 
+from time import time
 from typing import Iterable, Optional
 
 from .abstract_cacheable_data import CacheableData
 
 from helpers import NAMES_PATH, SERVER_IPS_PATH
+from scan_log import SCAN_LOG
 
 
 HJSON_BASE_NAMES_PATH = NAMES_PATH + '_cache_based.hjson'
@@ -33,12 +35,15 @@ class NameParserCacheManager:
     def remove_extra_links_from_cache(self, links_keys):
         """
         Removes all links from cache which are not in the links_keys.
+        Shared cache is left intact since it has links of other processes.
         """
+        if self._links_info_map.is_shared:
+            return
         extra_links = self._links_info_map.keys() - links_keys
         # print(links_keys)
         # print(extra_links)
         for link in extra_links:
-            print(f'DELETING INTERNALLY {link}')
+            SCAN_LOG.debug('DELETING INTERNALLY', link)
             del self._links_info_map[link]
         # for link in self._links_info_map:
         #     if link not in links_keys:
@@ -56,17 +61,40 @@ class NameParserCacheManager:
         if link_info_map:
             link_current_status = link_info_map['current_status'] if link_info_map['current_status'] else [None]
             link_current_status = link_current_status if link_current_status else [None]
-            print(link, '[LINK FOUND IN CACHE]', link_current_status)
+            SCAN_LOG.debug(link, '[LINK FOUND IN CACHE]', link_current_status)
         else:
-            print(link, '[LINK NOT FOUND IN CACHE]')
+            SCAN_LOG.debug(link, '[LINK NOT FOUND IN CACHE]')
         return link_current_status      # type: ignore
 
-    def cache_info(self, link: str, flags: dict[str, bool], *current_status: str):
+    def cache_info(self, link: str, flags: dict[str, bool], *current_status: str, validators: Optional[dict[str, str]] = None):
+        """
+        Caches link info along with the time it was checked at and HTTP validators of its page for conditional requests.
+        """
         link_info = {}
         link_info['current_status'] = current_status
         link_info['flags'] = flags  # type: ignore
+        link_info['validators'] = validators or {}  # type: ignore
+        link_info['checked_at'] = time()    # type: ignore
         self._links_info_map.set(link, link_info)
 
+    def get_link_validators(self, link: str) -> dict[str, str]:
+        """
+        Gets HTTP validators (etag, last_modified, content_hash) of the link page. Empty if there's no cached status for them.
+        """
+        link_info = self._links_info_map.get(link)
+        if not link_info or not link_info['current_status']:
+            return {}
+        return link_info.get('validators', {})
+
+    def is_link_checked_recently(self, link: str, freshness: float) -> bool:
+        """
+        Checks whether the link info was cached (or confirmed unchanged) less than freshness secs ago.
+        """
+        link_info = self._links_info_map.get(link)
+        if not link_info or not link_info['current_status']:
+            return False
+        return time() - link_info.get('checked_at', 0) < freshness
+
     def reorder_links_info_map(self, keys: Iterable):
         self._links_info_map.reorder_by(keys)
 
@@ -76,6 +104,33 @@ class NameParserCacheManager:
         """
         self._links_info_map.update_external_cache()
 
+    def flush_cache(self):
+        """
+        Blocks until all cached name info dumps are written. Call it on shutdown.
+        """
+        self._links_info_map.flush()
+
+    def get_evicted_count(self) -> int:
+        """
+        Gets the amount of name info entries evicted from the bounded cache.
+        """
+        return self._links_info_map.evicted_count
+
+    def refresh_cache(self):
+        """
+        Gets name info other processes have shared since the last refresh. Does nothing if the cache isn't shared.
+        """
+        self._links_info_map.refresh()
+
+    def is_link_fresh_in_shared_cache(self, link: str, freshness: float) -> bool:
+        """
+        Checks whether the link info in the shared cache is fresh enough to not request it again.
+        """
+        if not self._links_info_map.is_shared or not self._links_info_map.get(link):
+            return False
+        age = self._links_info_map.get_age(link)
+        return age is not None and age < freshness
+
     def reset_cache(self):
         """
         Forces cache to reset by replacing it from external cache.
@@ -113,6 +168,43 @@ class ServerNameParserCacheManager:
         """
         self._servers_info_map.update_external_cache()
 
+    def flush_cache(self):
+        """
+        Blocks until all cached server name info dumps are written. Call it on shutdown.
+        """
+        self._servers_info_map.flush()
+
+    def get_evicted_count(self) -> int:
+        """
+        Gets the amount of server name info entries evicted from the bounded cache.
+        """
+        return self._servers_info_map.evicted_count
+
+    def refresh_cache(self):
+        """
+        Gets server names other processes have shared since the last refresh. Does nothing if the cache isn't shared.
+        """
+        self._servers_info_map.refresh()
+
+    def get_fresh_shared_addrs(self, freshness: float) -> set[tuple[str, int]]:
+        """
+        Gets addresses whose server names in the shared cache are fresh enough to not request them again.
+        """
+        if not self._servers_info_map.is_shared:
+            return set()
+        fresh_addrs = set()
+        for server_name, addr in self._servers_info_map.items():
+            age = self._servers_info_map.get_age(server_name)
+            if age is not None and age < freshness:
+                fresh_addrs.add(tuple(addr))    # text cache loads tuples as lists
+        return fresh_addrs
+
+    def get_servers_info_for(self, addrs: set[tuple[str, int]]) -> dict[str, tuple[str, int]]:
+        """
+        Gets server names info only for the given addresses. Shared cache has servers of other processes too.
+        """
+        return {server_name: addr for server_name, addr in self._servers_info_map.items() if tuple(addr) in addrs}
+
     def reset_cache(self):
         """
         Forces cache to reset by replacing it from external cache.
@@ -11,39 +11,32 @@ import hjson
 from .abstract_cacheable_data import AbstractFileCacheableData
 from .bazed_strings import serializers, deserializers, disorders
 
+from scan_log import SCAN_LOG
+
 
 class PickleCacheableData(AbstractFileCacheableData):
     """
     Caching using operations between the memory data and the pickled binary file.
     """
 
-    def update_internal_cache(self):
+    def serialize(self, data):
         """
-        Updates the memory data from the pickled binary file.
+        Pickles the memory data.
         """
-        data = self._data
-        with open(self.path, 'rb') as f:
-            f.seek(0)
-            unpickler = pickle.Unpickler(f, encoding='utf-8')
-            try:
-                data = unpickler.load()
-            except EOFError as e:
-                print('[UPDATING INTERNAL CACHE]', e)
-        if not isinstance(data, OrderedDict):
-            raise TypeError('Cache data must be a dictionary.')
-        self._data = data
+        return pickle.dumps(data)
 
-    def update_external_cache(self):
+    def deserialize(self, raw):
         """
-        Updates the pickled binary file from the memory data.
+        Unpickles the memory data.
         """
-        with open(self.path, 'wb') as f:
-            f.seek(0)
-            pickler = pickle.Pickler(f)
-            try:
-                pickler.dump(self._data)
-            except EOFError as e:
-                print('[UPDATING EXTERNAL CACHE]', e)
+        try:
+            data = pickle.loads(raw, encoding='utf-8')
+        except EOFError as e:
+            SCAN_LOG.info('[UPDATING INTERNAL CACHE]', e)
+            return None
+        if not isinstance(data, OrderedDict):
+            raise TypeError('Cache data must be a dictionary.')
+        return data
 
 
 class TextFileCacheableData(AbstractFileCacheableData):
@@ -52,39 +45,39 @@ class TextFileCacheableData(AbstractFileCacheableData):
     """
     encoding: str
 
-    def __init__(self, path, encoding='utf-8'):
+    def __init__(self, path, encoding='utf-8', **kwargs):
         self.encoding = encoding
-        super().__init__(path)
+        super().__init__(path, **kwargs)
 
-    def update_internal_cache(self):
+    def serialize(self, data):
         """
-        Updates the memory data from the text file.
+        Serializes the memory data to the text format.
         """
-        with open(self.path, 'r', encoding=self.encoding) as f:
-            text = f.read().rstrip()
-            if text.startswith('[VALID]'):
-                self._data = OrderedDict(deserializers.loads(text[7::]))
+        text = serializers.dumps(disorders.disorder_value(data))
+        return ('[VALID]'+text).encode(self.encoding)
 
-    def update_external_cache(self):
+    def deserialize(self, raw):
         """
-        Updates the text file from the memory data.
+        Deserializes the memory data from the text format if it's valid.
         """
-        with open(self.path, 'w', encoding=self.encoding) as f:
-            text = serializers.dumps(disorders.disorder_value(self._data))
-            f.write('[VALID]'+text)
+        text = raw.decode(self.encoding).rstrip()
+        if text.startswith('[VALID]'):
+            return OrderedDict(deserializers.loads(text[7::]))
+        return None
 
 
 class HJSONFileCacheableData(AbstractFileCacheableData):
-    def update_internal_cache(self):
+    def serialize(self, data):
         """
-        Updates the memory data from the hjson file.
+        Serializes the memory data to hjson.
         """
-        with open(self.path, 'r', encoding='utf-8') as f:
-            self._data = hjson.load(f, encoding='utf-8')
+        return hjson.dumps(data).encode('utf-8')
 
-    def update_external_cache(self):
+    def deserialize(self, raw):
         """
-        Updates the hjson file from the memory data.
+        Deserializes the memory data from hjson.
         """
-        with open(self.path, 'w', encoding='utf-8') as f:
-            hjson.dump(self._data, f, encoding='utf-8')
+        text = raw.decode('utf-8')
+        if not text.strip():
+            return None
+        return hjson.loads(text)
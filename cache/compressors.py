@@ -0,0 +1,111 @@
+"""
+This is a module with stdlib compression codecs for file caches.
+
+A codec is picked either explicitly or by the cache file extension (see EXTENSIONS_MAP),
+so any AbstractFileCacheableData subclass gets compressed files without knowing about it.
+
+Run it as a module (python -m cache.compressors) to benchmark every cache format with every codec.
+"""
+
+import bz2
+import lzma
+import zlib
+from os.path import splitext
+from typing import Callable, Optional
+
+
+CODECS_MAP: dict[str, tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {   # codec: (compress, decompress)
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+    'bz2': (bz2.compress, bz2.decompress),
+}
+EXTENSIONS_MAP = {
+    '.zz': 'zlib',
+    '.zlib': 'zlib',
+    '.xz': 'lzma',
+    '.lzma': 'lzma',
+    '.bz2': 'bz2',
+}
+
+
+def get_codec_by_path(path: str) -> Optional[str]:
+    """
+    Gets codec by the file extension. Returns None if the file isn't supposed to be compressed.
+    """
+    return EXTENSIONS_MAP.get(splitext(path)[1].lower())
+
+
+def validate_codec(codec: Optional[str]):
+    if codec is not None and codec not in CODECS_MAP:
+        raise ValueError(f'Codec must be one of {list(CODECS_MAP)} or None.')
+
+
+def compress(raw: bytes, codec: Optional[str]) -> bytes:
+    if codec is None:
+        return raw
+    return CODECS_MAP[codec][0](raw)
+
+
+def decompress(raw: bytes, codec: Optional[str]) -> bytes:
+    """
+    Decompresses file contents. Empty contents (a just created file) stay empty.
+    """
+    if codec is None or not raw:
+        return raw
+    return CODECS_MAP[codec][1](raw)
+
+
+# TESTING/BENCHMARKING
+
+BENCHMARK_SIZE = 5000   # entries per synthetic cache. Text cache loading is superlinear so don't go too high with it
+
+
+def codec_benchmark(cacheable_data_type: type, codec: Optional[str], data: dict, directory: str) -> tuple[int, float, float]:
+    """
+    Benchmarks saving and loading of a synthetic cache. Returns file size in bytes, save and load times in secs.
+    """
+    from os.path import getsize, join
+    from time import perf_counter
+
+    path = join(directory, f'{cacheable_data_type.__name__}-{codec}-{id(data)}.cache')   # new file so nothing is loaded on init
+    cacheable_data = cacheable_data_type(path, codec=codec)
+    for key, value in data.items():
+        cacheable_data[key] = value
+    start_time = perf_counter()
+    cacheable_data.update_external_cache()
+    save_time = perf_counter() - start_time
+    start_time = perf_counter()
+    cacheable_data.update_internal_cache()
+    load_time = perf_counter() - start_time
+    return getsize(path), save_time, load_time
+
+
+def codecs_benchmark_procedure(size: int = BENCHMARK_SIZE):
+    from tempfile import TemporaryDirectory
+
+    from rich.table import Table
+
+    from .cacheable_data import PickleCacheableData, TextFileCacheableData, HJSONFileCacheableData
+    from .synthetic_data import make_links_info_map, make_servers_info_map
+    from helpers import CONSOLE
+
+    CONSOLE.print('[START CACHE CODECS BENCHMARK PROCEDURE]')
+    datasets = {'links_info_map': make_links_info_map(size), 'servers_info_map': make_servers_info_map(size)}
+    with TemporaryDirectory() as directory:
+        for dataset_name, data in datasets.items():
+            table = Table(title=f'{dataset_name} ({size} entries)')
+            for column in ('Backend', 'Codec', 'Size, KiB', 'Ratio', 'Save, ms', 'Load, ms'):
+                table.add_column(column)
+            for cacheable_data_type in (PickleCacheableData, TextFileCacheableData, HJSONFileCacheableData):
+                uncompressed_size = None
+                for codec in (None, *CODECS_MAP):
+                    file_size, save_time, load_time = codec_benchmark(cacheable_data_type, codec, data, directory)
+                    uncompressed_size = uncompressed_size or file_size
+                    table.add_row(cacheable_data_type.__name__, str(codec), f'{file_size/1024:.1f}',
+                                  f'{uncompressed_size/file_size:.2f}', f'{save_time*1000:.1f}', f'{load_time*1000:.1f}')
+            CONSOLE.print(table)
+    CONSOLE.print('[END CACHE CODECS BENCHMARK PROCEDURE]')
+
+
+if __name__ == '__main__':
+    codecs_benchmark_procedure()
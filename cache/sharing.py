@@ -0,0 +1,111 @@
+"""
+This is a module with primitives for sharing one file cache between several processes (scanner instances) on one machine.
+
+Advisory file locks coordinate read-modify-write cycles of the file cache
+and an optional shared memory hot copy lets processes skip reading and deserializing the file when it didn't change.
+"""
+
+import struct
+from contextlib import contextmanager
+from hashlib import sha1
+from multiprocessing import shared_memory
+from os.path import abspath
+from typing import Generator, Optional
+
+from helpers import CONFIG
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None        # type: ignore
+    import msvcrt
+
+
+SHARED = CONFIG['CACHE']['SHARED']                      # whether scanner instances share their name and server name caches
+SHARED_FRESHNESS = CONFIG['CACHE']['SHARED_FRESHNESS']  # in secs. Shared results younger than this are reused instead of requested
+HOT_COPY = CONFIG['CACHE']['HOT_COPY']                  # whether to keep a hot copy of shared caches in shared memory
+HOT_COPY_SIZE = CONFIG['CACHE']['HOT_COPY_SIZE']        # in bytes. Caches that don't fit are read from files
+
+HOT_COPY_HEADER = struct.Struct('<Qqqq')     # generation, data length, meta length, file mtime. Length is -1 when the data didn't fit
+
+
+@contextmanager
+def file_lock(path: str, exclusive: bool = True) -> Generator[None, None, None]:
+    """
+    Holds an advisory lock of the lock file at path while in context. Blocks until the lock is acquired.
+    Windows has no shared locks so every lock is exclusive there.
+    """
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)    # retries for 10 seconds and raises OSError
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SharedMemoryHotCopy:
+    """
+    A copy of a file cache contents in a named shared memory block. Must only be used under the file cache lock.
+
+    Every publish bumps the generation so readers that have already seen the current one don't read anything.
+    The file cache mtime is stored along so a file changed behind the hot copy's back (deleted, edited) makes it stale.
+    The block is never unlinked on purpose so it outlives the processes using it (just like the file cache does).
+    """
+    generation: int     # Last generation published or read by this process
+    _shm: shared_memory.SharedMemory
+
+    def __init__(self, path: str, size: int = HOT_COPY_SIZE):
+        name = 'a2s_' + sha1(abspath(path).encode()).hexdigest()[:16]
+        try:
+            self._shm = shared_memory.SharedMemory(name, create=True, size=HOT_COPY_HEADER.size + size)
+            HOT_COPY_HEADER.pack_into(self._shm.buf, 0, 0, -1, -1, -1)
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name)
+        if fcntl:   # POSIX only. Otherwise resource tracker unlinks the block when this process exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, 'shared_memory')    # type: ignore
+        self.generation = -1
+
+    @property
+    def capacity(self) -> int:
+        return self._shm.size - HOT_COPY_HEADER.size
+
+    def is_current(self, file_mtime: int) -> bool:
+        """
+        Checks whether nothing was published since the last publish or read of this process and the file is the same.
+        """
+        generation, _, _, mtime = HOT_COPY_HEADER.unpack_from(self._shm.buf, 0)
+        return generation == self.generation and mtime == file_mtime
+
+    def read(self, file_mtime: int) -> Optional[tuple[bytes, bytes]]:
+        """
+        Reads the data and meta contents. Returns None if they didn't fit in the block or the file has changed.
+        """
+        generation, data_length, meta_length, mtime = HOT_COPY_HEADER.unpack_from(self._shm.buf, 0)
+        if data_length < 0 or mtime != file_mtime:
+            return None
+        self.generation = generation
+        start = HOT_COPY_HEADER.size
+        return bytes(self._shm.buf[start:start+data_length]), bytes(self._shm.buf[start+data_length:start+data_length+meta_length])
+
+    def publish(self, raw: bytes, raw_meta: bytes, file_mtime: int):
+        """
+        Writes the data and meta contents that were just written to the file and bumps the generation.
+        """
+        generation = HOT_COPY_HEADER.unpack_from(self._shm.buf, 0)[0] + 1
+        if len(raw) + len(raw_meta) > self.capacity:
+            HOT_COPY_HEADER.pack_into(self._shm.buf, 0, generation, -1, -1, file_mtime)
+        else:
+            start = HOT_COPY_HEADER.size
+            self._shm.buf[start:start+len(raw)] = raw
+            self._shm.buf[start+len(raw):start+len(raw)+len(raw_meta)] = raw_meta
+            HOT_COPY_HEADER.pack_into(self._shm.buf, 0, generation, len(raw), len(raw_meta), file_mtime)
+        self.generation = generation
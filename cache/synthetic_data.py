@@ -0,0 +1,55 @@
+"""
+This is a module that generates realistic synthetic caches for benchmarks so they don't need the Internet.
+
+Shapes are the same as the ones parsers put in their cacheable data:
+    links_info_map:   {steam_account_url: {'current_status': (name, status, ingame), 'flags': {'on_server': bool, 'in_game': bool}}}
+    servers_info_map: {server_name: (ip, port)}
+"""
+
+from collections import OrderedDict
+from random import Random
+from typing import Any
+
+SEED = 1337
+SYLLABLES = ['ka', 'zu', 'mi', 'ro', 'xe', 'ne', 'to', 'la', 'vo', 'shi', 'gr', 'ek', 'ß', 'é', 'ø', 'ъ']
+DECORATIONS = ['', '', '', '[TAG] ', '|CLAN| ', 'xX_', '★ ', '(PRO) ']
+STATUSES = ['Currently Online', 'Currently Offline', 'Currently In-Game', 'Private']
+GAMES = ['Counter-Strike: Source', 'Team Fortress 2', "Garry's Mod", 'Euro Truck Simulator 2', 'Destiny 2']
+REGIONS = ['EU', 'US', 'RU', 'AS', 'AU', 'SA']
+WORDS = ['Awesome', 'Dust', 'Friendly', 'Hardcore', 'Community', 'Classic', 'Zombie', 'Surf', 'Jailbreak', 'Deathmatch']
+MAPS = ['cp_badlands', 'de_dust2', 'gm_construct', 'pl_upward', 'ctf_2fort', 'koth_harvest', 'surf_ski_2']
+
+
+def make_name(rng: Random) -> str:
+    return rng.choice(DECORATIONS) + ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 6))).capitalize()
+
+
+def make_links_info_map(size: int, seed: int = SEED) -> OrderedDict[str, Any]:
+    rng = Random(seed)
+    links_info_map = OrderedDict()
+    for i in range(size):
+        status = rng.choice(STATUSES)
+        ingame = rng.choice(GAMES) if status == 'Currently In-Game' else ''
+        links_info_map[f'https://steamcommunity.com/profiles/{76561197960265728 + i}'] = {
+            'current_status': (make_name(rng), status, ingame),
+            'flags': {'on_server': rng.random() < 0.8, 'in_game': rng.random() < 0.3},
+        }
+    return links_info_map
+
+
+def make_servers_info_map(size: int, seed: int = SEED, duplicates_share: float = 0.05) -> OrderedDict[str, Any]:
+    """
+    Some servers get an old name with the same address which is what remove_duplicates deals with.
+    """
+    rng = Random(seed)
+    servers_info_map = OrderedDict()
+    addrs = []
+    for i in range(size):
+        if addrs and rng.random() < duplicates_share:
+            addr = rng.choice(addrs)
+        else:
+            addr = (f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}', rng.randint(27015, 27115))
+            addrs.append(addr)
+        server_name = f'[{rng.choice(REGIONS)}] {rng.choice(WORDS)} {rng.choice(WORDS)} #{i} | {rng.choice(MAPS)}'
+        servers_info_map[server_name] = addr
+    return servers_info_map
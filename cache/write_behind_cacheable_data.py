@@ -0,0 +1,200 @@
+"""
+This is a module that defines a write-behind CacheableData wrapper for the async parts of the app.
+
+Updating the external cache of a wrapped cacheable data only marks its memory data dirty,
+the actual write is done by a background thread so pickling or serializing the whole cache doesn't block the event loop.
+All updates requested during one flush interval are coalesced into a single write.
+"""
+
+import atexit
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Event, Lock
+from time import monotonic
+from typing import Any, Generator, KeysView, Optional, Sequence, ValuesView
+
+from .abstract_cacheable_data import AbstractFileCacheableData
+
+from helpers import CONFIG
+from scan_log import SCAN_LOG
+
+
+FLUSH_INTERVAL = CONFIG['CACHE']['WRITE_BEHIND_FLUSH_INTERVAL']     # in secs. Limits the amount of unwritten data on crashes
+
+
+class WriteBehindCacheableData:
+    """
+    Caching using write-behind buffering over a file cacheable data.
+
+    Memory data mutations are guarded by a lock so the background thread can take a consistent snapshot of it.
+    Call flush or close on shutdown to make sure nothing is lost (close is also registered with atexit just in case).
+    """
+    flush_interval: float
+    _cacheable_data: AbstractFileCacheableData
+    _lock: Lock                         # Guards memory data mutations and the flush state below
+    _executor: ThreadPoolExecutor       # Single background thread for writes
+    _pending: Optional[Future]          # Scheduled or running flush
+    _dirty: bool                        # Whether the memory data has changes that aren't written yet
+    _last_flush_time: float
+    _flush_requested: Event             # Wakes up the scheduled flush before its interval ends
+    _is_closed: bool
+
+    def __init__(self, cacheable_data, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._cacheable_data = cacheable_data
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-write-behind')
+        self._pending = None
+        self._dirty = False
+        self._last_flush_time = -flush_interval
+        self._flush_requested = Event()
+        self._is_closed = False
+        atexit.register(self.close)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._cacheable_data!r})'
+
+    def __iter__(self) -> Generator[str, None, None]:
+        return iter(self._cacheable_data)
+
+    def __setitem__(self, key: str, value: Any):
+        with self._lock:
+            self._cacheable_data[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        return self._cacheable_data[key]
+
+    def __delitem__(self, key: str):
+        with self._lock:
+            del self._cacheable_data[key]
+
+    @property
+    def _data(self):
+        return self._cacheable_data._data
+
+    @property
+    def path(self) -> str:
+        return self._cacheable_data.path
+
+    @property
+    def evicted_count(self) -> int:
+        return self._cacheable_data.evicted_count
+
+    @property
+    def is_shared(self) -> bool:
+        return self._cacheable_data.is_shared
+
+    def items(self) -> Generator[tuple[str, Any], None, None]:
+        return self._cacheable_data.items()
+
+    def keys(self) -> KeysView[str]:
+        return self._cacheable_data.keys()
+
+    def values(self) -> ValuesView[Any]:
+        return self._cacheable_data.values()
+
+    def reorder_by(self, keys: Sequence):
+        with self._lock:
+            self._cacheable_data.reorder_by(keys)
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        return self._cacheable_data.get(key, default)
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._cacheable_data.set(key, value)
+
+    def get_age(self, key: str) -> Optional[float]:
+        return self._cacheable_data.get_age(key)
+
+    def evict(self) -> int:
+        with self._lock:
+            return self._cacheable_data.evict()
+
+    def refresh(self):
+        with self._lock:
+            self._cacheable_data.refresh()
+
+    def update_internal_cache(self):
+        """
+        Writes everything unwritten and then updates the memory data from the file cache.
+        """
+        self.flush()
+        with self._lock:
+            self._cacheable_data.update_internal_cache()
+
+    def update_external_cache(self):
+        """
+        Schedules the file cache update unless there is one already scheduled. Doesn't block.
+        Evicts keys right away (if bounded) so the background thread never mutates the memory data.
+        """
+        if self._is_closed:
+            self._cacheable_data.update_external_cache()
+            return
+        with self._lock:
+            self._cacheable_data.evict()
+            self._dirty = True
+            if self._pending is None:
+                self._pending = self._executor.submit(self._flush_when_due)
+
+    def flush(self):
+        """
+        Blocks until the memory data is written to the file cache if it has unwritten changes.
+        """
+        with self._lock:
+            pending = self._pending
+        if pending:
+            self._flush_requested.set()
+            pending.result()
+            self._flush_requested.clear()
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._cacheable_data.evict()
+            snapshot = self._cacheable_data.snapshot()
+        self._write(snapshot)
+
+    def close(self):
+        """
+        Flushes the memory data and stops the background thread. Safe to call more than once.
+        """
+        if self._is_closed:
+            return
+        self.flush()
+        self._is_closed = True
+        self._executor.shutdown(wait=True)
+        atexit.unregister(self.close)
+
+    def _flush_when_due(self):
+        """
+        Waits until the flush interval since the last write passes and writes the memory data snapshot.
+        Runs in the background thread and keeps writing while the memory data gets dirty again during writes.
+        """
+        while True:
+            self._flush_requested.wait(max(0.0, self._last_flush_time + self.flush_interval - monotonic()))
+            with self._lock:
+                if not self._dirty:
+                    self._pending = None
+                    return
+                self._dirty = False
+                snapshot = self._cacheable_data.snapshot()  # cheap shallow copy so the write itself doesn't hold the lock
+            if not self._write(snapshot):
+                with self._lock:    # not retrying in a loop, the next update or flush will try again
+                    self._pending = None
+                return
+
+    def _write(self, snapshot: AbstractFileCacheableData) -> bool:
+        """
+        Writes the snapshot to the file cache. Returns whether it succeeded.
+        """
+        try:
+            snapshot.update_external_cache()
+        except Exception as e:  # not losing the changes, they stay dirty
+            SCAN_LOG.error('[WRITE-BEHIND FLUSH FAILED]', e)
+            with self._lock:
+                self._cacheable_data.restore_changes(snapshot)  # or the retry wouldn't merge them into a shared file cache
+                self._dirty = True
+            return False
+        finally:
+            self._last_flush_time = monotonic()
+        return True
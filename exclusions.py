@@ -0,0 +1,171 @@
+"""
+This is a module with the index of runtime exclusions (see main.py commands):
+    __all__      name       <-  a name is excluded on every server;
+    1.1.1.1:1    name       <-  a name is excluded on a specific server by its ip:port;
+    1.1.1.1:1    __all__    <-  a server is excluded for all names, so it isn't even requested.
+They're removed the same way they were added (ex. removing "__all__ name" doesn't remove "1.1.1.1:1 name").
+
+Checks are O(1) lookups in frozensets of a snapshot. The input thread adds exclusions by building a new snapshot
+and swapping the reference, so the scanning thread always sees either the old or the new snapshot whole, never a half updated one.
+Exclusions are kept in CacheableData (address or __all__ to excluded names) so they survive restarts.
+"""
+
+from os.path import join
+from threading import Lock
+from typing import NamedTuple
+
+from cache.abstract_cacheable_data import CacheableData
+from cache.cacheable_data import PickleCacheableData
+from helpers import BASE_DIR
+
+
+ALL = '__all__'
+EXCLUSIONS_PATH = join(BASE_DIR, r'data\exclusions_cache_prod.bin')
+
+
+class ExclusionSnapshot(NamedTuple):
+    servers: frozenset[str]                 # Excluded server addresses
+    names: frozenset[str]                   # Names excluded on every server
+    servers_names: frozenset[tuple[str, str]]   # (address, name) exclusions
+
+
+def get_snapshot(exclusions_map) -> ExclusionSnapshot:
+    servers, names, servers_names = set(), set(), set()
+    for address, excluded_names in exclusions_map.items():
+        for name in excluded_names:
+            if address == ALL:
+                names.add(name)
+            elif name == ALL:
+                servers.add(address)
+            else:
+                servers_names.add((address, name))
+    return ExclusionSnapshot(frozenset(servers), frozenset(names), frozenset(servers_names))
+
+
+class ExclusionIndex:
+    exclusions_map: CacheableData   # Addresses (or __all__) to lists of excluded names (or __all__)
+    _snapshot: ExclusionSnapshot    # Replaced whole on every change
+    _lock: Lock                     # Serializes writers. Readers don't need it
+
+    def __init__(self, exclusions_map=None):
+        self.exclusions_map = exclusions_map if exclusions_map is not None else PickleCacheableData(EXCLUSIONS_PATH)
+        self._snapshot = get_snapshot(self.exclusions_map)
+        self._lock = Lock()
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self.get_exclusions_map())})'
+
+    def add(self, address: str, name: str):
+        """
+        Adds an exclusion and saves exclusions. Address and name might be __all__ (but not both).
+        """
+        if address == ALL and name == ALL:
+            raise ValueError('Excluding every name on every server makes no sense.')
+        with self._lock:
+            excluded_names = self.exclusions_map.get(address, [])
+            if name in excluded_names:
+                return
+            self.exclusions_map.set(address, excluded_names + [name])
+            self.exclusions_map.update_external_cache()
+            self._snapshot = get_snapshot(self.exclusions_map)
+
+    def remove(self, address: str, name: str) -> bool:
+        """
+        Removes an exclusion and saves exclusions. Returns False if there was no such exclusion.
+        """
+        with self._lock:
+            excluded_names = self.exclusions_map.get(address, [])
+            if name not in excluded_names:
+                return False
+            excluded_names = [excluded_name for excluded_name in excluded_names if excluded_name != name]
+            if excluded_names:
+                self.exclusions_map.set(address, excluded_names)
+            else:
+                del self.exclusions_map[address]
+            self.exclusions_map.update_external_cache()
+            self._snapshot = get_snapshot(self.exclusions_map)
+        return True
+
+    def is_server_excluded(self, address: str) -> bool:
+        return address in self._snapshot.servers
+
+    def is_name_excluded(self, address: str, name: str) -> bool:
+        snapshot = self._snapshot   # one snapshot for all checks
+        return address in snapshot.servers or name in snapshot.names or (address, name) in snapshot.servers_names
+
+    def get_exclusions_map(self) -> dict[str, set[str]]:
+        """
+        Gets addresses (or __all__) to excluded names (or __all__). Built from the snapshot so writers don't need to be waited for.
+        """
+        snapshot = self._snapshot
+        exclusions_map: dict[str, set[str]] = {}
+        if snapshot.names:
+            exclusions_map[ALL] = set(snapshot.names)
+        for address in snapshot.servers:
+            exclusions_map.setdefault(address, set()).add(ALL)
+        for address, name in snapshot.servers_names:
+            exclusions_map.setdefault(address, set()).add(name)
+        return exclusions_map
+
+    def flush(self):
+        self.exclusions_map.flush()
+
+
+# TESTING
+
+def test_exclusion_index_procedure():
+    from tempfile import TemporaryDirectory
+    from threading import Thread
+
+    from helpers import CONSOLE
+
+    CONSOLE.print('[START EXCLUSION INDEX TEST PROCEDURE]')
+    with TemporaryDirectory() as directory:
+        path = join(directory, 'exclusions.bin')
+        exclusion_index = ExclusionIndex(PickleCacheableData(path))
+        exclusion_index.add(ALL, 'Everywhere')
+        exclusion_index.add('1.1.1.1:1', ALL)
+        exclusion_index.add('2.2.2.2:2', 'There')
+        exclusion_index = ExclusionIndex(PickleCacheableData(path))     # restart
+        assert exclusion_index.is_server_excluded('1.1.1.1:1') and not exclusion_index.is_server_excluded('2.2.2.2:2')
+        assert exclusion_index.is_name_excluded('1.1.1.1:1', 'Anyone')
+        assert exclusion_index.is_name_excluded('3.3.3.3:3', 'Everywhere')
+        assert exclusion_index.is_name_excluded('2.2.2.2:2', 'There') and not exclusion_index.is_name_excluded('3.3.3.3:3', 'There')
+        try:
+            exclusion_index.add(ALL, ALL)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Everything was excluded')
+
+        def add_exclusions():
+            for i in range(1000):
+                exclusion_index.add(f'4.4.4.4:{i}', ALL)
+
+        writer = Thread(target=add_exclusions)
+        writer.start()
+        checks = 0
+        while writer.is_alive():    # reads never see a broken index
+            checks += exclusion_index.is_name_excluded('4.4.4.4:999', 'Anyone') in (True, False)
+        writer.join()
+        assert all(exclusion_index.is_server_excluded(f'4.4.4.4:{i}') for i in range(1000))
+        writer = Thread(target=lambda: [exclusion_index.add(f'5.5.5.5:{i}', 'Someone') for i in range(1000)])
+        writer.start()
+        while writer.is_alive():    # neither do maps of exclusions
+            exclusion_index.get_exclusions_map()
+        writer.join()
+        exclusions_map = exclusion_index.get_exclusions_map()
+        assert len(exclusions_map) == 3 + 2000 and exclusions_map[ALL] == {'Everywhere'}
+        CONSOLE.print(f'{checks} checks while 1000 exclusions were added from another thread')
+
+        assert exclusion_index.remove('1.1.1.1:1', ALL) and not exclusion_index.remove('1.1.1.1:1', ALL)
+        assert not exclusion_index.remove('3.3.3.3:3', 'Everywhere')
+        exclusion_index = ExclusionIndex(PickleCacheableData(path))     # restart
+        assert not exclusion_index.is_server_excluded('1.1.1.1:1') and '1.1.1.1:1' not in exclusion_index.get_exclusions_map()
+        assert exclusion_index.is_name_excluded('3.3.3.3:3', 'Everywhere')
+        CONSOLE.print('Exclusions are removed the way they were added')
+    CONSOLE.print('[END EXCLUSION INDEX TEST PROCEDURE]')
+
+
+if __name__ == '__main__':
+    test_exclusion_index_procedure()
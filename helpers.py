@@ -12,9 +12,12 @@ import hjson
 
 def validate_address(string: str):
     """
-    Primitive address validation function
+    Primitive ip:port address validation function
     """
-    return all(char in '01234567890.:' for char in string) and string.count('.') == 3 and string.count(':') == 1
+    if not (all(char in '0123456789.:' for char in string) and string.count('.') == 3 and string.count(':') == 1):
+        return False
+    ip, port = string.split(':')
+    return all(ip.split('.')) and port != '' and 0 < int(port) < 65536
 
 
 def ip_to_addr(ip):
@@ -32,17 +35,16 @@ def pickle_data(data, path):
         pickle.dump(data, fw)
 
 
+DIACRITICS_TABLE = dict.fromkeys(range(768, 880))   # str.translate deletes chars mapped to None
+
+
 def remove_diacritics(string: str) -> str:
     """
     This is an attempt to prevent table breaking its own grid with some of unicode chars.
     Only works if those chars are diacritics for now
     P.S. spent about 6 hours for these 5 lines of code.
     """
-    s = string
-    for i in range(768, 880):
-        h = chr(i)
-        s = s.replace(h, '')
-    return s
+    return string.translate(DIACRITICS_TABLE)
 
 
 def remove_unprintable(string: str) -> str:
@@ -66,7 +68,8 @@ def create_file_if_file_does_not_exist(path):
     """
     open(path, 'a').close()
 
-with open('config.hjson') as f:
+CONFIG_PATH = 'config.hjson'
+with open(CONFIG_PATH) as f:
     CONFIG = hjson.load(f)
 CONSOLE = Console(record=False)  # change to true for logs
 APP_ID = 'Search for players'  # String by which notifications are going to be grouped
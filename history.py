@@ -0,0 +1,406 @@
+"""
+This is a module with the append-only history of sightings of tracked players: every cycle every matched player
+on every server is appended as a fixed size record (timestamp, server id, player name id, score, duration).
+
+Player names and servers ("<ip:port> <server name>") are interned per segment: they're written once to append-only .jsonl files
+of the segment and its records only have their ids (line numbers). So strings go away with the segments that use them.
+Records go to segment files. A new segment is started when the current one gets SEGMENT_SIZE bytes and the oldest ones
+are deleted when all files of all of them (records, strings and indexes) take more than MAX_SIZE bytes, so disk use is bounded.
+Every segment has an index (.idx file, written when the segment is sealed and on close) of its first and last timestamps
+(sparse time index: segments out of a queried time range aren't opened) and of record numbers of every player name in it
+(name index: only records of the queried name are read, with binary search by time in them).
+"""
+
+import json
+import mmap
+import pickle
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from os import listdir, makedirs, remove
+from os.path import exists, getsize, join
+from threading import Lock
+from time import time
+from typing import BinaryIO, Iterable, NamedTuple, Optional, TextIO
+
+from helpers import BASE_DIR, CONFIG
+from scan_results import ServerScan
+
+
+HISTORY_ENABLED = CONFIG['HISTORY']['ENABLED']
+HISTORY_DIR = join(BASE_DIR, CONFIG['HISTORY']['DIR'])
+SEGMENT_SIZE = CONFIG['HISTORY']['SEGMENT_SIZE']    # in bytes
+MAX_SIZE = CONFIG['HISTORY']['MAX_SIZE']            # in bytes
+
+RECORD_STRUCT = struct.Struct('<dIIif')     # timestamp, server id, player name id, score, duration
+STAY_GAP = 3 * CONFIG['MAIN']['MINIMUM_CYCLE_PERIOD']    # in secs. Sightings on one server further apart than this are separate stays
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.bin'
+INDEX_SUFFIX = '.idx'
+NAMES_SUFFIX = '.names.jsonl'
+SERVERS_SUFFIX = '.servers.jsonl'
+
+
+class Sighting(NamedTuple):
+    timestamp: float    # in secs since epoch
+    address: str
+    server_name: str
+    player_name: str
+    score: int
+    duration: float     # playtime in secs
+
+
+def get_stays(sightings: list[Sighting], max_gap: float = STAY_GAP) -> list[tuple[Sighting, Sighting]]:
+    """
+    Groups sightings (in order of time) of a player name into stays on servers. Returns first and last sightings of every stay.
+    """
+    stays: list[tuple[Sighting, Sighting]] = []
+    open_stays: dict[str, int] = {}     # addresses to indexes of their latest stays
+    for sighting in sightings:
+        i = open_stays.get(sighting.address)
+        if i is not None and sighting.timestamp - stays[i][1].timestamp <= max_gap:
+            stays[i] = (stays[i][0], sighting)
+        else:
+            open_stays[sighting.address] = len(stays)
+            stays.append((sighting, sighting))
+    return stays
+
+
+class InternedStrings:
+    """
+    Strings in an append-only .jsonl file (a JSON string per line). Id of a string is its line number.
+    The file is opened for appending only when a new string is interned.
+    """
+    path: str
+    strings: list[str]
+    ids_map: dict[str, int]
+    size: int                       # of the file in bytes
+    _file: Optional[TextIO]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.strings = []
+        self.ids_map = {}
+        self.size = 0
+        self._file = None
+        if exists(path):
+            with open(path, 'rb') as file:
+                for line in file:
+                    try:
+                        string = json.loads(line)
+                    except json.JSONDecodeError:    # a line that was cut off by a crash. Records with its id weren't written
+                        break
+                    self.ids_map.setdefault(string, len(self.strings))
+                    self.strings.append(string)
+                    self.size += len(line)
+            if getsize(path) != self.size:
+                with open(path, 'r+b') as file:
+                    file.truncate(self.size)
+
+    def get_id(self, string: str) -> Optional[int]:
+        return self.ids_map.get(string)
+
+    def intern(self, string: str) -> int:
+        string_id = self.ids_map.get(string)
+        if string_id is None:
+            string_id = self.ids_map[string] = len(self.strings)
+            self.strings.append(string)
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8', newline='\n')
+            line = json.dumps(string) + '\n'   # ascii only so its length is its size
+            self._file.write(line)
+            self.size += len(line)
+        return string_id
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Segment:
+    """
+    A segment file of records with its strings and index. Records are in order of time.
+    """
+    path: str
+    first_time: float
+    last_time: float
+    count: int                      # Amount of records
+    postings: dict[int, array]      # Player name ids to numbers of their records
+    names: InternedStrings          # Player names of records of the segment
+    servers: InternedStrings        # "<ip:port> <server name>" of records of the segment
+    index_size: int                 # of the .idx file in bytes (0 if it isn't saved)
+
+    def __init__(self, path: str):
+        self.path = path
+        self.first_time = float('inf')
+        self.last_time = float('-inf')
+        self.count = 0
+        self.postings = {}
+        base_path = path[:-len(SEGMENT_SUFFIX)]
+        self.names = InternedStrings(base_path + NAMES_SUFFIX)
+        self.servers = InternedStrings(base_path + SERVERS_SUFFIX)
+        self.index_size = 0
+
+    @property
+    def index_path(self) -> str:
+        return self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+    @classmethod
+    def load(cls, path: str) -> 'Segment':
+        """
+        Loads the strings and the index of a segment. Rebuilds the index from records if it's missing or outdated (ex. after a crash).
+        A record cut off by a crash is removed.
+        """
+        count, remainder = divmod(getsize(path), RECORD_STRUCT.size)
+        if remainder:
+            with open(path, 'r+b') as file:
+                file.truncate(count * RECORD_STRUCT.size)
+        segment = cls(path)
+        try:
+            with open(segment.index_path, 'rb') as file:
+                first_time, last_time, index_count, postings = pickle.load(file)
+            segment.index_size = getsize(segment.index_path)
+            if index_count == count:
+                segment.first_time, segment.last_time, segment.count, segment.postings = first_time, last_time, count, postings
+                return segment
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+            pass
+        with open(path, 'rb') as file:
+            segment.add(RECORD_STRUCT.iter_unpack(file.read()))
+        return segment
+
+    def get_size(self) -> int:
+        return self.count * RECORD_STRUCT.size + self.names.size + self.servers.size + self.index_size
+
+    def add(self, records: Iterable[tuple[float, int, int, int, float]]):
+        for timestamp, _, name_id, _, _ in records:
+            self.first_time = min(self.first_time, timestamp)
+            self.last_time = max(self.last_time, timestamp)
+            self.postings.setdefault(name_id, array('I')).append(self.count)
+            self.count += 1
+
+    def save_index(self):
+        with open(self.index_path, 'wb') as file:
+            pickle.dump((self.first_time, self.last_time, self.count, self.postings), file)
+        self.index_size = getsize(self.index_path)
+
+    def close(self):
+        self.names.close()
+        self.servers.close()
+
+    def delete(self):
+        self.close()
+        for path in (self.path, self.index_path, self.names.path, self.servers.path):
+            if exists(path):
+                remove(path)
+
+    def get_sighting(self, record: tuple[float, int, int, int, float]) -> Sighting:
+        timestamp, server_id, name_id, score, duration = record
+        address, server_name = self.servers.strings[server_id].split(' ', 1)
+        return Sighting(timestamp, address, server_name, self.names.strings[name_id], score, duration)
+
+    def read(self, player_name: str, since: float, until: float) -> list[tuple[float, int, int, int, float]]:
+        """
+        Reads records of a player name in the time range (inclusive).
+        """
+        name_id = self.names.get_id(player_name)
+        record_numbers = self.postings.get(name_id) if name_id is not None else None
+        if not record_numbers or self.last_time < since or self.first_time > until:
+            return []
+        with open(self.path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as segment_map:
+            def get_timestamp(i):
+                return RECORD_STRUCT.unpack_from(segment_map, record_numbers[i] * RECORD_STRUCT.size)[0]
+            start = bisect_left(range(len(record_numbers)), since, key=get_timestamp)
+            end = bisect_right(range(len(record_numbers)), until, lo=start, key=get_timestamp)
+            return [RECORD_STRUCT.unpack_from(segment_map, record_numbers[i] * RECORD_STRUCT.size) for i in range(start, end)]
+
+    def read_last(self, player_name: str) -> Optional[tuple[float, int, int, int, float]]:
+        name_id = self.names.get_id(player_name)
+        record_numbers = self.postings.get(name_id) if name_id is not None else None
+        if not record_numbers:
+            return None
+        with open(self.path, 'rb') as file:
+            file.seek(record_numbers[-1] * RECORD_STRUCT.size)
+            return RECORD_STRUCT.unpack(file.read(RECORD_STRUCT.size))
+
+
+class HistoryStore:
+    """
+    Appends sightings of ServerScans of every cycle and answers where a player name was seen.
+    The input thread queries it while the scanning thread appends so both take the lock.
+    """
+    directory: str
+    segment_size: int               # in bytes of records
+    max_size: int                   # in bytes of all files
+    segments: list[Segment]         # The last one is the one being appended to
+    _file: Optional[BinaryIO]       # Append handle of the last segment
+    _lock: Lock
+
+    def __init__(self, directory=HISTORY_DIR, segment_size=SEGMENT_SIZE, max_size=MAX_SIZE):
+        makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_size = max_size
+        self.segments = [Segment.load(join(directory, file_name)) for file_name in sorted(listdir(directory))
+                         if file_name.startswith(SEGMENT_PREFIX) and file_name.endswith(SEGMENT_SUFFIX)]
+        self._file = None
+        self._lock = Lock()
+
+    def get_size(self) -> int:
+        return sum(segment.get_size() for segment in self.segments)
+
+    def _rotate(self, timestamp: float):
+        if self._file is not None:
+            self._file.close()
+        if self.segments:
+            self.segments[-1].close()
+            self.segments[-1].save_index()
+        path = join(self.directory, f'{SEGMENT_PREFIX}{int(timestamp * 1000):015d}{SEGMENT_SUFFIX}')
+        self.segments.append(Segment.load(path) if exists(path) else Segment(path))
+        self._file = open(path, 'ab')
+
+    def _delete_oldest(self):
+        while len(self.segments) > 1 and self.get_size() > self.max_size:
+            self.segments.pop(0).delete()
+
+    def add_scans(self, server_scans: Iterable[ServerScan]):
+        """
+        Appends sightings of matched players of server scans of a cycle.
+        """
+        with self._lock:
+            sightings = sorted((server_scan.scan_time, f'{server_scan.address} {server_scan.server_name}', player_record.player_name,
+                                player_record.score, player_record.duration)
+                               for server_scan in server_scans for player_record in server_scan)
+            i = 0
+            while i < len(sightings):
+                is_full = not self.segments or self.segments[-1].count * RECORD_STRUCT.size >= self.segment_size
+                if is_full:
+                    self._rotate(sightings[i][0])
+                elif self._file is None:   # the last segment of the previous run isn't full
+                    self._file = open(self.segments[-1].path, 'ab')
+                segment = self.segments[-1]
+                segment_records = [(timestamp, segment.servers.intern(server), segment.names.intern(player_name), score, duration)
+                                   for timestamp, server, player_name, score, duration in
+                                   sightings[i:i + max(1, (self.segment_size // RECORD_STRUCT.size) - segment.count)]]
+                segment.names.flush()      # before records so they never have ids that aren't saved
+                segment.servers.flush()
+                self._file.write(b''.join(RECORD_STRUCT.pack(*record) for record in segment_records))    # type: ignore
+                segment.add(segment_records)
+                i += len(segment_records)
+            if self._file is not None:
+                self._file.flush()
+            self._delete_oldest()
+
+    def query(self, player_name: str, since: float = float('-inf'), until: float = float('inf')) -> list[Sighting]:
+        """
+        Gets sightings of a player name (exact) in the time range (in secs since epoch) in order of time.
+        """
+        with self._lock:
+            return [segment.get_sighting(record) for segment in self.segments for record in segment.read(player_name, since, until)]
+
+    def get_last_seen(self, player_name: str) -> Optional[Sighting]:
+        with self._lock:
+            for segment in reversed(self.segments):
+                record = segment.read_last(player_name)
+                if record is not None:
+                    return segment.get_sighting(record)
+            return None
+
+    def flush(self):
+        """
+        Saves the index of the current segment so it isn't rebuilt on the next start.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self.segments[-1].save_index()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            for segment in self.segments:
+                segment.close()
+
+
+# TESTING/BENCHMARKING
+
+
+def test_history_procedure():
+    import tempfile
+    from scan_results import PlayerRecord
+    print('[START HISTORY TEST PROCEDURE]')
+    from os.path import getsize
+
+    def get_directory_size(directory):
+        return sum(getsize(join(directory, file_name)) for file_name in listdir(directory))
+
+    with tempfile.TemporaryDirectory() as directory:
+        max_size = 800  # 3 segments of 4 records with their strings and indexes take 796 bytes
+        history_store = HistoryStore(directory, segment_size=RECORD_STRUCT.size * 4, max_size=max_size)
+        for minute in range(5):
+            history_store.add_scans([
+                ServerScan('server', '1.1.1.1:1', minute * 60., [PlayerRecord('a', 'a', minute, 60. * minute + 1),
+                                                                 PlayerRecord('b', 'b', 0, 1.)]),
+                ServerScan('другой', '2.2.2.2:2', minute * 60. + 1, [PlayerRecord('a', 'a', 0, 1.)])])
+        assert [segment.count for segment in history_store.segments] == [4, 4, 3]  # the first 4 were deleted with their strings
+        assert history_store.get_size() == get_directory_size(directory) <= max_size
+        sightings = history_store.query('a')
+        assert [(sighting.timestamp, sighting.address) for sighting in sightings] == [
+            (61., '2.2.2.2:2'), (120., '1.1.1.1:1'), (121., '2.2.2.2:2'), (180., '1.1.1.1:1'),
+            (181., '2.2.2.2:2'), (240., '1.1.1.1:1'), (241., '2.2.2.2:2')], sightings
+        assert [sighting.timestamp for sighting in history_store.query('a', 121, 180)] == [121., 180.]
+        assert history_store.get_last_seen('a') == Sighting(241., '2.2.2.2:2', 'другой', 'a', 0, 1.)
+        assert history_store.query('nobody') == [] and history_store.get_last_seen('nobody') is None
+        assert [(first.timestamp, last.timestamp) for first, last in get_stays(sightings, max_gap=60)] == [(61., 241.), (120., 240.)]
+        history_store.close()
+
+        with open(history_store.segments[-1].path, 'ab') as file:   # a record cut off by a crash
+            file.write(b'\0' * 5)
+        with open(history_store.segments[-1].names.path, 'a') as file:     # and a string
+            file.write('"cut')
+        history_store = HistoryStore(directory, segment_size=RECORD_STRUCT.size * 4, max_size=max_size)
+        assert len(history_store.query('a')) == 7 and history_store.get_size() == get_directory_size(directory)
+        history_store.add_scans([ServerScan('server', '1.1.1.1:1', 300., [PlayerRecord('c', 'c', 0, 1.)])])
+        assert history_store.get_last_seen('c').timestamp == 300.
+        assert history_store.get_size() == get_directory_size(directory) <= max_size
+        history_store.close()
+    print('Sightings are appended, rotated, bounded and queried by name and time')
+    print('[END HISTORY TEST PROCEDURE]')
+
+
+def benchmark_history_procedure(names_amount=50, servers_amount=20, days=7):
+    """
+    Appends a sighting of every name every minute for days and queries sightings of one name of the last day and of all days.
+    """
+    import tempfile
+    from random import randrange
+    from timeit import timeit
+    from scan_results import PlayerRecord
+    with tempfile.TemporaryDirectory() as directory:
+        history_store = HistoryStore(directory, max_size=2**30)
+        start_time = time() - days * 86400
+        append_time = timeit(lambda: [history_store.add_scans(
+            ServerScan(f'server {i}', f'10.0.0.{i}:27015', start_time + minute * 60, [
+                PlayerRecord(f'player {j}', f'player {j}', randrange(100), 60. * minute + 1)
+                for j in range(i, names_amount, servers_amount)])
+            for i in range(servers_amount)) for minute in range(days * 1440)], number=1)
+        last_day_time = timeit(lambda: history_store.query('player 7', time() - 86400), number=10) / 10
+        all_time = timeit(lambda: history_store.query('player 7'), number=10) / 10
+        last_seen_time = timeit(lambda: history_store.get_last_seen('player 7'), number=10) / 10
+        print(f'{len(history_store.segments)} segments, {history_store.get_size() / 2**20:.1f} MiB, appending {append_time:.2f} s; '
+              f'querying a name: last day {last_day_time*1000:.1f} ms, {days} days {all_time*1000:.1f} ms, '
+              f'last seen {last_seen_time*1000:.2f} ms')
+        history_store.close()
+
+
+if __name__ == '__main__':
+    test_history_procedure()
+    benchmark_history_procedure()
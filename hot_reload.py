@@ -0,0 +1,259 @@
+"""
+This is a module that applies changes of links options and config files without restarting the app.
+
+Restarting loses warm state: the kept alive event loop and connections of the name parser, resolved vanity names
+and in-memory caches. So files are polled by their mtimes at cycle boundaries (one stat call per file per cycle)
+and their changes are validated and applied to the running parsers, which only reset what the changes affect.
+
+Only settings in HOT_RELOADABLE_MAP are applied, changes of the rest are reported as needing a restart.
+An invalid file is reported and ignored until it's fixed, the previous settings stay.
+"""
+
+from os import stat
+from typing import Any, Optional
+
+import hjson
+
+from helpers import CONFIG, CONFIG_PATH, CONSOLE, LINKS_FLAGS_MAP_PATH
+from name_matching import PatternsIndex, is_pattern
+from scan_log import get_log_level
+
+
+HOT_RELOAD = CONFIG['MAIN']['HOT_RELOAD']
+HOT_RELOADABLE_MAP = {  # config sections to their settings that can be changed at runtime
+    'MAIN': {'HARDCODED_NAMES', 'MINIMUM_CYCLE_PERIOD', 'MINIMUM_SLEEP_TIME', 'EXPORT_SNAPSHOTS', 'LOG_LEVEL'},
+    'SERVER_PARSERS': {'MAX_FAILS_CON', 'TIMEOUT_TIME', 'MAX_REQUESTS_PER_SECOND', 'FOLD_HOMOGLYPHS', 'STRIP_CLAN_TAGS', 'NAME_MEMO_SIZE',
+                       'RENOTIFY_INTERVAL', 'NOTIFY_LEAVES', 'JOIN_TIME_TOLERANCE'},
+    'NAME_PARSERS': {'TIMEOUT_TIME', 'MAX_FAILS_CON', 'INGAMES', 'PROFILE_EXTRACTOR', 'CONDITIONAL_REQUESTS', 'ON_SERVER_FRESHNESS',
+                     'MAX_PENDING_PARSES', 'MAX_CONCURRENT_REQUESTS', 'CONNECTOR_OPTIONS', 'RETRY_BACKOFF', 'RETRY_BACKOFF_MAX', 'BATCH_SIZE'},
+}
+
+
+def is_same_type(old_value, new_value) -> bool:
+    """
+    Checks that a new setting value has the type of the old one. Ints and floats are interchangeable, nulls are allowed.
+    """
+    if old_value is None or new_value is None:
+        return True
+    if isinstance(old_value, bool) or isinstance(new_value, bool):
+        return type(old_value) is type(new_value)
+    if isinstance(old_value, (int, float)):
+        return isinstance(new_value, (int, float))
+    return type(old_value) is type(new_value)
+
+
+def load_links_flags_map(path: str = LINKS_FLAGS_MAP_PATH) -> dict[str, dict[str, bool]]:
+    """
+    Loads links options. Raises ValueError if they aren't a map of links to maps of flags to booleans.
+    """
+    with open(path) as f:
+        links_flags_map = hjson.loads(f.read())
+    if not isinstance(links_flags_map, dict):
+        raise ValueError('Links options must be a map of links to flags maps.')
+    for link, flags in links_flags_map.items():
+        if not isinstance(flags, dict) or not all(isinstance(flag, str) and isinstance(value, bool) for flag, value in flags.items()):
+            raise ValueError(f'Flags of {link} must be a map of flags to true or false.')
+    return dict(links_flags_map)
+
+
+def load_config(config: dict[str, Any], path: str = CONFIG_PATH) -> dict[str, Any]:
+    """
+    Loads config. Raises ValueError if it lacks sections or settings of the current config
+    or if a setting has another type than in the current config.
+    """
+    with open(path) as f:
+        new_config = hjson.load(f)
+    for section, settings in config.items():
+        if not isinstance(new_config.get(section), dict):
+            raise ValueError(f'Config has no {section} section.')
+        for key, value in settings.items():
+            if key not in new_config[section]:
+                raise ValueError(f'Config has no {section}.{key} setting.')
+            if not is_same_type(value, new_config[section][key]):
+                raise ValueError(f'{section}.{key} must be of {type(value).__name__} type.')
+    patterns = [name for name in new_config['MAIN']['HARDCODED_NAMES'] if is_pattern(name)]
+    PatternsIndex(patterns)     # raises ValueError on invalid patterns
+    get_log_level(new_config['MAIN']['LOG_LEVEL'])
+    return new_config
+
+
+def get_config_changes(config: dict[str, Any], new_config: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """
+    Gets changed settings by sections.
+    """
+    changes: dict[str, dict[str, Any]] = {}
+    for section, settings in config.items():
+        for key, value in settings.items():
+            if new_config[section][key] != value:
+                changes.setdefault(section, {})[key] = new_config[section][key]
+    return changes
+
+
+class FileWatcher:
+    """
+    Polls files for changes by their mtimes and sizes.
+    """
+    paths: list[str]
+    _stats: dict[str, Optional[tuple[int, int]]]   # Paths to their mtimes (ns) and sizes when they were last polled
+
+    def __init__(self, paths: list[str]):
+        self.paths = paths
+        self._stats = {path: self.get_stat(path) for path in paths}
+
+    @staticmethod
+    def get_stat(path: str) -> Optional[tuple[int, int]]:
+        try:
+            stat_result = stat(path)
+        except OSError:     # might be in the middle of being saved
+            return None
+        return stat_result.st_mtime_ns, stat_result.st_size
+
+    def poll(self) -> list[str]:
+        """
+        Gets paths of files that have changed since the last poll. Missing files aren't reported.
+        """
+        changed = []
+        for path in self.paths:
+            file_stat = self.get_stat(path)
+            if file_stat is not None and file_stat != self._stats[path]:
+                changed.append(path)
+            self._stats[path] = file_stat
+        return changed
+
+
+class HotReloader:
+    """
+    Applies links options and config changes to running name and server parsers at cycle boundaries.
+    """
+    name_parser: Any        # NameParser
+    server_parser: Any      # ServerParser
+    watcher: FileWatcher
+    links_flags_map_path: str
+    config_path: str
+    config: dict[str, Any]  # Config that's applied now. helpers.CONFIG is updated in place along with it
+    restart_changes: dict[tuple[str, str], Any]     # Changed settings that need a restart, so they're reported once
+
+    def __init__(self, name_parser, server_parser, links_flags_map_path=LINKS_FLAGS_MAP_PATH, config_path=CONFIG_PATH, config=CONFIG):
+        self.name_parser = name_parser
+        self.server_parser = server_parser
+        self.links_flags_map_path = links_flags_map_path
+        self.config_path = config_path
+        self.config = config
+        self.restart_changes = {}
+        self.watcher = FileWatcher([links_flags_map_path, config_path])
+
+    def reload_links_flags_map(self):
+        links_flags_map = load_links_flags_map(self.links_flags_map_path)
+        self.name_parser.set_links_flags_map(links_flags_map)
+        CONSOLE.print(f'[HOT RELOAD] {len(links_flags_map)} links options applied', style='bold green')
+
+    def reload_config(self) -> dict[str, Any]:
+        """
+        Applies changed settings to the parsers and returns changed MAIN settings for the caller to apply.
+        """
+        new_config = load_config(self.config, self.config_path)
+        changes = get_config_changes(self.config, new_config)
+        for section, settings in changes.items():
+            for key in settings.keys() - HOT_RELOADABLE_MAP.get(section, set()):
+                if self.restart_changes.get((section, key)) != settings[key]:
+                    self.restart_changes[section, key] = settings[key]
+                    CONSOLE.print(f'[HOT RELOAD] {section}.{key} changed, restart to apply it', style='bold yellow')
+        reloadable_changes = {section: {key: value for key, value in settings.items() if key in HOT_RELOADABLE_MAP.get(section, set())}
+                              for section, settings in changes.items()}
+        self.name_parser.apply_config(reloadable_changes.get('NAME_PARSERS', {}))
+        self.server_parser.apply_config(reloadable_changes.get('SERVER_PARSERS', {}))
+        for section, settings in reloadable_changes.items():
+            for key, value in settings.items():
+                self.config[section][key] = value
+                CONSOLE.print(f'[HOT RELOAD] {section}.{key} = {value}', style='bold green')
+        return reloadable_changes.get('MAIN', {})
+
+    def check(self) -> dict[str, Any]:
+        """
+        Applies changes of the watched files if there are any. Call it between cycles.
+        Returns changed MAIN settings (empty if there are none) since only the caller knows how to apply them.
+        """
+        main_changes: dict[str, Any] = {}
+        for path in self.watcher.poll():
+            try:
+                if path == self.links_flags_map_path:
+                    self.reload_links_flags_map()
+                else:
+                    main_changes = self.reload_config()
+            except (OSError, ValueError, hjson.HjsonDecodeError) as e:
+                CONSOLE.print(f'[HOT RELOAD] {path} is not applied: {e}', style='bold red')
+        return main_changes
+
+
+# TESTING
+
+def test_hot_reload_procedure():
+    from copy import deepcopy
+    from os import utime
+    from os.path import join
+    from tempfile import TemporaryDirectory
+
+    from cache.cacheable_data import PickleCacheableData
+    from exclusions import ExclusionIndex
+    from name_parsers import SyncNameParser
+    from presence import PresenceTracker
+    from server_parsers import AsyncServerParser
+    from steam_links import SteamIdResolver
+
+    def write(path, data):
+        with open(path, 'w') as f:
+            hjson.dump(data, f)
+        file_stat = stat(path)
+        utime(path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1_000_000))    # mtime resolution might be coarse
+
+    CONSOLE.print('[START HOT RELOAD TEST PROCEDURE]')
+    with TemporaryDirectory() as directory:
+        links_path, config_path = join(directory, 'links_options.hjson'), join(directory, 'config.hjson')
+        config = deepcopy(CONFIG)
+        links_flags_map = {'https://steamcommunity.com/profiles/1': {'on_server': True, 'in_game': False}}
+        write(links_path, links_flags_map)
+        write(config_path, config)
+        name_parser = SyncNameParser(PickleCacheableData(join(directory, 'names.bin')), links_flags_map=links_flags_map,
+                                     steamid_resolver=SteamIdResolver(PickleCacheableData(join(directory, 'steamids.bin'))))
+        server_parser = AsyncServerParser(presence_tracker=PresenceTracker(PickleCacheableData(join(directory, 'presence.bin'))),
+                                          exclusion_index=ExclusionIndex(PickleCacheableData(join(directory, 'exclusions.bin'))))
+        name_matcher = server_parser.name_matcher
+        hot_reloader = HotReloader(name_parser, server_parser, links_path, config_path, config)
+        assert hot_reloader.check() == {}
+
+        links_flags_map['https://www.steamcommunity.com/profiles/2/'] = {'on_server': True, 'in_game': True}
+        write(links_path, links_flags_map)
+        hot_reloader.check()
+        assert name_parser.get_all_links() == ['https://steamcommunity.com/profiles/1', 'https://steamcommunity.com/profiles/2']
+
+        new_config = deepcopy(config)
+        new_config['MAIN']['MINIMUM_CYCLE_PERIOD'] += 1
+        new_config['NAME_PARSERS']['TIMEOUT_TIME'] += 1
+        new_config['SERVER_PARSERS']['MAX_FAILS_CON'] += 1
+        new_config['CACHE']['SERVER_NAMES_TTL'] += 1    # needs a restart
+        write(config_path, new_config)
+        assert hot_reloader.check() == {'MINIMUM_CYCLE_PERIOD': new_config['MAIN']['MINIMUM_CYCLE_PERIOD']}
+        assert name_parser.timeout_time == new_config['NAME_PARSERS']['TIMEOUT_TIME']
+        assert server_parser.max_fails_con == new_config['SERVER_PARSERS']['MAX_FAILS_CON']
+        assert server_parser.name_matcher is name_matcher   # normalization settings haven't changed
+
+        new_config['SERVER_PARSERS']['STRIP_CLAN_TAGS'] = not new_config['SERVER_PARSERS']['STRIP_CLAN_TAGS']
+        write(config_path, new_config)
+        hot_reloader.check()
+        assert server_parser.name_matcher is not name_matcher
+        assert server_parser.name_matcher.strip_clan_tags == new_config['SERVER_PARSERS']['STRIP_CLAN_TAGS']
+
+        for invalid_setting in (('NAME_PARSERS', 'TIMEOUT_TIME', 'fast'), ('NAME_PARSERS', 'PROFILE_EXTRACTOR', 'regex'),
+                                ('MAIN', 'HARDCODED_NAMES', ['re:(unclosed']), ('MAIN', 'LOG_LEVEL', 'verbose')):
+            invalid_config = deepcopy(new_config)
+            section, key, value = invalid_setting
+            invalid_config[section][key] = value
+            write(config_path, invalid_config)
+            assert hot_reloader.check() == {}
+            assert name_parser.timeout_time == new_config['NAME_PARSERS']['TIMEOUT_TIME']
+        CONSOLE.print("Valid changes are applied, invalid ones aren't")
+    CONSOLE.print('[END HOT RELOAD TEST PROCEDURE]')
+
+
+if __name__ == '__main__':
+    test_hot_reload_procedure()
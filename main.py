@@ -7,55 +7,95 @@ P.S. Logging is commented out due to storage bloating (gigabytes of logging file
 """
 
 from threading import Thread
-from winotify import Notification   # type: ignore
 
-from sys import path
-from os import system
+from os import makedirs, system
 from os.path import join
-from time import sleep, perf_counter
+from time import asctime, localtime, sleep, perf_counter, time
 
+from rich.live import Live
 from rich.traceback import install
 from cache.cacheable_data import PickleCacheableData
+from cache.write_behind_cacheable_data import WriteBehindCacheableData
+from cache.sharing import SHARED, HOT_COPY
 
-from name_parsers import AsyncNameParser, get_name_table_scaffold
-from helpers import CONFIG, CONSOLE, APP_ID, BASE_DIR, remove_diacritics
+from api import API_ENABLED, ApiServer, get_live_state
+from history import HISTORY_ENABLED, HistoryStore, get_stays
+from hot_reload import HOT_RELOAD, HotReloader
+from name_matching import PatternsIndex, is_pattern
+from name_parsers import BACKEND, NAME_PARSERS_MAP, get_name_table_scaffold
+from helpers import CONFIG, CONSOLE, BASE_DIR, remove_diacritics, validate_address
+from notifications import NOTIFIER, notify_exception
+from output import OUTPUT_MODE, CycleView, EventStream
 from server_name_parsers import AsyncServerNameParser
+from scan_log import SCAN_LOG, get_log_level
+from scan_results import ScanBatch, format_playtime
 from server_parsers import AsyncServerParser, ServerParser
 install()
 
 
 HARDCODED_NAMES = set(CONFIG['MAIN']['HARDCODED_NAMES'])  # Use this in case you don't have a reliable Steam account link.
+PatternsIndex([name for name in HARDCODED_NAMES if is_pattern(name)])     # fail fast on invalid "glob:"/"re:" patterns
 MINIMUM_CYCLE_PERIOD = CONFIG['MAIN']['MINIMUM_CYCLE_PERIOD']   # in secs
 MINIMUM_SLEEP_TIME = CONFIG['MAIN']['MINIMUM_SLEEP_TIME']
+EXPORT_SNAPSHOTS = CONFIG['MAIN']['EXPORT_SNAPSHOTS']   # write all players of every cycle to .npz files (see scan_results.py)
+SNAPSHOTS_DIR = join(BASE_DIR, CONFIG['MAIN']['SNAPSHOTS_DIR'])
+HISTORY_PERIOD = 7 * 86400     # in secs. "history <player name>" command shows stays of this long ago at most
 # CYCLES_PER_LOG = CONFIG['MAIN']['CYCLES_PER_LOG']
 
 
-def parse_command(server_parser: ServerParser, string: str):
+def print_history(history_store: HistoryStore, player_name: str):
+    """
+    Prints stays of a player name on servers in the last HISTORY_PERIOD from sightings history.
+    """
+    stays = get_stays(history_store.query(player_name, time() - HISTORY_PERIOD))
+    if not stays:
+        CONSOLE.print(f'NO SIGHTINGS OF {player_name}', style='bold red')
+        return
+    for first_sighting, last_sighting in stays:
+        CONSOLE.print(f'{asctime(localtime(first_sighting.timestamp))} - {asctime(localtime(last_sighting.timestamp))}\t'
+                      f'{last_sighting.address}\t{last_sighting.server_name}\t{last_sighting.score}', markup=False)
+
+
+def parse_command(server_parser: ServerParser, string: str, history_store=None):
     global CONSOLE
+    if string.startswith('history '):
+        if history_store is None:
+            CONSOLE.print('HISTORY IS DISABLED', style='bold red')
+            return
+        print_history(history_store, string[len('history '):])
+        return
+    is_removal = string.startswith('unexclude ')
+    if is_removal:
+        string = string[len('unexclude '):]
     first_space_index = string.find(' ')
     exclude_address = string[:first_space_index:]
     if not (exclude_address == '__all__' or validate_address(exclude_address)):
         CONSOLE.print(f'ADDRESS IS INVALID {exclude_address}', style='bold red')
         return
     name = string[first_space_index+1::]
-    if name == '':
+    if first_space_index == -1 or name == '':
         raise ValueError
+    if is_removal:
+        if server_parser.exclusion_index.remove(exclude_address, name):
+            CONSOLE.print(f'REMOVED EXCLUSION OF {name} ON {exclude_address}', markup=False)
+        else:
+            CONSOLE.print(f'NO EXCLUSION OF {name} ON {exclude_address}', style='bold red', markup=False)
+        return
+    server_parser.exclusion_index.add(exclude_address, name)   # swaps the index atomically so the scanning thread can read it
     if exclude_address == '__all__':
-        print(f'EXCLUDED NAME {name}')
+        CONSOLE.print(f'EXCLUDED NAME {name}', markup=False)
     else:
         if name == '__all__':
-            print(f'EXCLUDED SERVER {exclude_address}')
+            CONSOLE.print(f'EXCLUDED SERVER {exclude_address}', markup=False)
         else:
-            print(f'EXCLUDED NAME {name} ON SERVER {exclude_address}')
+            CONSOLE.print(f'EXCLUDED NAME {name} ON SERVER {exclude_address}', markup=False)
 
-    server_parser.excluded_servers_names_map[exclude_address] = server_parser.excluded_servers_names_map.get(exclude_address, set()) | {name}
 
-
-def process_input_commands(server_parser):
+def process_input_commands(server_parser, history_store=None):
     while True:
         command = input().strip()
         try:
-            parse_command(server_parser, command)
+            parse_command(server_parser, command, history_store)
         except ValueError:
             CONSOLE.print(f'INPUT IS INVALID {command}', style='bold red')
         except IndexError:
@@ -65,27 +105,78 @@ def process_input_commands(server_parser):
             exit()
 
 
-def inject_names(names, names_info_map, names_to_inject: set[str]):
+def get_name_table(name_parser):
+    """
+    Builds the Name Table of names of all links with cached infos.
     """
-    Inject names to parse servers for without the need to know their Steam account links.
-    Note that it assigns corresponding name flags names_info_map['on_server'] to True
+    name_table = get_name_table_scaffold()
+    for link in name_parser.get_all_links():  # shared cache might have links of other instances
+        link_info = name_parser.links_info_map.get(link)
+        if link_info:
+            name, status, ingame = link_info['current_status']
+            name_table.add_row(
+                remove_diacritics(name),
+                f"{status} {ingame if ingame != 'None' else ''}",
+                f"{name_parser.get_flags_by_link(link)}")
+    return name_table
 
-    Use in context after names and names_info_map are initialized.
+
+def apply_main_config(settings, name_parser):
+    """
+    Applies changed MAIN config settings (see hot_reload.py) between cycles.
     """
-    flags = {'on_server': True}
-    names |= names_to_inject
-    for name in names_to_inject:
-        names_info_map[name] = flags
+    global HARDCODED_NAMES, MINIMUM_CYCLE_PERIOD, MINIMUM_SLEEP_TIME, EXPORT_SNAPSHOTS
+    if 'HARDCODED_NAMES' in settings:
+        HARDCODED_NAMES = set(settings['HARDCODED_NAMES'])
+        name_parser.injected_names_info_map.clear()
+        name_parser.inject_names(HARDCODED_NAMES)   # names changes get to server parser on the next update_names
+    MINIMUM_CYCLE_PERIOD = settings.get('MINIMUM_CYCLE_PERIOD', MINIMUM_CYCLE_PERIOD)
+    MINIMUM_SLEEP_TIME = settings.get('MINIMUM_SLEEP_TIME', MINIMUM_SLEEP_TIME)
+    EXPORT_SNAPSHOTS = settings.get('EXPORT_SNAPSHOTS', EXPORT_SNAPSHOTS)
+    if 'LOG_LEVEL' in settings:
+        SCAN_LOG.level = get_log_level(settings['LOG_LEVEL'])
+
+
+def get_scan_stats_text(stats: dict) -> str:
+    kpm = ', '.join(f'p{percent} {value:.2f}' for percent, value in stats['kpm'].items())
+    playtime = ', '.join(f'p{percent} {format_playtime(value).strip()}' for percent, value in stats['playtime'].items())
+    return (f"{stats['players']} players ({stats['names']} distinct names) on {stats['servers']} servers; "
+            f"population: mean {stats['population_mean']:.1f}, max {stats['population_max']}\n"
+            f"KPM: {kpm}\nPlaytime: {playtime}\n")
+
 
+def print_scan_stats(stats: dict):
+    CONSOLE.print(get_scan_stats_text(stats))
 
-def validate_address(string: str):
+
+def export_scan_batch(scan_batch: ScanBatch):
+    makedirs(SNAPSHOTS_DIR, exist_ok=True)
+    path = join(SNAPSHOTS_DIR, f'snapshot-{int(scan_batch.start_time)}.npz')
+    scan_batch.export(path)
+    CONSOLE.print(f'Exported {len(scan_batch)} players to {path}\n')
+
+
+def shutdown(server_name_parser, server_parser, name_parser, history_store=None, api_server=None):
     """
-    Primitive ip:port validation function
+    Makes sure nothing is lost on shutdown: waits for all pending cache writes. Then stops parse workers.
     """
-    return '__all__' or all(char in '01234567890.:' for char in string) and string.count('.') == 3 and string.count(':') == 1
+    if api_server is not None:
+        api_server.close()
+    CONSOLE.print('FLUSHING CACHE')
+    server_name_parser.flush_cache()
+    server_parser.presence_tracker.flush()
+    server_parser.exclusion_index.flush()
+    if history_store is not None:
+        history_store.close()
+    name_parser.flush_cache()
+    name_parser.close()
+    NOTIFIER.close()    # shows notifications that are still waiting
+    SCAN_LOG.close()    # prints records that are still waiting
 
 
 def main(server_name_parser, server_parser, name_parser):
+    if OUTPUT_MODE == 'headless':
+        CONSOLE.quiet = True    # events go to event_stream only so nothing else may be printed to stdout
     # Path('logs').mkdir(parents=True, exist_ok=True)
     start_sn_time = perf_counter()
     server_name_parser = server_name_parser
@@ -99,32 +190,46 @@ def main(server_name_parser, server_parser, name_parser):
     name_parser = name_parser
     cycled = 0
     names = {}
-    input_thread = Thread(target=process_input_commands, args=(server_parser,), daemon=True)
+    name_table = None
+    name_parser.inject_names(HARDCODED_NAMES)
+    hot_reloader = HotReloader(name_parser, server_parser) if HOT_RELOAD else None
+    history_store = HistoryStore() if HISTORY_ENABLED else None
+    api_server = None
+    if API_ENABLED:
+        api_server = ApiServer(server_parser.exclusion_index)
+        try:
+            api_server.start()
+            CONSOLE.print(f'API is served on http://{api_server.host}:{api_server.port}')
+        except OSError as e:
+            CONSOLE.print(f'API IS NOT SERVED: {e}', style='bold red')
+            api_server = None
+    event_stream = EventStream.open() if OUTPUT_MODE == 'headless' else None
+    cycle_view = CycleView() if OUTPUT_MODE == 'live' else None
+    live = Live(cycle_view, console=CONSOLE, auto_refresh=False) if cycle_view is not None else None
+    if live is not None:
+        live.start()    # prints of the console go above the view
+    input_thread = Thread(target=process_input_commands, args=(server_parser, history_store), daemon=True)
     input_thread.start()
     while True:
         try:
-            system('CLS')
-            CONSOLE.clear_live()
+            if OUTPUT_MODE == 'log':
+                system('CLS')
+                CONSOLE.clear_live()
+            if hot_reloader is not None:
+                apply_main_config(hot_reloader.check(), name_parser)
             CONSOLE.print(f'HARDCODED NAMES: {HARDCODED_NAMES}\n')
             start_iter_time = perf_counter()
-            links_info_map = name_parser.parse_links_info()
+            name_parser.parse_links_info()
             names = name_parser.names
-            names_info_map = {}     # {'name': dict(flags)}
-            inject_names(names, names_info_map, HARDCODED_NAMES)
-            name_table = get_name_table_scaffold()
-            for link, link_info in links_info_map.items():
-                if link_info:
-                    name, status, ingame = link_info['current_status']
-                    flags = links_info_map.get(link)['flags']
-                    names_info_map[name] = flags
-                    name_table.add_row(
-                        remove_diacritics(name),
-                        f"{status} {ingame if ingame != 'None' else ''}",
-                        f"{flags}")  # building the Name Table
-            CONSOLE.print(name_table)
+            names_changes = name_parser.names_changes
+            if OUTPUT_MODE != 'headless' and (names_changes or name_table is None):  # the screen is cleared every cycle but the table is rebuilt only on changes
+                name_table = get_name_table(name_parser)
+                if OUTPUT_MODE == 'live':
+                    CONSOLE.print(name_table)   # isn't cleared so it's printed only on changes
+            if OUTPUT_MODE == 'log':
+                CONSOLE.print(name_table)
             get_names_time = perf_counter()
-            server_parser.names = names
-            server_parser.names_info_map = names_info_map
+            server_parser.apply_names_changes(names_changes)
 
             names_on_all_servers = server_parser.parse_servers()  # main procedure
 
@@ -142,34 +247,64 @@ def main(server_name_parser, server_parser, name_parser):
             if names:
                 names_speed = len(names)/names_time
 
+            if history_store is not None:
+                history_store.add_scans(names_on_all_servers.values())
+            scan_stats = server_parser.scan_batch.get_stats()
+            cycle_metrics = {'cycle': cycled, 'cycle_time': total_time, 'names_time': names_time, 'servers': len(server_names),
+                             'responded': scan_stats['servers'], 'names': len(names), 'notifications_dropped': NOTIFIER.dropped_count,
+                             'log_dropped': SCAN_LOG.dropped_count, 'stats': scan_stats}
+            if api_server is not None:
+                api_server.publish(get_live_state(names_on_all_servers.values(), cycle_metrics))
+            if EXPORT_SNAPSHOTS:
+                export_scan_batch(server_parser.scan_batch)
+            if event_stream is not None:
+                event_stream.emit_cycle(names_on_all_servers.values(), cycle_metrics)
+            if cycle_view is not None and live is not None:
+                cycle_view.update(server_parser.scan_batch, names_on_all_servers, get_scan_stats_text(scan_stats) +
+                                  f'Scanning number {cycled} took {int(total_time)} seconds ({server_names_speed:.1f} servers/second); '
+                                  f'getting names: {int(names_time)} seconds. Sleeping for {sleep_for} seconds')
+                live.refresh()  # the view is built only now
+            if OUTPUT_MODE != 'log':
+                sleep(sleep_for)
+                continue
             for key, val in names_on_all_servers.items():
                 CONSOLE.print(f'{key}\t{val}')
-            CONSOLE.print(f'\nExcluded names on servers map: {server_parser.excluded_servers_names_map}\n')
+            print_scan_stats(scan_stats)
+            CONSOLE.print(f'\nExcluded names on servers map: {server_parser.exclusion_index.get_exclusions_map()}\n')
+            CONSOLE.print(f'Evicted from cache: {name_parser.get_evicted_count()} names, {server_name_parser.get_evicted_count()} server names\n')
+            if connection_stats := name_parser.get_connection_stats():
+                CONSOLE.print(f"Name parser connections: {connection_stats['new']} new, {connection_stats['reused']} reused\n")
             CONSOLE.print(f'Scanning number {cycled} took {int(total_time)} seconds ({server_names_speed} servers/second); \
     getting names: {int(names_time)} seconds ({names_speed} names/second).\nSleeping for {sleep_for} seconds\n')
             CONSOLE.print('''Write console exclusion commands while main thread is sleeping.\nExamples: \n\
     __all__ name        (to exclude name on all servers) \n\
     1.1.1.1:0 __all__   (to exclude server for all names) \n\
-    1.1.1.1:0 name      (to exclude name on one server)\n''')
+    1.1.1.1:0 name      (to exclude name on one server) \n\
+    history name        (to see where name was seen in the last week) \n\
+    unexclude 1.1.1.1:0 name    (to remove an exclusion, written the way it was added)\n''')
             sleep(sleep_for)
             # if not cycled % CYCLES_PER_LOG:     # True when remainder is 0
             # pass
             # CONSOLE.save_html(join(BASE_DIR, f'logs\\log-{cycled}-{time()}.html'))
             # CONSOLE.clear_live()
         except KeyboardInterrupt:   # handle stopping the program
+            if live is not None:
+                live.stop()
             CONSOLE.print('SHUTTING DOWN MAIN THREAD')
+            shutdown(server_name_parser, server_parser, name_parser, history_store, api_server)
+            if event_stream is not None:
+                event_stream.close()
             exit()
             # CONSOLE.save_html(join(BASE_DIR, f'logs\\KeyboardInterrupt-log-{cycled}-{time()}.html'))
         except ZeroDivisionError as e:
-            Notification(app_id=APP_ID, title='Names list is likely empty', msg=e,
-                         duration='long', icon=join(path[0], join(BASE_DIR, r'noticons\icon.png'))).show()
+            notify_exception(e, 'Names list is likely empty')
+            NOTIFIER.close()
             CONSOLE.print_exception()
             # CONSOLE.save_html(join(BASE_DIR, f'logs\\ZeroDivisionError-log-{cycled}-{time()}.html'))
             CONSOLE.print(names)
             exit()
         except Exception as e:
-            Notification(app_id=APP_ID, title='Exception occurred', msg=e,
-                         duration='long', icon=join(path[0], join(BASE_DIR, r'noticons\icon.png'))).show()
+            notify_exception(e, 'Exception occurred')
             CONSOLE.print_exception()
             # CONSOLE.save_html(join(BASE_DIR, f"logs\\{remove_bad_chars(str(e)).title()}-log-{cycled}-{time()}.html"))
             sleep(1)    # sleep for 1 second to reduce notifications spamming
@@ -179,4 +314,4 @@ def main(server_name_parser, server_parser, name_parser):
 if __name__ == '__main__':
     main(AsyncServerNameParser(),
          AsyncServerParser(),
-         AsyncNameParser(PickleCacheableData(join(BASE_DIR, 'data/async_names_cache.bin')), is_silent=True))
+         NAME_PARSERS_MAP[BACKEND](WriteBehindCacheableData(PickleCacheableData(join(BASE_DIR, 'data/async_names_cache.bin'), shared=SHARED, hot_copy=HOT_COPY)), is_silent=True))
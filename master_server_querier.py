@@ -6,6 +6,7 @@ and provides an API to use by ServerNameParsers.
 
 import socket
 from helpers import CONFIG
+from scan_log import SCAN_LOG
 
 REGION_CODES_MAP = {
     'US EAST': b'\x00',
@@ -72,7 +73,7 @@ class MasterServerQuery:
             ip_port = '.'.join(bytes)
             short_port = int.from_bytes(data[index_pointer+4:index_pointer+6:], 'big')
             ip_port += f':{short_port}'
-            print(ip_port, self.ip_ports_count)
+            SCAN_LOG.debug(ip_port, self.ip_ports_count)
             self.ip_ports_count += 1
             ip_ports.add(ip_port)
         return ip_ports, ip_port
@@ -84,7 +85,7 @@ class MasterServerQuery:
         payload = self.header
         payload += last_ip_port
         payload += self.filter
-        print(payload)
+        SCAN_LOG.debug(payload)
         self._ms_socket.sendto(payload, self.master_server_addr)
         return self._ms_socket.recv(2048)
 
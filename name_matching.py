@@ -0,0 +1,505 @@
+"""
+This is a module with normalization and matching of player names against tracked names.
+
+Player names are decorated in all sorts of ways: clan tags, diacritics, fullwidth or lookalike letters, different case.
+So names are normalized before matching:
+    NFKD (fullwidth and other compatibility forms become plain, letters with diacritics are decomposed)
+    -> combining marks are removed -> casefold -> optional homoglyph folding (cyrillic/greek lookalikes to latin)
+    -> optional clan tags and decorations stripping from both ends.
+Tracked names are normalized once per names set change and indexed by their lengths so matching a player name
+takes one dict lookup per distinct length instead of an endswith call per tracked name.
+Player names are normalized once per raw name thanks to a bounded LRU memo since the same players are seen every cycle.
+
+Tracked patterns are "glob:<shell-style pattern>" or "re:<regular expression>" entries (ex. "glob:[tag]*", "re:^alt\\d+$").
+They're passed apart from names: only hardcoded names can be patterns, names of Steam accounts are always matched literally
+(anyone could name themselves "re:.*").
+Patterns are matched against player names without clan tags stripping (so they can match tags) and ignore case.
+Their literals are normalized the same way as player names ("re:^José" matches "Jose").
+They're indexed by their required literals in an Aho-Corasick automaton so a player name is scanned once, not once per pattern,
+and only patterns whose literals it contains are checked (see PatternsIndex).
+"""
+
+import re
+import unicodedata
+from collections import deque
+from fnmatch import translate
+from functools import lru_cache
+from typing import Callable, Iterable, Optional
+
+from helpers import CONFIG
+
+try:    # private parser of the re module, it's only used to find required literals of patterns
+    from re import _constants, _parser   # type: ignore
+except ImportError:
+    _constants = _parser = None
+
+
+FOLD_HOMOGLYPHS = CONFIG['SERVER_PARSERS']['FOLD_HOMOGLYPHS']
+STRIP_CLAN_TAGS = CONFIG['SERVER_PARSERS']['STRIP_CLAN_TAGS']
+NAME_MEMO_SIZE = CONFIG['SERVER_PARSERS']['NAME_MEMO_SIZE']     # max normalized player names remembered
+
+COMBINING_MARKS_TABLE = dict.fromkeys(range(0x300, 0x370))     # Combining Diacritical Marks block
+HOMOGLYPHS_TABLE = str.maketrans({     # casefolded lookalikes of latin letters
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o', 'р': 'p', 'с': 'c', 'т': 't', 'у': 'y',
+    'х': 'x', 'ѕ': 's', 'і': 'i', 'ї': 'i', 'ј': 'j', 'ԁ': 'd', 'ԛ': 'q', 'ԝ': 'w', 'ү': 'y', 'һ': 'h',
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p', 'τ': 't', 'υ': 'u', 'χ': 'x',
+    'ɑ': 'a', 'ɡ': 'g', 'ı': 'i', 'ø': 'o', 'ß': 'ss',
+})
+CLAN_TAG = r'(?:\[[^\]]*\]|\([^)]*\)|\{[^}]*\}|<[^>]*>|\|[^|]*\|)'
+CLAN_TAGS_PATTERN = re.compile(rf'^(?:[\W_]*{CLAN_TAG})+|(?:{CLAN_TAG}[\W_]*)+$')
+DECORATIONS_PATTERN = re.compile(r'^[\W_]+|[\W_]+$')
+GLOB_PREFIX = 'glob:'
+REGEX_PREFIX = 're:'
+# parts of a regex that aren't literals: escapes and group headers with flags, names and lookarounds
+REGEX_SYNTAX_PATTERN = re.compile(r'(\\N\{[^}]*\}|\\.|\(\?(?:P<\w+>|P=\w+\)|<?[=!]|[aiLmsux-]*[:)]|[#>(]))', re.DOTALL)
+
+
+def is_pattern(name: str) -> bool:
+    return name.startswith((GLOB_PREFIX, REGEX_PREFIX))
+
+
+def normalize_regex_literals(source: str, fold_homoglyphs: bool = FOLD_HOMOGLYPHS) -> str:
+    """
+    Normalizes literal chars of a regex source the same way player names are normalized for patterns.
+    Escapes and group headers are kept as is (casefolding "\\D" or "(?L)" would change their meaning)
+    and chars that normalize to something else are escaped so they stay literal.
+    """
+    parts = REGEX_SYNTAX_PATTERN.split(source)
+    for i in range(0, len(parts), 2):   # odd parts are syntax
+        parts[i] = ''.join(char if (normalized := normalize_name(char, fold_homoglyphs, strip_clan_tags=False)) == char
+                           else re.escape(normalized) for char in parts[i])
+    return ''.join(parts)
+
+
+def get_pattern_source(pattern: str, fold_homoglyphs: bool = FOLD_HOMOGLYPHS) -> str:
+    """
+    Gets regex source of a pattern entry. Globs are anchored at both ends, regexes are searched as is.
+    Literals are normalized like player names they're matched against (ex. "re:^José" becomes "^jose").
+    Raises ValueError if the pattern is invalid.
+    """
+    if pattern.startswith(GLOB_PREFIX):
+        source = '^' + translate(normalize_name(pattern[len(GLOB_PREFIX):], fold_homoglyphs, strip_clan_tags=False))
+    else:
+        source = normalize_regex_literals(pattern[len(REGEX_PREFIX):], fold_homoglyphs)
+    try:
+        re.compile(source)
+    except re.error as e:
+        raise ValueError(f'Invalid name pattern {pattern!r}: {e}') from e
+    return source
+
+
+def get_required_literal(source: str, fold_homoglyphs: bool = FOLD_HOMOGLYPHS) -> str:
+    """
+    Gets the longest literal every match of the regex source contains (normalized). Empty if there's none.
+    Only literals outside of alternations, repeats and lookarounds are considered since they're the required ones.
+    Literals are taken from the private parser of the re module. If it's missing or has changed the literal is empty,
+    so the pattern just isn't prefiltered.
+    """
+    if _parser is None:
+        return ''
+
+    def get_literals(items):
+        literal = ''
+        for op, arg in items:
+            if op is _constants.LITERAL:
+                literal += chr(arg)
+                continue
+            yield literal
+            literal = ''
+            if op is _constants.SUBPATTERN:
+                yield from get_literals(arg[-1])
+            elif op is _constants.ATOMIC_GROUP:
+                yield from get_literals(arg)
+        yield literal
+
+    try:
+        literal = max(get_literals(_parser.parse(source, re.IGNORECASE)), key=len)
+    except Exception:   # the parser isn't a public API, its items may differ between Python versions
+        return ''
+    return normalize_name(literal, fold_homoglyphs, strip_clan_tags=False)     # escaped literals weren't normalized yet
+
+
+class LiteralsAutomaton:
+    """
+    Aho-Corasick automaton. Finds all of the literals a string contains in one pass over the string,
+    so the cost depends on the string length and not on the amount of literals.
+    """
+    _goto: list[dict[str, int]]     # State transitions by char. State 0 is the root
+    _fail: list[int]                # State to fall back to on a missing transition (the longest proper suffix in the trie)
+    _outputs: list[list[int]]       # Indexes of literals that end at the state
+
+    def __init__(self, literals: list[str]):
+        self._goto, self._fail, self._outputs = [{}], [0], [[]]
+        for i, literal in enumerate(literals):
+            state = 0
+            for char in literal:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._outputs[state].append(i)
+        queue = deque(self._goto[0].values())
+        while queue:    # breadth first so fail states of shorter prefixes are ready
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] += self._outputs[self._fail[next_state]]
+
+    def find(self, string: str) -> set[int]:
+        """
+        Gets indexes of the literals the string contains.
+        """
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = set()
+        state = 0
+        for char in string:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+def compile_patterns(patterns: list[str], fold_homoglyphs: bool = FOLD_HOMOGLYPHS) -> Optional[re.Pattern]:
+    """
+    Compiles patterns into one regex with a named group per pattern: _0 for the first one and so on.
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?P<_{i}>{get_pattern_source(pattern, fold_homoglyphs)})' for i, pattern in enumerate(patterns)),
+                      re.IGNORECASE)
+
+
+class PatternsIndex:
+    """
+    Gets the first of many patterns a name matches in one pass over the name.
+
+    One regex alternation of hundreds of patterns is retried for every alternative at every position of the name,
+    so instead the automaton finds the required literals the name contains and only patterns with those
+    are checked. Patterns without a required literal (ex. "re:^\\d+$") are checked with one combined regex.
+    """
+    patterns: list[str]
+    _compiled_patterns: list[re.Pattern]
+    _automaton: LiteralsAutomaton           # of required literals of patterns that have them
+    _literals_patterns: list[int]           # pattern index of each literal of the automaton
+    _unfiltered_patterns: list[int]         # indexes of patterns without required literals
+    _combined_pattern: Optional[re.Pattern]     # of patterns without required literals, its groups are named _<position in the list>
+
+    def __init__(self, patterns: list[str], fold_homoglyphs=FOLD_HOMOGLYPHS):
+        sources = [get_pattern_source(pattern, fold_homoglyphs) for pattern in patterns]   # raises ValueError on invalid patterns
+        self.patterns = patterns
+        self._compiled_patterns = [re.compile(source, re.IGNORECASE) for source in sources]
+        literals, self._literals_patterns, self._unfiltered_patterns = [], [], []
+        for i, source in enumerate(sources):
+            literal = get_required_literal(source, fold_homoglyphs)
+            if literal:
+                literals.append(literal)
+                self._literals_patterns.append(i)
+            else:
+                self._unfiltered_patterns.append(i)
+        self._automaton = LiteralsAutomaton(literals)
+        self._combined_pattern = compile_patterns([patterns[i] for i in self._unfiltered_patterns], fold_homoglyphs)
+
+    def search(self, name: str) -> Optional[str]:
+        """
+        Gets the first pattern the (normalized) name matches.
+        """
+        matched = [i for i in sorted(self._literals_patterns[literal] for literal in self._automaton.find(name))
+                   if self._compiled_patterns[i].search(name)]
+        if self._combined_pattern is not None:
+            match = self._combined_pattern.search(name)
+            if match:   # outer group of a pattern closes last so it's the last group
+                matched.append(self._unfiltered_patterns[int(match.lastgroup[1:])])    # type: ignore
+        return self.patterns[min(matched)] if matched else None
+
+
+def normalize_name(name: str, fold_homoglyphs: bool = FOLD_HOMOGLYPHS, strip_clan_tags: bool = STRIP_CLAN_TAGS) -> str:
+    """
+    Normalizes a name for matching. Falls back to a name without stripping if stripping leaves nothing (ex. name is a tag).
+    """
+    normalized = unicodedata.normalize('NFKD', name).translate(COMBINING_MARKS_TABLE).casefold()
+    if fold_homoglyphs:
+        normalized = normalized.translate(HOMOGLYPHS_TABLE)
+    if strip_clan_tags:
+        stripped = DECORATIONS_PATTERN.sub('', CLAN_TAGS_PATTERN.sub('', normalized))
+        normalized = stripped or normalized.strip()
+    return normalized
+
+
+class NameMatcher:
+    """
+    Matches player names to tracked names by suffix (player names often have prefixes) after normalization
+    and to tracked patterns if no name matched.
+    """
+    fold_homoglyphs: bool
+    strip_clan_tags: bool
+    normalize: Callable[[str], str]         # Memoized normalization of player names
+    normalize_for_patterns: Callable[[str], str]    # Memoized normalization of player names without stripping
+    _names: set[str]                        # Tracked names the indexes are built for
+    _normalized_names_map: dict[str, str]   # Normalized tracked names to tracked names (the least one if several normalize the same)
+    _names_by_normalized: dict[str, set[str]]   # Normalized tracked names to all tracked names that normalize to them
+    _lengths_counts: dict[int, int]         # Lengths of normalized tracked names to amounts of them
+    _lengths: list[int]                     # Distinct lengths of normalized tracked names, longest first
+    _patterns: set[str]                     # Tracked patterns
+    _patterns_index: Optional[PatternsIndex]    # Tracked patterns (sorted). None if there are no patterns
+    version: int                            # Incremented on every change of names so results of match can be cached
+
+    def __init__(self, names: Iterable[str] = (), fold_homoglyphs=FOLD_HOMOGLYPHS, strip_clan_tags=STRIP_CLAN_TAGS,
+                 memo_size=NAME_MEMO_SIZE, patterns: Iterable[str] = ()):
+        self.fold_homoglyphs = fold_homoglyphs
+        self.strip_clan_tags = strip_clan_tags
+        self.normalize = lru_cache(maxsize=memo_size)(self._normalize)
+        self.normalize_for_patterns = lru_cache(maxsize=memo_size)(self._normalize_for_patterns)
+        self._names = set()
+        self._normalized_names_map = {}
+        self._names_by_normalized = {}
+        self._lengths_counts = {}
+        self._lengths = []
+        self._patterns = set()
+        self._patterns_index = None
+        self.version = 0
+        self.update(names, patterns)
+
+    def _normalize(self, name: str) -> str:
+        return normalize_name(name, self.fold_homoglyphs, self.strip_clan_tags)
+
+    def _normalize_for_patterns(self, name: str) -> str:
+        return normalize_name(name, self.fold_homoglyphs, strip_clan_tags=False)
+
+    def _set_patterns(self, patterns: set[str]):
+        # raises ValueError on invalid patterns
+        self._patterns_index = PatternsIndex(sorted(patterns), self.fold_homoglyphs) if patterns else None
+        self._patterns = patterns
+
+    def add(self, names: Iterable[str], patterns: Iterable[str] = ()):
+        """
+        Adds names and patterns to the indexes. Only the patterns index is rebuilt and only if there are new patterns.
+        Raises ValueError if there's an invalid pattern (nothing is added then).
+        """
+        names = set(names) - self._names
+        patterns = set(patterns) - self._patterns
+        if patterns:
+            self._set_patterns(self._patterns | patterns)
+        lengths_changed = False
+        for name in names:
+            normalized = self.normalize(name)
+            if not normalized:
+                continue
+            same_names = self._names_by_normalized.setdefault(normalized, set())
+            same_names.add(name)
+            self._normalized_names_map[normalized] = min(same_names)  # so the same normalized name always maps to the same name
+            if len(same_names) == 1:
+                lengths_changed |= len(normalized) not in self._lengths_counts
+                self._lengths_counts[len(normalized)] = self._lengths_counts.get(len(normalized), 0) + 1
+        self._names |= names
+        self.version += bool(names or patterns)
+        if lengths_changed:
+            self._lengths = sorted(self._lengths_counts, reverse=True)
+
+    def remove(self, names: Iterable[str], patterns: Iterable[str] = ()):
+        """
+        Removes names and patterns from the indexes. Only the patterns index is rebuilt and only if patterns are removed.
+        """
+        names = set(names) & self._names
+        patterns = set(patterns) & self._patterns
+        if patterns:
+            self._set_patterns(self._patterns - patterns)
+        lengths_changed = False
+        for name in names:
+            normalized = self.normalize(name)
+            same_names = self._names_by_normalized.get(normalized)
+            if not same_names:
+                continue
+            same_names.discard(name)
+            if same_names:
+                self._normalized_names_map[normalized] = min(same_names)
+                continue
+            del self._names_by_normalized[normalized], self._normalized_names_map[normalized]
+            self._lengths_counts[len(normalized)] -= 1
+            if not self._lengths_counts[len(normalized)]:
+                del self._lengths_counts[len(normalized)]
+                lengths_changed = True
+        self._names -= names
+        self.version += bool(names or patterns)
+        if lengths_changed:
+            self._lengths = sorted(self._lengths_counts, reverse=True)
+
+    def update(self, names: Iterable[str], patterns: Iterable[str] = ()):
+        """
+        Makes the indexes match the names and patterns sets by adding and removing only the difference.
+        Raises ValueError if there's an invalid pattern.
+        """
+        names, patterns = set(names), set(patterns)
+        if names == self._names and patterns == self._patterns:
+            return
+        self.add(names - self._names, patterns - self._patterns)   # first so an invalid pattern doesn't leave half updated indexes
+        self.remove(self._names - names, self._patterns - patterns)
+
+    def match(self, player_name: str) -> Optional[str]:
+        """
+        Gets the tracked name the normalized player name ends with. The longest one if there are several.
+        Otherwise gets the first (in sorted order) tracked pattern the player name matches.
+        """
+        normalized = self.normalize(player_name)
+        for length in self._lengths:
+            if length <= len(normalized):
+                name = self._normalized_names_map.get(normalized[-length:])
+                if name is not None:
+                    return name
+        if self._patterns_index is not None:
+            return self._patterns_index.search(self.normalize_for_patterns(player_name))
+        return None
+
+
+# TESTING/BENCHMARKING
+
+def test_name_matcher_procedure():
+    from helpers import CONSOLE
+
+    CONSOLE.print('[START NAME MATCHER TEST PROCEDURE]')
+    name_matcher = NameMatcher({'Player', 'er', 'Gordon Freeman', '[TAG]', 're:.*'},
+                               patterns={'glob:[[]mge[]]*', r're:^alt(?P<number>\d+)$'})
+    cases = {
+        'Player': 'Player',
+        '[CLAN] Player': 'Player',
+        'xX_Player': 'Player',
+        'Player |TAG|': 'Player',
+        'PLAYER': 'Player',
+        'Ｐｌａｙｅｒ': 'Player',       # fullwidth
+        'Plåyér': 'Player',            # diacritics
+        'Plаyеr': 'Player',            # cyrillic а and е
+        'SuperPlayer': 'Player',       # suffix
+        'gordon freeman ★': 'Gordon Freeman',
+        'Gamer': 'er',
+        '[TAG]': '[TAG]',
+        '[MGE] Scout': 'glob:[[]mge[]]*',
+        'ALT42': r're:^alt(?P<number>\d+)$',
+        'alt42x': None,
+        'Nobody': None,                # "re:.*" is a name so it's matched literally
+        'xre:.*': 're:.*',
+    }
+    for player_name, expected in cases.items():
+        name = name_matcher.match(player_name)
+        assert name == expected, f'{player_name!r}: {name!r} != {expected!r}'
+    name_matcher.remove({'Player'}, {'glob:[[]mge[]]*'})
+    name_matcher.add({'PLAYER', 'Scout'})
+    assert name_matcher.match('[CLAN] Player') == 'PLAYER'
+    assert name_matcher.match('[MGE] Scout') == 'Scout'
+    name_matcher.add({'Player'})    # the same normalized name maps to the least name
+    assert name_matcher.match('player') == 'PLAYER'
+    name_matcher.remove({'PLAYER'})
+    assert name_matcher.match('player') == 'Player'
+    name_matcher.update({'Gordon Freeman'})     # no patterns left
+    assert name_matcher.match('Gamer') is None and name_matcher.match('ALT42') is None
+    assert name_matcher.match('Gordon Freeman') == 'Gordon Freeman'
+    # patterns are normalized like player names: diacritics, lookalikes and ß
+    name_matcher = NameMatcher(patterns={'re:^José', 'glob:*Иван*', 're:straße', r're:^\D\d$'})
+    non_ascii_cases = {
+        'José': 're:^José',
+        'Jose': 're:^José',
+        'xИванx': 'glob:*Иван*',
+        'xИbанx': 'glob:*Иван*',    # latin b
+        'straße': 're:straße',
+        'STRASSE': 're:straße',
+        'x1': r're:^\D\d$',         # escapes aren't casefolded
+    }
+    for player_name, expected in non_ascii_cases.items():
+        name = name_matcher.match(player_name)
+        assert name == expected, f'{player_name!r}: {name!r} != {expected!r}'
+    assert _parser is None or get_required_literal(get_pattern_source('re:^José'), fold_homoglyphs=True) == 'jose'
+    CONSOLE.print(f'{len(cases) + len(non_ascii_cases)} cases passed')
+    CONSOLE.print('[END NAME MATCHER TEST PROCEDURE]')
+
+
+def benchmark_name_matcher_procedure(players_count: int = 10000, cycles: int = 5):
+    from random import Random
+    from time import perf_counter
+
+    from rich.table import Table
+
+    from cache.synthetic_data import SEED, make_name
+    from helpers import CONSOLE
+
+    CONSOLE.print('[START NAME MATCHER BENCHMARK PROCEDURE]')
+    rng = Random(SEED)
+    player_names = [make_name(rng) for _ in range(players_count)]
+    table = Table(title=f'{players_count} player names x {cycles} cycles')
+    for column in ('Tracked names', 'endswith loop, ms', 'NameMatcher, ms', 'Speedup', 'endswith matches', 'NameMatcher matches'):
+        table.add_column(column)
+    for names_count in (10, 100, 1000):
+        names = {make_name(rng) for _ in range(names_count)}
+        start_time = perf_counter()
+        raw_matches = 0
+        for _ in range(cycles):
+            for player_name in player_names:
+                for name in names:
+                    if player_name.endswith(name):
+                        raw_matches += 1
+                        break
+        raw_time = perf_counter() - start_time
+        start_time = perf_counter()
+        name_matcher = NameMatcher(names)
+        matches = 0
+        for _ in range(cycles):
+            name_matcher.update(names)
+            for player_name in player_names:
+                if name_matcher.match(player_name) is not None:
+                    matches += 1
+        matcher_time = perf_counter() - start_time
+        table.add_row(str(names_count), f'{raw_time*1000:.1f}', f'{matcher_time*1000:.1f}', f'{raw_time/matcher_time:.1f}x',
+                      str(raw_matches), str(matches))
+    CONSOLE.print(table)
+    CONSOLE.print('[END NAME MATCHER BENCHMARK PROCEDURE]')
+
+
+def benchmark_patterns_procedure(players_count: int = 10000):
+    """
+    Compares the patterns index with searching every pattern separately as the amount of patterns grows.
+    """
+    from random import Random
+    from time import perf_counter
+
+    from rich.table import Table
+
+    from cache.synthetic_data import SEED, SYLLABLES, make_name
+    from helpers import CONSOLE
+
+    CONSOLE.print('[START NAME PATTERNS BENCHMARK PROCEDURE]')
+    rng = Random(SEED)
+    player_names = [normalize_name(make_name(rng), strip_clan_tags=False) for _ in range(players_count)]
+    table = Table(title=f'{players_count} player names')
+    for column in ('Patterns', 'Matched', 'Separate, ms', 'Index, ms', 'Speedup', 'Index per name, µs'):
+        table.add_column(column)
+    for patterns_count in (10, 50, 100, 200, 500, 1000):
+        patterns = []
+        for _ in range(patterns_count):
+            tag, name = ''.join(rng.choices(SYLLABLES, k=2)), ''.join(rng.choices(SYLLABLES, k=2))
+            patterns.append(rng.choice([f'glob:[[]{tag}[]]*', f'glob:*{name}', f're:^{name}\\d*$', f'glob:{tag}*{name}*']))
+        separate_patterns = [re.compile(get_pattern_source(pattern), re.IGNORECASE) for pattern in patterns]
+        patterns_index = PatternsIndex(patterns)
+        start_time = perf_counter()
+        separate_results = [next((pattern for pattern, compiled in zip(patterns, separate_patterns) if compiled.search(player_name)), None)
+                            for player_name in player_names]
+        separate_time = perf_counter() - start_time
+        start_time = perf_counter()
+        index_results = [patterns_index.search(player_name) for player_name in player_names]
+        index_time = perf_counter() - start_time
+        assert separate_results == index_results
+        table.add_row(str(patterns_count), str(sum(result is not None for result in index_results)),
+                      f'{separate_time*1000:.1f}', f'{index_time*1000:.1f}', f'{separate_time/index_time:.1f}x',
+                      f'{index_time/players_count*1e6:.2f}')
+    CONSOLE.print(table)
+    CONSOLE.print('[END NAME PATTERNS BENCHMARK PROCEDURE]')
+
+
+if __name__ == '__main__':
+    test_name_matcher_procedure()
+    benchmark_name_matcher_procedure()
+    benchmark_patterns_procedure()
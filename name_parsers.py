@@ -9,22 +9,29 @@ P.S. btw not using steam api in order to not hit api limits.
 import socket
 import asyncio
 import concurrent
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from abc import ABC, abstractmethod
+from hashlib import blake2b
+from random import uniform
 from time import perf_counter
-from typing import Optional, Protocol
+from typing import Any, Callable, NamedTuple, Optional, Protocol
 
 import aiohttp
 import requests     # type: ignore # lib stubs
-import bs4
 
 from cache.abstract_cacheable_data import CacheableData
 from cache.cacheable_data import TextFileCacheableData, PickleCacheableData
 from cache.cache_managers import NameParserCacheManager
+from cache.sharing import SHARED_FRESHNESS
 from helpers import CONFIG, CONSOLE, LINKS_FLAGS_MAP_PATH, NAMES_PATH, remove_diacritics
 from hjson import loads
 from rich import box, table
 
+from name_matching import is_pattern
 from notifications import notify_ingame
+from profile_extractors import get_extractor
+from scan_log import SCAN_LOG
+from steam_links import STEAM_API_KEY, SteamIdResolver, merge_links_flags
 
 
 def get_links_flags_map() -> dict[str, dict[str, bool]]:
@@ -45,6 +52,23 @@ TIMEOUT_TIME = CONFIG['NAME_PARSERS']['TIMEOUT_TIME']
 MAX_FAILS_CON = CONFIG['NAME_PARSERS']['MAX_FAILS_CON']   # max timeout time = MAX_FAILS_CON * TIMEOUT_TIME
 # notify when a steam account is in these games if possible. All Steam games should work if the titles are correct.
 INGAMES = CONFIG['NAME_PARSERS']['INGAMES']
+PARSE_EXECUTOR = CONFIG['NAME_PARSERS']['PARSE_EXECUTOR']   # where async name parser parses pages: "thread", null (event loop) or "process" (opt-in)
+PARSE_WORKERS = CONFIG['NAME_PARSERS']['PARSE_WORKERS']     # null means as many as executor's default (cores)
+MAX_PENDING_PARSES = CONFIG['NAME_PARSERS']['MAX_PENDING_PARSES']  # max pages waiting in the executor queue at once
+CONDITIONAL_REQUESTS = CONFIG['NAME_PARSERS']['CONDITIONAL_REQUESTS']   # send ETag/Last-Modified and skip parsing unchanged pages
+ON_SERVER_FRESHNESS = CONFIG['NAME_PARSERS']['ON_SERVER_FRESHNESS']     # in secs. Links without in_game flag aren't requested more often
+MAX_CONCURRENT_REQUESTS = CONFIG['NAME_PARSERS']['MAX_CONCURRENT_REQUESTS']
+CONNECTOR_OPTIONS = CONFIG['NAME_PARSERS']['CONNECTOR_OPTIONS']  # aiohttp.TCPConnector keyword arguments
+RETRY_BACKOFF = CONFIG['NAME_PARSERS']['RETRY_BACKOFF']            # in secs. Doubles with every consecutive fail
+RETRY_BACKOFF_MAX = CONFIG['NAME_PARSERS']['RETRY_BACKOFF_MAX']    # in secs
+BACKEND = CONFIG['NAME_PARSERS']['BACKEND']     # "pages" — one profile page per link, "batch" — Steam Web API summaries in batches
+SUMMARIES_URL = CONFIG['NAME_PARSERS']['SUMMARIES_URL']
+BATCH_SIZE = CONFIG['NAME_PARSERS']['BATCH_SIZE']   # accounts per summaries request
+MAX_BATCH_SIZE = 100    # GetPlayerSummaries limit
+PARSE_EXECUTORS_MAP = {
+    'process': ProcessPoolExecutor,
+    'thread': ThreadPoolExecutor,
+}
 
 TEXT_NAMES_PATH = NAMES_PATH + '_cache_prod.txt'
 PICKLE_NAMES_PATH = NAMES_PATH + '_cache_prod.bin'
@@ -53,16 +77,32 @@ HJSON_NAMES_PATH = NAMES_PATH + '_cache_prod.hjson'
 LINKS_FLAGS_MAP = get_links_flags_map()
 
 
+class NamesChanges(NamedTuple):
+    """
+    Changes of names info map since the previous cycle. Server parsers update their names and matcher indexes with them.
+    """
+    added: dict[str, dict[str, bool]]       # new names and their flags
+    removed: set[str]
+    changed_flags: dict[str, dict[str, bool]]   # names with other flags than before and their new flags
+    changed_statuses: set[str]              # names with other status or game than before (only the Name Table cares)
+    patterns: frozenset[str] = frozenset()  # all current injected names that are patterns. Names of links are never patterns
+
+    def __bool__(self):
+        return any((self.added, self.removed, self.changed_flags, self.changed_statuses))
+
+
 class NameParser(Protocol):
     _links_flags_map: dict[str, dict[str, bool]]  # Mappings of Steam account links to their flag maps
     names: set[str]     # Set of parsed names.
+    names_info_map: dict[str, dict[str, bool]]  # Parsed and injected names to their flags
+    names_changes: NamesChanges     # Changes of names info map in the last cycle
     timeout_time: int   # Maximum time for one HTTP response
     max_fails_con: int  # Maximum consecutive fails to get name info
     ingames: list[str]  # A list of games that summon notifications if 'in_game' flag enabled
     is_silent: bool     # Whether to log failed connection attempts
+    extractor: Callable[[bytes], tuple[str, str, str]]  # Gets name, status and game from a page (see profile_extractors.py)
 
-    @staticmethod
-    def parse_name_status_ingame(parser: bs4.BeautifulSoup) -> tuple[str, str, str]:
+    def parse_name_status_ingame(self, content: bytes) -> tuple[str, str, str]:
         ...
         
     def is_ingame(self, link: str, status: str, ingame: str) -> bool:
@@ -74,46 +114,86 @@ class NameParser(Protocol):
     def get_all_links(self) -> list[str]:
         ...
 
+    def inject_names(self, names_to_inject: set[str]) -> None:
+        ...
+
+    def update_names(self) -> NamesChanges:
+        ...
+
+    def set_links_flags_map(self, links_flags_map: dict[str, dict[str, bool]]) -> None:
+        ...
+
+    def apply_config(self, settings: dict[str, Any]) -> None:
+        ...
+
     @abstractmethod
     def parse_links_info(self) -> CacheableData:
         ...
 
+    def flush_cache(self) -> None:
+        ...
+
+    def get_evicted_count(self) -> int:
+        ...
+
+    def get_connection_stats(self) -> dict[str, int]:
+        ...
+
+    def close(self) -> None:
+        ...
+
 
 class AbstractNameParser(ABC, NameParserCacheManager):  # Trying different OOP approaches. Don't want too much delegating code.
-    _links_flags_map: dict[str, dict[str, bool]]  # Mappings of Steam account links to their flag maps
+    _links_flags_map: dict[str, dict[str, bool]]  # Mappings of canonical Steam account links to their merged flag maps
+    _raw_links_flags_map: dict[str, dict[str, bool]]  # Mappings of links as they are in links options
+    steamid_resolver: SteamIdResolver   # Resolves vanity links so each account is requested and cached once
     names: set[str]     # Set of parsed names.
+    names_info_map: dict[str, dict[str, bool]]  # Parsed and injected names to their flags
+    injected_names_info_map: dict[str, dict[str, bool]]     # Names without links (see inject_names) to their flags
+    names_changes: NamesChanges     # Changes of names info map in the last cycle
+    _statuses_map: dict[str, tuple[str, str]]   # Parsed names to their status and game in the last cycle
     timeout_time: int   # Maximum time for one HTTP response
     max_fails_con: int  # Maximum consecutive fails to get name info
     ingames: list[str]  # A list of games that summon notifications if 'in_game' flag enabled
     is_silent: bool     # Whether to log failed connection attempts
-
-    @staticmethod
-    def parse_name_status_ingame(parser: bs4.BeautifulSoup) -> tuple[str, str, str]:
+    shared_freshness: float     # Link infos other instances got less than this secs ago aren't requested again
+    conditional_requests: bool  # Whether to send conditional requests and skip parsing pages with the same content hash
+    on_server_freshness: float  # Link infos without in_game flag checked less than this secs ago aren't requested again
+    extractor: Callable[[bytes], tuple[str, str, str]]  # Gets name, status and game from a page (see profile_extractors.py)
+    config_attributes_map = {   # NAME_PARSERS settings that can be changed at runtime to attributes they're in
+        'TIMEOUT_TIME': 'timeout_time',
+        'MAX_FAILS_CON': 'max_fails_con',
+        'INGAMES': 'ingames',
+        'CONDITIONAL_REQUESTS': 'conditional_requests',
+        'ON_SERVER_FRESHNESS': 'on_server_freshness',
+    }
+
+    def parse_name_status_ingame(self, content: bytes) -> tuple[str, str, str]:
         """
         Parses retrieved content from a Steam account link page.
+        Raises AttributeError if the page didn't load properly.
         """
-        name = str(parser.select_one('.actual_persona_name').contents[0])  # it's always available if link opened
-        status = parser.select_one('.profile_in_game_header')
-        if status and len(status.contents) > 0:
-            status = str(status.contents[0].strip())
-        else:
-            status = 'Private'
-        ingame = parser.select_one('.profile_in_game_name')
-        if ingame and len(ingame.contents) > 0:
-            ingame = str(ingame.contents[0].strip())
-        else:
-            ingame = ''
-        return name, status, ingame
+        return self.extractor(content)
 
     def __init__(self, links_info_map, timeout_time=TIMEOUT_TIME, max_fails_con=MAX_FAILS_CON, ingames=INGAMES,
-                 links_flags_map=LINKS_FLAGS_MAP, is_silent=False):
+                 links_flags_map=LINKS_FLAGS_MAP, is_silent=False, shared_freshness=SHARED_FRESHNESS, extractor=None,
+                 conditional_requests=CONDITIONAL_REQUESTS, on_server_freshness=ON_SERVER_FRESHNESS, steamid_resolver=None):
         super().__init__(links_info_map)
         self.timeout_time = timeout_time
         self.max_fails_con = max_fails_con
-        self._links_flags_map = links_flags_map
+        self.steamid_resolver = steamid_resolver or SteamIdResolver()
         self.ingames = ingames
         self.is_silent = is_silent
-        self.remove_extra_links_from_cache(links_flags_map.keys())
+        self.shared_freshness = shared_freshness
+        self.extractor = extractor or get_extractor()
+        self.conditional_requests = conditional_requests
+        self.on_server_freshness = on_server_freshness
+        self.names = set()
+        self.names_info_map = {}
+        self.injected_names_info_map = {}
+        self.names_changes = NamesChanges({}, set(), {}, set())
+        self._statuses_map = {}
+        self.set_links_flags_map(links_flags_map)
 
     def is_ingame(self, link: str, status: str, ingame: str) -> bool:
         """
@@ -135,6 +215,132 @@ class AbstractNameParser(ABC, NameParserCacheManager):  # Trying different OOP a
         """
         return list(self._links_flags_map.keys())
 
+    def inject_names(self, names_to_inject: set[str]):
+        """
+        Inject names to parse servers for without the need to know their Steam account links.
+        Note that it assigns corresponding name flags names_info_map['on_server'] to True
+        Names can be "glob:" or "re:" patterns, a player matched by a pattern is reported under the pattern.
+
+        They become a part of names info map (and names changes) on the next update_names.
+        """
+        for name in names_to_inject:
+            self.injected_names_info_map[name] = {'on_server': True}
+
+    def update_names(self) -> NamesChanges:
+        """
+        Builds names info map of injected names and names of cached links infos (the latter win)
+        and gets its changes since the previous call. Called at the end of every parsing cycle.
+        """
+        names_info_map = dict(self.injected_names_info_map)
+        statuses_map = {}
+        for link in self.get_all_links():
+            link_info = self.links_info_map.get(link)
+            if link_info:
+                name, status, ingame = link_info['current_status']
+                names_info_map[name] = dict(self.get_flags_by_link(link))   # not cached flags so links options changes apply at once
+                statuses_map[name] = status, ingame
+        old_names_info_map = self.names_info_map
+        self.names_changes = NamesChanges(
+            added={name: flags for name, flags in names_info_map.items() if name not in old_names_info_map},
+            removed=old_names_info_map.keys() - names_info_map.keys(),
+            changed_flags={name: flags for name, flags in names_info_map.items()
+                           if name in old_names_info_map and old_names_info_map[name] != flags},
+            changed_statuses={name for name, status_ingame in statuses_map.items()
+                              if name in self._statuses_map and self._statuses_map[name] != status_ingame},
+            patterns=frozenset(name for name in self.injected_names_info_map if is_pattern(name)))
+        self.names_info_map = names_info_map
+        self.names = set(names_info_map)
+        self._statuses_map = statuses_map
+        return self.names_changes
+
+    def has_unresolved_links(self) -> bool:
+        return bool(self.steamid_resolver.get_unresolved_vanities(self._raw_links_flags_map))
+
+    async def resolve_links(self, session: Optional[aiohttp.ClientSession] = None):
+        """
+        Resolves vanity names of links that weren't resolved yet (once per account) and canonicalizes links flags map with them.
+        Cached infos of links that became /profiles/ links are dropped and requested again once.
+        """
+        if not self.has_unresolved_links():
+            return
+        if session is None:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(connect=self.timeout_time, sock_read=self.timeout_time)) as session:
+                await self.steamid_resolver.resolve(self._raw_links_flags_map, session, self.max_fails_con)
+        else:
+            await self.steamid_resolver.resolve(self._raw_links_flags_map, session, self.max_fails_con)
+        self.set_links_flags_map(self._raw_links_flags_map)
+
+    def set_links_flags_map(self, links_flags_map: dict[str, dict[str, bool]]):
+        """
+        Sets links flags map (canonicalized with already resolved vanity names). Used between cycles to apply links options changes:
+        new vanity links are resolved on the next cycle, cached infos of removed links are dropped, the rest stays warm.
+        """
+        self._raw_links_flags_map = links_flags_map
+        self._links_flags_map = merge_links_flags(links_flags_map, self.steamid_resolver.get_canonical_link)
+        self.remove_extra_links_from_cache(self._links_flags_map.keys())
+
+    def apply_config(self, settings: dict[str, Any]):
+        """
+        Applies changed NAME_PARSERS config settings between cycles. Settings that can't be changed at runtime are ignored.
+        Raises ValueError before applying anything if a setting is invalid.
+        """
+        extractor = get_extractor(settings['PROFILE_EXTRACTOR']) if 'PROFILE_EXTRACTOR' in settings else self.extractor
+        self.extractor = extractor
+        for key, attribute in self.config_attributes_map.items():
+            if key in settings:
+                setattr(self, attribute, settings[key])
+
+    def is_link_fresh(self, link: str) -> bool:
+        """
+        Checks whether the link doesn't need to be requested this cycle: another instance has just parsed it
+        or only the name matters (no in_game flag) and it was checked recently since names almost never change.
+        """
+        if self.is_link_fresh_in_shared_cache(link, self.shared_freshness):
+            return True
+        return not self.get_flags_by_link(link).get('in_game', False) and self.is_link_checked_recently(link, self.on_server_freshness)
+
+    def get_conditional_headers(self, link: str) -> dict[str, str]:
+        """
+        Gets headers that make the server answer 304 Not Modified without a body if the page didn't change.
+        """
+        if not self.conditional_requests:
+            return {}
+        validators = self.get_link_validators(link)
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def check_page_validators(self, link: str, status_code: int, headers, content: bytes) -> tuple[dict[str, str], Optional[tuple[str, ...]]]:
+        """
+        Gets new validators of the page and the cached status if the page didn't change since it was parsed
+        (the server answered 304 or the content hash is the same). Cached status is None if the page has to be parsed.
+        """
+        old_validators = self.get_link_validators(link)
+        if self.conditional_requests and status_code == 304 and old_validators:
+            return old_validators, tuple(self.links_info_map[link]['current_status'])
+        validators = {'content_hash': blake2b(content, digest_size=16).hexdigest()}
+        if headers.get('ETag'):
+            validators['etag'] = headers['ETag']
+        if headers.get('Last-Modified'):
+            validators['last_modified'] = headers['Last-Modified']
+        if self.conditional_requests and old_validators.get('content_hash') == validators['content_hash']:
+            return validators, tuple(self.links_info_map[link]['current_status'])
+        return validators, None
+
+    def get_connection_stats(self) -> dict[str, int]:
+        """
+        Gets the amount of new and reused connections of the last cycle. Empty if the parser doesn't track them.
+        """
+        return {}
+
+    def close(self):
+        """
+        Releases resources held between cycles. Cache is not flushed here (see flush_cache).
+        """
+
     @abstractmethod
     def parse_links_info(self) -> CacheableData:
         """
@@ -146,18 +352,20 @@ class AbstractNameParser(ABC, NameParserCacheManager):  # Trying different OOP a
 class SyncNameParser(AbstractNameParser):
     def parse_links_info(self):
         """
-        Runs link parsing tasks and returns a set of parsed names and links info map.
+        Runs link parsing tasks and returns links info map. Names and their changes are updated (see update_names).
         Saves cached links info in proper order.
         """
-        links, names = set(), set()
+        links = set()
+        self.refresh_cache()
+        if self.has_unresolved_links():
+            asyncio.run(self.resolve_links())
         with requests.Session() as session:
             for link in self._links_flags_map:
                 result = self.parse_link_for_current_info(link, session)
                 if None not in result:
                     links.add(result[0])
-                    names.add(result[1])
-                print(result)
-        self.names = names
+                SCAN_LOG.debug(result)
+        self.update_names()
         self.reorder_links_info_map([key for key in self.get_all_links() if key in links])
         self.save_cache()
         return self.links_info_map
@@ -168,48 +376,173 @@ class SyncNameParser(AbstractNameParser):
         If successful writes info to memory cache in proper order since it's sync.
         Unless it manages to get previously unretrieved values, of course.
         """
+        if self.is_link_fresh(link):  # another instance has just parsed it or it's checked recently
+            return link, *self.get_current_link_status_from_cache(link)
         for fails_con in range(self.max_fails_con):
             try:
-                reqt = session.get(link, timeout=self.timeout_time)
+                reqt = session.get(link, timeout=self.timeout_time, headers=self.get_conditional_headers(link))
                 content = reqt.content
-                parser = bs4.BeautifulSoup(content, 'html.parser')
-                name, status, ingame = self.parse_name_status_ingame(parser)
+                validators, cached_status = self.check_page_validators(link, reqt.status_code, reqt.headers, content)
+                name, status, ingame = cached_status or self.parse_name_status_ingame(content)
                 # self._names_flags_map[name] = self.get_flags_by_link(link)
                 if self.is_ingame(link, status, ingame):
                     notify_ingame(name, ingame)
-                self.cache_info(link, self.get_flags_by_link(link), name, status, ingame)
+                self.cache_info(link, self.get_flags_by_link(link), name, status, ingame, validators=validators)
                 break
             except (AttributeError, requests.exceptions.ConnectionError) as e:  # page didn't load or connection aborted
                 if not self.is_silent:
-                    print(link, f'[{e}] {fails_con+1} of {self.max_fails_con}')
+                    SCAN_LOG.info(link, f'[{e}] {fails_con+1} of {self.max_fails_con}')
         else:  # Executes when consecutive errors exceed maximum
             return link, *self.get_current_link_status_from_cache(link)  # might be None
         return link, name, status, ingame
 
 
 class AsyncNameParser(AbstractNameParser):
+    parse_executor_type: Optional[str]  # Executor for parsing pages off the event loop. None parses on the event loop
+    parse_workers: Optional[int]        # Max workers of the executor
+    max_pending_parses: int             # Max pages submitted to the executor at once. The rest wait without hogging memory
+    max_concurrent_requests: int        # Max requests in flight at once so Steam doesn't throttle them
+    connector_options: dict             # aiohttp.TCPConnector keyword arguments (limit_per_host, ttl_dns_cache, keepalive_timeout...)
+    retry_backoff: float                # Base of exponential backoff between retries of one link in secs
+    retry_backoff_max: float            # Max backoff in secs
+    connection_stats: dict[str, int]    # New and reused connections of the last cycle
+    _loop: Optional[asyncio.AbstractEventLoop]      # Event loop kept between cycles so connections are kept alive between them
+    _session: Optional[aiohttp.ClientSession]       # Created on the first cycle
+    _parse_executor: Optional[Executor]             # Created on first use and kept between cycles
+    _parse_semaphore: asyncio.Semaphore             # Created along with the session
+    _request_semaphore: asyncio.Semaphore           # Created along with the session
+    config_attributes_map = AbstractNameParser.config_attributes_map | {
+        'MAX_PENDING_PARSES': 'max_pending_parses',
+        'MAX_CONCURRENT_REQUESTS': 'max_concurrent_requests',
+        'CONNECTOR_OPTIONS': 'connector_options',
+        'RETRY_BACKOFF': 'retry_backoff',
+        'RETRY_BACKOFF_MAX': 'retry_backoff_max',
+    }
+
+    def __init__(self, links_info_map, timeout_time=TIMEOUT_TIME, max_fails_con=MAX_FAILS_CON, ingames=INGAMES,
+                 links_flags_map=LINKS_FLAGS_MAP, is_silent=False, shared_freshness=SHARED_FRESHNESS, extractor=None,
+                 conditional_requests=CONDITIONAL_REQUESTS, on_server_freshness=ON_SERVER_FRESHNESS, steamid_resolver=None,
+                 parse_executor_type=PARSE_EXECUTOR, parse_workers=PARSE_WORKERS, max_pending_parses=MAX_PENDING_PARSES,
+                 max_concurrent_requests=MAX_CONCURRENT_REQUESTS, connector_options=CONNECTOR_OPTIONS,
+                 retry_backoff=RETRY_BACKOFF, retry_backoff_max=RETRY_BACKOFF_MAX):
+        super().__init__(links_info_map, timeout_time, max_fails_con, ingames, links_flags_map, is_silent, shared_freshness, extractor,
+                         conditional_requests, on_server_freshness, steamid_resolver)
+        if parse_executor_type is not None and parse_executor_type not in PARSE_EXECUTORS_MAP:
+            raise ValueError(f'Parse executor must be one of {list(PARSE_EXECUTORS_MAP)} or None.')
+        self.parse_executor_type = parse_executor_type
+        self.parse_workers = parse_workers
+        self.max_pending_parses = max_pending_parses
+        self.max_concurrent_requests = max_concurrent_requests
+        self.connector_options = connector_options
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.connection_stats = {'new': 0, 'reused': 0}
+        self._loop = None
+        self._session = None
+        self._parse_executor = None
+
+    def get_parse_executor(self) -> Optional[Executor]:
+        if self._parse_executor is None and self.parse_executor_type is not None:
+            self._parse_executor = PARSE_EXECUTORS_MAP[self.parse_executor_type](max_workers=self.parse_workers)
+        return self._parse_executor
+
+    def get_connection_stats(self) -> dict[str, int]:
+        return self.connection_stats
+
+    def close(self):
+        """
+        Closes the session with its kept alive connections, the event loop and shuts down the parse executor (its worker processes).
+        """
+        if self._loop is not None:
+            if self._session is not None:
+                self._loop.run_until_complete(self._session.close())
+                self._session = None
+            self._loop.close()
+            self._loop = None
+        if self._parse_executor is not None:
+            self._parse_executor.shutdown(cancel_futures=True)
+            self._parse_executor = None
+
+    def apply_config(self, settings: dict[str, Any]):
+        """
+        Applies changed NAME_PARSERS config settings between cycles keeping the session with its kept alive connections
+        unless connection settings have changed. Semaphores are recreated only if their limits have changed.
+        """
+        super().apply_config(settings)
+        if self._session is None:   # limits are applied when the session is created
+            return
+        if settings.keys() & {'TIMEOUT_TIME', 'CONNECTOR_OPTIONS'}:
+            self._loop.run_until_complete(self._session.close())    # type: ignore
+            self._session = None
+        elif settings.keys() & {'MAX_CONCURRENT_REQUESTS', 'MAX_PENDING_PARSES'}:
+            self._request_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._parse_semaphore = asyncio.Semaphore(self.max_pending_parses)
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """
+        Creates a session with the tuned connector. Must be called in the event loop.
+        """
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        self._request_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self._parse_semaphore = asyncio.Semaphore(self.max_pending_parses)
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(**self.connector_options),
+            timeout=aiohttp.ClientTimeout(connect=self.timeout_time, sock_read=self.timeout_time),
+            headers={'Accept-Encoding': 'gzip, deflate'},
+            trace_configs=[trace_config])
+
+    async def _on_connection_create_end(self, session, trace_config_ctx, params):
+        self.connection_stats['new'] += 1
+
+    async def _on_connection_reuseconn(self, session, trace_config_ctx, params):
+        self.connection_stats['reused'] += 1
+
+    def get_retry_delay(self, fails_con: int) -> float:
+        """
+        Gets exponential backoff delay with full jitter so retries of throttled links don't come back all at once.
+        """
+        return uniform(0, min(self.retry_backoff_max, self.retry_backoff * 2**fails_con))
+
+    async def parse_name_status_ingame_off_loop(self, content: bytes) -> tuple[str, str, str]:
+        """
+        Parses page content in the parse executor so the event loop keeps fetching other pages meanwhile.
+        The extractor must be picklable (module level function) for the process executor.
+        """
+        executor = self.get_parse_executor()
+        if executor is None:
+            return self.parse_name_status_ingame(content)
+        async with self._parse_semaphore:
+            return await asyncio.get_running_loop().run_in_executor(executor, self.extractor, content)
+
     def parse_links_info(self):
         """
-        Runs main in an event loop and provides a synchronous interface for name parsing.
-        Returns a set of parsed names and links info map.
+        Runs main in the event loop kept between cycles and provides a synchronous interface for name parsing.
+        Returns links info map. Names and their changes are updated (see update_names).
         """
-        return asyncio.run(self.main())
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.main())
 
     async def main(self) -> CacheableData:
         """
-        Schedules link parsing tasks and returns a set of parsed names.
+        Schedules link parsing tasks and returns links info map.
         Saves cached links info in proper order.
         """
-        tasks, links, names = [], set(), set()
-        async with aiohttp.ClientSession(conn_timeout=self.timeout_time, read_timeout=self.timeout_time) as session:
-            for link in self._links_flags_map:
-                tasks.append(asyncio.create_task(self.parse_link_for_current_info(link, session)))
-            for result in asyncio.as_completed(tasks):
-                result = await result       # type: ignore
-                if None not in result:
-                    links.add(result[0])    # type: ignore
-                    names.add(result[1])    # type: ignore
-        self.names = names
+        tasks, links = [], set()
+        self.refresh_cache()
+        self.connection_stats = {'new': 0, 'reused': 0}
+        if self._session is None:
+            self._session = self.create_session()
+        await self.resolve_links(self._session)
+        for link in self._links_flags_map:
+            tasks.append(asyncio.create_task(self.parse_link_for_current_info(link, self._session)))
+        for result in asyncio.as_completed(tasks):
+            result = await result       # type: ignore
+            if None not in result:
+                links.add(result[0])    # type: ignore
+        self.update_names()
         self.reorder_links_info_map([key for key in self.get_all_links() if key in links])
         self.save_cache()
         return self.links_info_map
@@ -219,25 +552,149 @@ class AsyncNameParser(AbstractNameParser):
         Parses link to get current Steam account name, status and game the player is currently in.
         Uses caching.
         """
+        if self.is_link_fresh(link):  # another instance has just parsed it or it's checked recently
+            return link, *self.get_current_link_status_from_cache(link)
         for fails_con in range(self.max_fails_con):
             try:
-                async with session.get(link) as reqt:
-                    content = await reqt.content.read()
-                    parser = bs4.BeautifulSoup(content, 'html.parser')
-                    name, status, ingame = self.parse_name_status_ingame(parser)
-                    if self.is_ingame(link, status, ingame):
-                        notify_ingame(name, ingame)
-                    self.cache_info(link, self.get_flags_by_link(link), name, status, ingame)
-                    break
+                async with self._request_semaphore:
+                    async with session.get(link, headers=self.get_conditional_headers(link)) as reqt:
+                        content = await reqt.content.read()
+                        status_code, headers = reqt.status, reqt.headers
+                validators, cached_status = self.check_page_validators(link, status_code, headers, content)
+                name, status, ingame = cached_status or await self.parse_name_status_ingame_off_loop(content)
+                if self.is_ingame(link, status, ingame):
+                    notify_ingame(name, ingame)
+                self.cache_info(link, self.get_flags_by_link(link), name, status, ingame, validators=validators)
+                break
             except (AttributeError, ConnectionError, aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError,
                     asyncio.exceptions.TimeoutError) as e:  # page didn't load or connection aborted
                 if not self.is_silent:
-                    print(link, f'[{e}] {fails_con+1} of {self.max_fails_con}')
+                    SCAN_LOG.info(link, f'[{e}] {fails_con+1} of {self.max_fails_con}')
+                if fails_con + 1 < self.max_fails_con:
+                    await asyncio.sleep(self.get_retry_delay(fails_con))
         else:  # Executes when consecutive errors exceed maximum
             return link, *self.get_current_link_status_from_cache(link)  # might be None
         return link, name, status, ingame
 
 
+def get_name_status_ingame_from_summary(summary: dict) -> tuple[str, str, str]:
+    """
+    Converts a player summary to the same name, status and game that profile pages have.
+    """
+    name = summary['personaname']
+    if summary.get('communityvisibilitystate') != 3:    # 3 is public
+        return name, 'Private', ''
+    if summary.get('gameextrainfo'):
+        return name, 'Currently In-Game', summary['gameextrainfo']
+    if summary.get('personastate', 0) == 0:
+        return name, 'Currently Offline', ''
+    return name, 'Currently Online', ''     # busy, away, snooze, looking to trade or play are online on profile pages too
+
+
+class BatchNameParser(AbstractNameParser):
+    """
+    Resolves links in batches with a summaries endpoint of Steam Web API instead of requesting a page per link.
+    Needs STEAM_API_KEY. Vanity names are resolved to steamid64 once (see steam_links.py).
+    """
+    summaries_url: str      # GetPlayerSummaries endpoint (configurable for testing with a local stand-in server)
+    api_key: str
+    batch_size: int         # Max accounts per summaries request
+    steamid_resolver: SteamIdResolver
+    requests_count: int     # Requests sent in the last cycle
+
+    def __init__(self, links_info_map, timeout_time=TIMEOUT_TIME, max_fails_con=MAX_FAILS_CON, ingames=INGAMES,
+                 links_flags_map=LINKS_FLAGS_MAP, is_silent=False, shared_freshness=SHARED_FRESHNESS,
+                 on_server_freshness=ON_SERVER_FRESHNESS, steamid_resolver=None, summaries_url=SUMMARIES_URL,
+                 api_key=STEAM_API_KEY, batch_size=BATCH_SIZE):
+        super().__init__(links_info_map, timeout_time, max_fails_con, ingames, links_flags_map, is_silent, shared_freshness,
+                         on_server_freshness=on_server_freshness, steamid_resolver=steamid_resolver or SteamIdResolver(api_key=api_key))
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f'Batch size must be from 1 to {MAX_BATCH_SIZE}.')
+        if not api_key:
+            raise ValueError('Batch backend needs STEAM_API_KEY.')
+        self.summaries_url = summaries_url
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.requests_count = 0
+
+    def apply_config(self, settings: dict[str, Any]):
+        batch_size = settings.get('BATCH_SIZE', self.batch_size)
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f'Batch size must be from 1 to {MAX_BATCH_SIZE}.')
+        super().apply_config(settings)
+        self.batch_size = batch_size
+
+    def parse_links_info(self):
+        """
+        Runs main in an event loop and provides a synchronous interface for name parsing.
+        Returns links info map.
+        """
+        return asyncio.run(self.main())
+
+    async def main(self) -> CacheableData:
+        """
+        Resolves steamids of links that need requesting, gets their summaries in batches concurrently
+        and caches them the same way page parsers do. Saves cached links info in proper order.
+        """
+        links = set()
+        self.refresh_cache()
+        self.requests_count = 0
+        timeout = aiohttp.ClientTimeout(connect=self.timeout_time, sock_read=self.timeout_time)
+        async with aiohttp.ClientSession(timeout=timeout, trace_configs=[self.get_requests_counter()]) as session:
+            await self.resolve_links(session)
+            links_to_request = [link for link in self._links_flags_map if not self.is_link_fresh(link)]
+            steamids = await self.steamid_resolver.resolve(links_to_request, session, self.max_fails_con)   # no requests by now
+            unique_steamids = list(dict.fromkeys(steamids.values()))
+            batches = [unique_steamids[i:i+self.batch_size] for i in range(0, len(unique_steamids), self.batch_size)]
+            summaries = {}
+            for batch_summaries in await asyncio.gather(*(self.get_summaries(batch, session) for batch in batches)):
+                summaries |= batch_summaries
+        for link in self._links_flags_map:
+            summary = summaries.get(steamids.get(link))     # type: ignore
+            if summary is None:     # fresh, unresolved or failed to get
+                result = link, *self.get_current_link_status_from_cache(link)  # might be None
+            else:
+                name, status, ingame = get_name_status_ingame_from_summary(summary)
+                if self.is_ingame(link, status, ingame):
+                    notify_ingame(name, ingame)
+                self.cache_info(link, self.get_flags_by_link(link), name, status, ingame)
+                result = link, name, status, ingame
+            if None not in result:
+                links.add(result[0])
+        self.update_names()
+        self.reorder_links_info_map([key for key in self.get_all_links() if key in links])
+        self.save_cache()
+        return self.links_info_map
+
+    def get_requests_counter(self) -> aiohttp.TraceConfig:
+        async def on_request_start(session, trace_config_ctx, params):
+            self.requests_count += 1
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        return trace_config
+
+    async def get_summaries(self, steamids: list[str], session: aiohttp.ClientSession) -> dict[str, dict]:
+        """
+        Gets summaries of up to batch_size accounts by their steamids. Empty if all attempts failed.
+        """
+        for fails_con in range(self.max_fails_con):
+            try:
+                async with session.get(self.summaries_url, params={'key': self.api_key, 'steamids': ','.join(steamids)}) as reqt:
+                    players = (await reqt.json(content_type=None))['response']['players']
+                return {player['steamid']: player for player in players}
+            except (aiohttp.ClientError, asyncio.exceptions.TimeoutError, KeyError, TypeError, ValueError) as e:
+                if not self.is_silent:
+                    SCAN_LOG.info(f'[SUMMARIES {e!r}] {fails_con+1} of {self.max_fails_con}')
+        SCAN_LOG.warning(f'[SUMMARIES] all {self.max_fails_con} attempts failed, {len(steamids)} accounts keep cached info')
+        return {}
+
+
+NAME_PARSERS_MAP = {
+    'pages': AsyncNameParser,
+    'batch': BatchNameParser,
+}
+
+
 # TESTING/BENCHMARKING
 
 TEST_TEXT_NAMES_PATH = NAMES_PATH + 'cache_test.txt'
@@ -272,6 +729,7 @@ def name_parser_benchmark(name_parser: NameParser):
     start_time = perf_counter()
     name_parser.parse_links_info()  # dict with server_names as keys and adrs as values {server_name: adr}
     finish_time = perf_counter()
+    name_parser.close()
     return f'{type(name_parser).__name__} finished parsing in: {finish_time - start_time:.3}.'
 
 
@@ -288,6 +746,7 @@ def name_parser_cache_benchmark(name_parser: NameParser):
     name_parser.parse_links_info()
     finish_time = perf_counter()
     next(internet_switcher)     # unblocking them
+    name_parser.close()
     return f'{type(name_parser).__name__} Caching took: {finish_time - start_time:.3}'
 
 
@@ -306,7 +765,7 @@ def benchmark_sync_and_async_name_parsers_procedure():
 
 def benchmark_name_parsers_common_cache_procedure():
     CONSOLE.print('[START NAME PARSERS COMMON CACHE BENCHMARK PROCEDURE]')
-    common_cacheable_data = TextFileCacheableData(TEST_TEXT_NAMES_PATH)
+    common_cacheable_data = TextFileCacheableData(TEST_TEXT_NAMES_PATH, shared=True)     # processes merge their updates under file lock
     # common_cacheable_data = PickleCacheableData(TEST_PICKLE_NAMES_PATH)
     async_name_parser = AsyncNameParser(links_info_map=common_cacheable_data)
     sync_name_parser = SyncNameParser(links_info_map=common_cacheable_data, is_silent=True)  # Will log a lot of fails.
@@ -339,10 +798,102 @@ def test_name_table_procedure():
     CONSOLE.print('[START NAME TABLE TEST PROCEDURE]')
     name_parser = AsyncNameParser()
     name_parser_name_table_test(name_parser)
+    name_parser.close()
     CONSOLE.print('[END NAME TABLE TEST PROCEDURE]')
 
 
+def run_steam_api_stand_in(summaries: dict[str, dict], vanities_map: dict[str, str], port: int) -> dict[str, int]:
+    """
+    Runs a local stand-in of Steam Web API summaries and vanity endpoints in a daemon thread.
+    Returns counts of requests to them which are updated while it runs.
+    """
+    from threading import Thread
+    from aiohttp import web
+
+    requests_counts = {'summaries': 0, 'resolve': 0}
+
+    async def get_summaries(request):
+        requests_counts['summaries'] += 1
+        steamids = request.query['steamids'].split(',')[:MAX_BATCH_SIZE]
+        return web.json_response({'response': {'players': [summaries[steamid] for steamid in steamids if steamid in summaries]}})
+
+    async def resolve_vanity(request):
+        requests_counts['resolve'] += 1
+        steamid = vanities_map.get(request.query['vanityurl'].lower())
+        return web.json_response({'response': {'steamid': steamid, 'success': 1} if steamid else {'success': 42}})
+
+    async def get_malformed(request):
+        return web.json_response({'response': []})
+
+    app = web.Application()
+    app.router.add_get('/summaries', get_summaries)
+    app.router.add_get('/malformed', get_malformed)
+    app.router.add_get('/resolve', resolve_vanity)
+    Thread(target=web.run_app, args=(app,), kwargs={'host': '127.0.0.1', 'port': port, 'print': None, 'handle_signals': False},
+           daemon=True).start()
+    return requests_counts
+
+
+def test_batch_name_parser_procedure(size: int = 250, port: int = 8770):
+    from os.path import join
+    from random import Random
+    from tempfile import TemporaryDirectory
+    from time import sleep
+
+    from cache.synthetic_data import GAMES, SEED, make_name
+
+    CONSOLE.print('[START BATCH NAME PARSER TEST PROCEDURE]')
+    rng = Random(SEED)
+    summaries, vanities_map, links_flags_map, expected = {}, {}, {}, {}
+    for i in range(size):
+        steamid = str(76561197960265728 + i)
+        summary = {'steamid': steamid, 'personaname': make_name(rng), 'communityvisibilitystate': rng.choice([1, 3, 3, 3]),
+                   'personastate': rng.randint(0, 6)}
+        if summary['communityvisibilitystate'] == 3 and rng.random() < 0.3:
+            summary['gameextrainfo'] = rng.choice(GAMES)
+        summaries[steamid] = summary
+        canonical_link = f'https://steamcommunity.com/profiles/{steamid}'
+        if i % 2:
+            vanities_map[f'vanity{i}'] = steamid
+            links_flags_map[f'https://steamcommunity.com/id/Vanity{i}/'] = {'on_server': True, 'in_game': False}
+        else:
+            links_flags_map[canonical_link] = {'on_server': True, 'in_game': False}
+        if not i % 5:   # duplicates are merged into one account
+            links_flags_map[f'http://www.steamcommunity.com/profiles/{steamid}/?l=english'] = {'in_game': True}
+        expected[canonical_link] = get_name_status_ingame_from_summary(summary), {'on_server': True, 'in_game': not i % 5}
+    requests_counts = run_steam_api_stand_in(summaries, vanities_map, port)
+    sleep(1)
+    with TemporaryDirectory() as directory:
+        steamid_resolver = SteamIdResolver(PickleCacheableData(join(directory, 'steamids.bin')),
+                                           resolve_vanity_url=f'http://127.0.0.1:{port}/resolve', api_key='TEST')
+        name_parser = BatchNameParser(PickleCacheableData(join(directory, 'names.bin')), links_flags_map=links_flags_map,
+                                      steamid_resolver=steamid_resolver, summaries_url=f'http://127.0.0.1:{port}/summaries',
+                                      api_key='TEST', ingames=[], on_server_freshness=0)   # so links are requested every cycle
+        for cycle in range(2):
+            requests_counts.update(summaries=0, resolve=0)
+            links_info_map = name_parser.parse_links_info()
+            assert {link: (tuple(link_info['current_status']), link_info['flags']) for link, link_info in links_info_map.items()} == expected
+            CONSOLE.print(f'Cycle {cycle}: {len(name_parser.names)} names of {len(links_flags_map)} links ({size} accounts) '
+                          f'in {name_parser.requests_count} requests '
+                          f'({requests_counts["resolve"]} vanity, {requests_counts["summaries"]} summaries)')
+
+        async def get_malformed_summaries():
+            async with aiohttp.ClientSession() as session:
+                return await name_parser.get_summaries(['76561197960265728'], session)
+
+        name_parser.summaries_url = f'http://127.0.0.1:{port}/malformed'
+        assert asyncio.run(get_malformed_summaries()) == {}    # failed attempts, not an exception ending the cycle
+        try:
+            BatchNameParser(PickleCacheableData(join(directory, 'names.bin')), steamid_resolver=steamid_resolver, api_key='')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Batch name parser was created without an API key')
+    CONSOLE.print('[END BATCH NAME PARSER TEST PROCEDURE]')
+
+
 if __name__ == '__main__':
+    test_batch_name_parser_procedure()
     # benchmark_sync_and_async_name_parsers_procedure()
     benchmark_name_parsers_common_cache_procedure()
     test_name_table_procedure()
@@ -1,57 +1,355 @@
 """
 This is a module with predefined notifications invoker functions.
-"""
 
-from winotify import Notification
+Showing a toast launches a blocking external process, so the invokers only put notices into a bounded queue
+of the dispatcher (NOTIFIER) and return at once. Its worker thread merges notices of one kind that come within
+COALESCE_WINDOW (ex. all matches of one cycle) into one toast, rate limits toasts to MAX_PER_MINUTE
+(notices over the limit wait and get merged with the next ones) and shows them with pluggable backends:
+    winotify — Windows toasts (the default, falls back to console if winotify isn't available)
+    console  — CONSOLE prints
+    jsonl    — a line of JSON per toast appended to JSONL_PATH
+    webhook  — a JSON POST to WEBHOOK_URL (ex. a local bot or a stand-in server)
+"""
 
+import json
+import queue
 from sys import path
 from os.path import join
+from threading import Lock, Thread
+from time import monotonic, time
+from typing import NamedTuple, Optional, Protocol
+
+import requests     # type: ignore # lib stubs
+
+from exclusions import ExclusionIndex
+from helpers import APP_ID, BASE_DIR, CONFIG, CONSOLE, addr_to_ip, remove_unprintable
+from scan_log import SCAN_LOG
+
+
+BACKENDS = CONFIG['NOTIFICATIONS']['BACKENDS']
+QUEUE_SIZE = CONFIG['NOTIFICATIONS']['QUEUE_SIZE']
+COALESCE_WINDOW = CONFIG['NOTIFICATIONS']['COALESCE_WINDOW']   # in secs
+MAX_PER_MINUTE = CONFIG['NOTIFICATIONS']['MAX_PER_MINUTE']
+JSONL_PATH = join(BASE_DIR, CONFIG['NOTIFICATIONS']['JSONL_PATH'])
+WEBHOOK_URL = CONFIG['NOTIFICATIONS']['WEBHOOK_URL']
+WEBHOOK_TIMEOUT = 5     # in secs
+
+
+class Notice(NamedTuple):
+    """
+    A notification. Notices with the same kind, app_id, icon and duration are merged by joining their unique title and message parts.
+    """
+    kind: str               # 'onserver', 'moved', 'left', 'ingame' or 'exception'
+    app_id: str             # Toasts are grouped by it
+    title_parts: tuple[str, ...]
+    msg_parts: tuple[str, ...]
+    icon: str
+    duration: str           # 'short' or 'long'
+    count: int = 1          # Notices merged into this one
+
+    @property
+    def title(self) -> str:
+        return ', '.join(self.title_parts)
+
+    @property
+    def msg(self) -> str:
+        return '; '.join(self.msg_parts)
+
+
+def coalesce(notices: list[Notice]) -> list[Notice]:
+    """
+    Merges notices of one kind in order of their first appearance.
+    """
+    merged: dict[tuple[str, str, str, str], Notice] = {}
+    for notice in notices:
+        key = notice.kind, notice.app_id, notice.icon, notice.duration
+        if key not in merged:
+            merged[key] = notice
+            continue
+        first = merged[key]
+        merged[key] = first._replace(title_parts=tuple(dict.fromkeys(first.title_parts + notice.title_parts)),
+                                     msg_parts=tuple(dict.fromkeys(first.msg_parts + notice.msg_parts)),
+                                     count=first.count + notice.count)
+    return list(merged.values())
+
+
+class NotificationBackend(Protocol):
+    def show(self, notice: Notice) -> None:
+        ...
+
+
+class WinotifyBackend:
+    def __init__(self):
+        from winotify import Notification   # type: ignore # Windows only so imported lazily
+        self.notification_type = Notification
+
+    def show(self, notice: Notice):
+        self.notification_type(app_id=notice.app_id, title=remove_unprintable(notice.title), msg=remove_unprintable(notice.msg),
+                               duration=notice.duration, icon=notice.icon).show()
+
+
+class ConsoleBackend:
+    def show(self, notice: Notice):
+        CONSOLE.print(f'[NOTIFICATION] {notice.app_id}: {notice.title}' + (f' — {notice.msg}' if notice.msg else ''),
+                      style='bold magenta', markup=False)
+
+
+class JsonlBackend:
+    path: str
+
+    def __init__(self, path=JSONL_PATH):
+        self.path = path
+
+    def show(self, notice: Notice):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(get_notice_record(notice), ensure_ascii=False) + '\n')
+
+
+class WebhookBackend:
+    url: str
+    session: requests.Session
+
+    def __init__(self, url=WEBHOOK_URL):
+        self.url = url
+        self.session = requests.Session()   # used by the worker thread only
+
+    def show(self, notice: Notice):
+        self.session.post(self.url, json=get_notice_record(notice), timeout=WEBHOOK_TIMEOUT).raise_for_status()
+
+
+def get_notice_record(notice: Notice) -> dict:
+    return {'time': time(), 'kind': notice.kind, 'app_id': notice.app_id, 'title': notice.title, 'msg': notice.msg, 'count': notice.count}
 
-from helpers import APP_ID, BASE_DIR, addr_to_ip, remove_unprintable
+
+BACKENDS_MAP = {
+    'winotify': WinotifyBackend,
+    'console': ConsoleBackend,
+    'jsonl': JsonlBackend,
+    'webhook': WebhookBackend,
+}
+
+
+def get_backends(names: list[str] = BACKENDS) -> list[NotificationBackend]:
+    backends = []
+    for name in names:
+        if name not in BACKENDS_MAP:
+            raise ValueError(f'Notification backends must be some of {list(BACKENDS_MAP)}.')
+        try:
+            backends.append(BACKENDS_MAP[name]())
+        except ImportError:     # winotify on other platforms
+            CONSOLE.print(f'[NOTIFICATIONS] {name} backend is not available, using console', style='bold yellow')
+            backends.append(ConsoleBackend())
+    return backends
+
+
+class NotificationDispatcher:
+    """
+    Shows notices with its backends in a worker thread. notify never blocks: notices are dropped when the queue is full.
+    """
+    backends: list[NotificationBackend]
+    coalesce_window: float      # in secs
+    min_interval: float         # in secs. Time for one token to refill (toasts are rate limited with a token bucket)
+    max_tokens: float
+    queue: queue.Queue
+    dropped_count: int          # Notices dropped because the queue was full
+    shown_count: int            # Toasts shown
+    _tokens: float
+    _refilled_at: float         # monotonic time of the last tokens refill
+    _worker: Optional[Thread]   # Started on the first notice
+    _lock: Lock                 # for starting the worker once
+
+    def __init__(self, backends: Optional[list[NotificationBackend]] = None, queue_size=QUEUE_SIZE, coalesce_window=COALESCE_WINDOW,
+                 max_per_minute=MAX_PER_MINUTE):
+        self.backends = backends if backends is not None else get_backends()
+        self.coalesce_window = coalesce_window
+        self.min_interval = 60/max_per_minute
+        self.max_tokens = max_per_minute
+        self.queue = queue.Queue(queue_size)
+        self.dropped_count = 0
+        self.shown_count = 0
+        self._tokens = max_per_minute
+        self._refilled_at = monotonic()
+        self._worker = None
+        self._lock = Lock()
+
+    def notify(self, notice: Notice):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = Thread(target=self.run, name='notifications', daemon=True)
+                    self._worker.start()
+        try:
+            self.queue.put_nowait(notice)
+        except queue.Full:
+            self.dropped_count += 1
+
+    def refill_tokens(self):
+        now = monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._refilled_at)/self.min_interval)
+        self._refilled_at = now
+
+    def get_next_token_time(self) -> float:
+        """
+        Gets monotonic time when there'll be a token for one more toast.
+        """
+        self.refill_tokens()
+        return self._refilled_at + max(0, 1 - self._tokens)*self.min_interval
+
+    def show(self, notice: Notice):
+        for backend in self.backends:
+            try:
+                backend.show(notice)
+            except Exception as e:  # a broken backend shouldn't kill the worker or other backends
+                CONSOLE.print(f'[NOTIFICATIONS] {type(backend).__name__} failed: {e!r}', style='bold red', markup=False)
+        self.shown_count += 1
+
+    def collect(self, notices: list[Notice], deadline: float) -> bool:
+        """
+        Adds notices that come until the deadline (monotonic time) to notices. Returns True if the dispatcher is closing.
+        """
+        while (timeout := deadline - monotonic()) > 0:
+            try:
+                notice = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if notice is None:
+                return True
+            notices.append(notice)
+        return False
+
+    def run(self):
+        pending: list[Notice] = []   # merged notices that are waiting for tokens
+        while True:
+            if not pending:
+                notice = self.queue.get()
+                if notice is None:
+                    return
+                pending.append(notice)
+            closing = self.collect(pending, max(monotonic() + self.coalesce_window, self.get_next_token_time()))
+            notices = coalesce(pending)
+            self.refill_tokens()
+            shown_count = len(notices) if closing else min(len(notices), int(self._tokens))   # everything is shown on close
+            for notice in notices[:shown_count]:
+                self.show(notice)
+            self._tokens = max(0, self._tokens - shown_count)
+            pending = notices[shown_count:]
+            if closing:
+                return
+
+    def close(self, timeout: float = 10):
+        """
+        Shows waiting notices and stops the worker. Notices that come after it are queued but not shown.
+        """
+        if self._worker is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._worker.join(timeout)
+
+
+NOTIFIER = NotificationDispatcher()
 
 
 def notify_ingame(name: str, ingame: str):
-    Notification(app_id=ingame,
-                 title=remove_unprintable(name),
-                 duration='short',
-                 icon=join(path[0], join(BASE_DIR, r'noticons\games.png'))).show()    # not using NOTIFIER to categorize notifications by app_id
+    NOTIFIER.notify(Notice('ingame', app_id=ingame, title_parts=(name,), msg_parts=(), duration='short',
+                           icon=join(path[0], join(BASE_DIR, r'noticons\games.png'))))    # app_id is the game to categorize notifications by it
 
 
 def notify_exception(exception: Exception, title: str = 'Exception'):
-    Notification(
-        app_id=APP_ID,
-        title=title,
-        msg=exception,
-        duration='long',
-        icon=join(path[0], join(BASE_DIR, r'noticons\error.png'))).show()
+    NOTIFIER.notify(Notice('exception', app_id=APP_ID, title_parts=(title,), msg_parts=(str(exception),), duration='long',
+                           icon=join(path[0], join(BASE_DIR, r'noticons\error.png'))))
 
 
 def notify_onserver(
-        excluded_servers_names_map: dict[str, set[str]],
-        names_on_server: set[str], server_name: str, addr: tuple[str, int],):
+        exclusion_index: ExclusionIndex,
+        names_on_server: set[str], server_name: str, addr: tuple[str, int], kind: str = 'onserver'):
     """
-    Notifies about names present on the server.
-    Exclusions disable notifications for their corresponding areas:
-        __all__      name       ,   <-  to exclude a set of names for every server;
-        1.1.1.1:1    name       ,   <-  to exclude a set of names for a specific server by its ip:port;
-        1.1.1.1:1    __all__    ,   <-  to exclude a specific server by its ip:port for all names.
+    Notifies about names present on the server, or that moved to it (kind='moved') or left it (kind='left').
+    Exclusions disable notifications for their corresponding areas (see exclusions.py).
     """
     address = addr_to_ip(addr)
-    if '__all__' in excluded_servers_names_map.get(address, set()):
-        print(f'SERVER IS EXCLUDED  {excluded_servers_names_map}')
+    if exclusion_index.is_server_excluded(address):
+        SCAN_LOG.info('SERVER IS EXCLUDED', address)
         return
-    excluded_names = set()  # not removing from names_on_server directly for safe iterations.
-    for name_on_server in names_on_server:
-        if name_on_server in excluded_servers_names_map.get(address, set()) | excluded_servers_names_map['__all__']:
-            excluded_names.add(name_on_server)
-            print(f'REMOVED NAME    {name_on_server}')
+    excluded_names = {name_on_server for name_on_server in names_on_server if exclusion_index.is_name_excluded(address, name_on_server)}
+    for name_on_server in excluded_names:
+        SCAN_LOG.info('REMOVED NAME', name_on_server)
     names_on_server -= excluded_names
     if not names_on_server:   # check if empty
-        print(f'ALL NAMES REMOVED   {excluded_servers_names_map}')
+        SCAN_LOG.info('ALL NAMES REMOVED', address)
         return
-    Notification(
-        app_id=APP_ID,
-        title=', '.join(remove_unprintable(s) for s in names_on_server),
-        msg=remove_unprintable(server_name),
-        duration='short',
-        icon=join(path[0], join(BASE_DIR, r'noticons\loupe.png'))).show()
+    msg = server_name if kind == 'onserver' else f'{server_name} ({kind})'
+    NOTIFIER.notify(Notice(kind, app_id=APP_ID, title_parts=tuple(sorted(names_on_server)), msg_parts=(msg,),
+                           duration='short', icon=join(path[0], join(BASE_DIR, r'noticons\loupe.png'))))
+
+
+# TESTING
+
+def run_webhook_stand_in(port: int) -> tuple[list[dict], Thread]:
+    """
+    Runs a local webhook server in a thread. Returns a list it appends received records to.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    records: list[dict] = []
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            records.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), WebhookHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return records, thread
+
+
+def test_dispatcher_procedure(port: int = 8765):
+    from os.path import join
+    from tempfile import TemporaryDirectory
+    from time import sleep
+
+    CONSOLE.print('[START NOTIFICATION DISPATCHER TEST PROCEDURE]')
+    records, _ = run_webhook_stand_in(port)
+    with TemporaryDirectory() as directory:
+        jsonl_path = join(directory, 'notifications.jsonl')
+        dispatcher = NotificationDispatcher([ConsoleBackend(), JsonlBackend(jsonl_path), WebhookBackend(f'http://127.0.0.1:{port}/notify')],
+                                            queue_size=64, coalesce_window=0.2, max_per_minute=120)
+        dispatcher.notify(Notice('ingame', 'Team Fortress 2', ('name0',), (), 'games.png', 'short'))
+        start_time = monotonic()
+        for i in range(100):    # a burst of matches in one cycle
+            dispatcher.notify(Notice('onserver', APP_ID, (f'name{i % 5}',), (f'server{i % 3}',), 'loupe.png', 'short'))
+        enqueue_time = monotonic() - start_time
+        dispatcher.close()
+        with open(jsonl_path, encoding='utf-8') as f:
+            jsonl_records = [json.loads(line) for line in f]
+    assert enqueue_time < 0.05, f'Notifying took {enqueue_time:.3f} secs'
+    assert 36 <= dispatcher.dropped_count <= 37, dispatcher.dropped_count     # the worker might have taken one notice already
+    assert [record['kind'] for record in jsonl_records] == ['ingame', 'onserver'], jsonl_records
+    assert jsonl_records[1]['title'] == 'name0, name1, name2, name3, name4' and jsonl_records[1]['count'] == 100 - dispatcher.dropped_count
+    assert [record['title'] for record in records] == [record['title'] for record in jsonl_records]
+    CONSOLE.print(f'101 notices ({dispatcher.dropped_count} dropped by the full queue) in {enqueue_time*1000:.2f} ms '
+                  f'became {dispatcher.shown_count} toasts')
+
+    dispatcher = NotificationDispatcher([], coalesce_window=0.05, max_per_minute=6)    # a burst of 6 toasts, then one per 10 secs
+    for i in range(20):
+        dispatcher.notify(Notice('exception', APP_ID, ('Exception',), (str(i),), 'error.png', 'long'))
+        dispatcher.notify(Notice('ingame', f'Game {i}', ('name',), (), 'games.png', 'short'))   # can't be merged
+        sleep(0.01)
+    sleep(0.3)
+    assert dispatcher.shown_count == 6, dispatcher.shown_count
+    dispatcher.close()
+    assert 21 <= dispatcher.shown_count <= 22, dispatcher.shown_count   # the rest are shown on close, exceptions are merged
+    CONSOLE.print(f'40 notices that can\'t all be merged became 6 toasts in 0.5 secs (rate limited) '
+                  f'and {dispatcher.shown_count - 6} more on close')
+    CONSOLE.print('[END NOTIFICATION DISPATCHER TEST PROCEDURE]')
+
+
+if __name__ == '__main__':
+    test_dispatcher_procedure()
@@ -0,0 +1,141 @@
+"""
+This is a module with output modes of the scanner (MAIN.OUTPUT_MODE):
+    "log"       <-  the screen is redrawn every cycle: names table, tables of players that joined or left servers, cycle summary;
+    "live"      <-  a rich.Live view of the latest cycle: only top TOP_SERVERS servers by population and servers with matched players.
+                    Its table is built only when the view is refreshed (once a cycle), not for every server;
+    "headless"  <-  no tables at all and rich console is quiet. Matches and cycle metrics are written as JSONL events
+                    to EVENTS_PATH (stdout if it's null), ex. for running as a daemon or piping to other tools.
+"""
+
+import json
+import sys
+from time import asctime, time
+from typing import Any, Iterable, Optional, TextIO
+
+from rich.console import Group
+from rich.table import Table
+from rich.text import Text
+
+from helpers import BASE_DIR, CONFIG, remove_diacritics
+from scan_results import ScanBatch, ServerScan
+
+
+OUTPUT_MODES = ('log', 'live', 'headless')
+OUTPUT_MODE = CONFIG['MAIN']['OUTPUT_MODE']
+if OUTPUT_MODE not in OUTPUT_MODES:
+    raise ValueError(f'Output mode must be one of {OUTPUT_MODES}.')
+TOP_SERVERS = CONFIG['MAIN']['TOP_SERVERS']     # amount of the most populated servers in the live view
+EVENTS_PATH = CONFIG['MAIN']['EVENTS_PATH']     # relative to BASE_DIR. null means stdout
+
+
+class EventStream:
+    """
+    Writes events as JSON lines: {"event": <kind>, "time": <secs since epoch>, ...fields}.
+    """
+    file: TextIO
+
+    def __init__(self, file: Optional[TextIO] = None):
+        self.file = file if file is not None else sys.stdout
+
+    @classmethod
+    def open(cls, path: Optional[str] = EVENTS_PATH) -> 'EventStream':
+        if path is None:
+            return cls()
+        from os.path import join
+        return cls(open(join(BASE_DIR, path), 'a', encoding='utf-8', newline='\n'))
+
+    def emit(self, event: str, **fields: Any):
+        self.file.write(json.dumps({'event': event, 'time': time(), **fields}, ensure_ascii=False) + '\n')
+
+    def emit_cycle(self, server_scans: Iterable[ServerScan], metrics: dict[str, Any]):
+        """
+        Emits a match event for every matched player and then a cycle event with metrics. Flushes once a cycle.
+        """
+        for server_scan in server_scans:
+            for player_record in server_scan:
+                self.emit('match', server_name=server_scan.server_name, address=server_scan.address,
+                          scan_time=server_scan.scan_time, **player_record.as_dict())
+        self.emit('cycle', **metrics)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class CycleView:
+    """
+    Renderable of the latest cycle for rich.Live. Nothing is built until rich renders it.
+    """
+    top_servers: int
+    scan_batch: Optional[ScanBatch]
+    server_scans: dict[str, ServerScan]     # Server names to their scans with matched players
+    summary: str
+
+    def __init__(self, top_servers: int = TOP_SERVERS):
+        self.top_servers = top_servers
+        self.scan_batch = None
+        self.server_scans = {}
+        self.summary = 'Waiting for the first cycle to finish'
+
+    def update(self, scan_batch: ScanBatch, server_scans: dict[str, ServerScan], summary: str):
+        self.scan_batch = scan_batch
+        self.server_scans = server_scans
+        self.summary = summary
+
+    def get_servers_table(self) -> Table:
+        servers_table = Table(title=f'{asctime()} servers with matches and top {self.top_servers} by population')
+        servers_table.add_column('Server', style='cyan1')
+        servers_table.add_column('Address')
+        servers_table.add_column('Players', style='magenta')
+        servers_table.add_column('Matched players', style='green')
+        if self.scan_batch is None:
+            return servers_table
+        population = self.scan_batch.get_servers_stats()['population']
+        server_ids = sorted(range(len(population)), key=lambda server_id: population[server_id], reverse=True)[:self.top_servers]
+        matched_ids = [server_id for server_id, server_name in enumerate(self.scan_batch.server_names) if server_name in self.server_scans]
+        for server_id in dict.fromkeys(matched_ids + server_ids):   # matched first, no duplicates
+            server_name = self.scan_batch.server_names[server_id]
+            server_scan = self.server_scans.get(server_name)
+            matched_players = ', '.join(remove_diacritics(player_record.player_name) for player_record in server_scan) if server_scan else ''
+            servers_table.add_row(Text(remove_diacritics(server_name)), self.scan_batch.addresses[server_id], str(population[server_id]),
+                                  Text(matched_players))     # Text so names with brackets aren't taken for markup
+        return servers_table
+
+    def __rich__(self) -> Group:
+        return Group(self.get_servers_table(), Text(self.summary))
+
+
+# TESTING
+
+
+def test_output_procedure():
+    from io import StringIO
+
+    from rich.console import Console
+
+    from scan_results import PlayerRecord
+
+    print('[START OUTPUT TEST PROCEDURE]')
+    scan_batch = ScanBatch(0.)
+    for i in range(10):
+        scan_batch.add_server(f'server {i}', f'1.1.1.{i}:1', 0., [f'player {j}' for j in range(i)], [0] * i, [1.] * i)
+    server_scans = {'server 1': ServerScan('server 1', '1.1.1.1:1', 0., [PlayerRecord('[/bad] player 0', 'player 0', 0, 1.)])}
+    cycle_view = CycleView(top_servers=3)
+    cycle_view.update(scan_batch, server_scans, 'summary')
+    console = Console(file=StringIO(), width=200)
+    console.print(cycle_view)
+    lines = [line for line in console.file.getvalue().splitlines() if line.startswith('│')]
+    assert [line.split('│')[1].strip() for line in lines] == ['server 1', 'server 9', 'server 8', 'server 7'], lines
+    assert '[/bad] player 0' in lines[0]
+
+    event_stream = EventStream(StringIO())
+    event_stream.emit_cycle(server_scans.values(), {'cycle': 1})
+    events = [json.loads(line) for line in event_stream.file.getvalue().splitlines()]
+    assert [event['event'] for event in events] == ['match', 'cycle'] and events[0]['player_name'] == '[/bad] player 0'
+    print('Live view shows matched and top servers, events are JSON lines')
+    print('[END OUTPUT TEST PROCEDURE]')
+
+
+if __name__ == '__main__':
+    test_output_procedure()
@@ -0,0 +1,161 @@
+"""
+This is a module that remembers where tracked players are between cycles so notifications are sent on transitions only:
+    appeared — a player is seen on a server and wasn't seen anywhere
+    moved    — a player is seen on a server while being on another one
+    left     — a player isn't seen on a server that responded this cycle
+A player who stays on one server is notified again only every RENOTIFY_INTERVAL (never if it's null).
+
+Presence is kept in CacheableData keyed by "<ip:port> <player name>" so a restart doesn't notify about everyone again.
+Entries of servers that didn't respond for PRESENCE_TTL are forgotten without notifications.
+"""
+
+from os.path import join
+from time import time
+from typing import Optional
+
+from cache.abstract_cacheable_data import CacheableData
+from cache.cacheable_data import PickleCacheableData
+from helpers import BASE_DIR, CONFIG
+
+
+RENOTIFY_INTERVAL = CONFIG['SERVER_PARSERS']['RENOTIFY_INTERVAL']  # in secs
+PRESENCE_TTL = CONFIG['SERVER_PARSERS']['PRESENCE_TTL']            # in secs
+NOTIFY_LEAVES = CONFIG['SERVER_PARSERS']['NOTIFY_LEAVES']
+PRESENCE_PATH = join(BASE_DIR, r'data\presence_cache_prod.bin')
+
+
+def get_presence_key(address: str, name: str) -> str:
+    return f'{address} {name}'  # addresses have no spaces so it splits back by the first one
+
+
+class PresenceTracker:
+    """
+    Tracks presence of player names on servers between cycles. Call begin_cycle, then observe for every server that responded,
+    then end_cycle which also saves the presence.
+    """
+    presence_map: CacheableData     # Presence keys to {'server_name', 'first_seen', 'last_seen', 'notified_at'}
+    renotify_interval: Optional[float]
+    ttl: float
+    _names_addresses: dict[str, set[str]]   # Names to addresses they're present on (a name might be on several servers)
+    _seen_keys: set[str]                    # Presence keys seen this cycle
+    _scanned_addresses: set[str]            # Addresses of servers that responded this cycle
+
+    def __init__(self, presence_map=None, renotify_interval=RENOTIFY_INTERVAL, ttl=PRESENCE_TTL):
+        self.presence_map = presence_map if presence_map is not None else PickleCacheableData(PRESENCE_PATH)
+        self.renotify_interval = renotify_interval
+        self.ttl = ttl
+        self._names_addresses = {}
+        for key in self.presence_map.keys():
+            address, name = key.split(' ', 1)
+            self._names_addresses.setdefault(name, set()).add(address)
+        self._seen_keys = set()
+        self._scanned_addresses = set()
+
+    def begin_cycle(self):
+        self._seen_keys = set()
+        self._scanned_addresses = set()
+
+    def observe(self, address: str, server_name: str, names: set[str]) -> dict[str, set[str]]:
+        """
+        Records names seen on a server that responded (names might be empty).
+        Returns names to notify about by transitions: {'appeared': {...}, 'moved': {...}, 'renotify': {...}}.
+        """
+        now = time()
+        transitions: dict[str, set[str]] = {'appeared': set(), 'moved': set(), 'renotify': set()}
+        self._scanned_addresses.add(address)
+        for name in names:
+            key = get_presence_key(address, name)
+            self._seen_keys.add(key)
+            entry = self.presence_map.get(key)
+            if entry is None:
+                other_addresses = self._names_addresses.get(name, set())
+                transitions['moved' if other_addresses else 'appeared'].add(name)
+                entry = {'server_name': server_name, 'first_seen': now, 'last_seen': now, 'notified_at': now}
+                self._names_addresses.setdefault(name, set()).add(address)
+            else:
+                entry = dict(entry, server_name=server_name, last_seen=now)
+                if self.renotify_interval is not None and now - entry['notified_at'] >= self.renotify_interval:
+                    transitions['renotify'].add(name)
+                    entry['notified_at'] = now
+            self.presence_map.set(key, entry)
+        return transitions
+
+    def end_cycle(self) -> dict[str, tuple[str, set[str]]]:
+        """
+        Forgets names that weren't seen on servers that responded and entries that are too old, saves the presence.
+        Returns names that left by addresses: {address: (server_name, names)}. Names that moved aren't there.
+        """
+        now = time()
+        left: dict[str, tuple[str, set[str]]] = {}
+        for key, entry in list(self.presence_map.items()):
+            if key in self._seen_keys:
+                continue
+            address, name = key.split(' ', 1)
+            if address not in self._scanned_addresses and now - entry['last_seen'] < self.ttl:
+                continue    # the server didn't respond, the player might still be there
+            del self.presence_map[key]
+            addresses = self._names_addresses.get(name, set())
+            addresses.discard(address)
+            if not addresses:
+                self._names_addresses.pop(name, None)
+            moved = any(get_presence_key(other_address, name) in self._seen_keys for other_address in addresses)
+            if address in self._scanned_addresses and not moved:
+                left.setdefault(address, (entry['server_name'], set()))[1].add(name)
+        self.presence_map.update_external_cache()
+        return left
+
+    def flush(self):
+        self.presence_map.flush()
+
+
+# TESTING
+
+def test_presence_tracker_procedure():
+    from tempfile import TemporaryDirectory
+
+    from helpers import CONSOLE
+
+    CONSOLE.print('[START PRESENCE TRACKER TEST PROCEDURE]')
+    with TemporaryDirectory() as directory:
+        path = join(directory, 'presence.bin')
+        tracker = PresenceTracker(PickleCacheableData(path), renotify_interval=None, ttl=3600)
+        tracker.begin_cycle()
+        assert tracker.observe('1.1.1.1:1', 'A', {'Player', 'Other'})['appeared'] == {'Player', 'Other'}
+        assert tracker.observe('2.2.2.2:2', 'B', set()) == {'appeared': set(), 'moved': set(), 'renotify': set()}
+        assert tracker.end_cycle() == {}
+
+        for _ in range(3):  # staying on a server is not a transition
+            tracker.begin_cycle()
+            assert not any(tracker.observe('1.1.1.1:1', 'A', {'Player', 'Other'}).values())
+            assert tracker.end_cycle() == {}
+
+        tracker = PresenceTracker(PickleCacheableData(path), renotify_interval=None, ttl=3600)     # restart
+        tracker.begin_cycle()
+        assert not any(tracker.observe('1.1.1.1:1', 'A', {'Player', 'Other'}).values())
+        assert tracker.end_cycle() == {}
+
+        tracker.begin_cycle()
+        assert tracker.observe('2.2.2.2:2', 'B', {'Player'})['moved'] == {'Player'}
+        tracker.observe('1.1.1.1:1', 'A', set())
+        assert tracker.end_cycle() == {'1.1.1.1:1': ('A', {'Other'})}   # Player moved, Other left
+
+        tracker.begin_cycle()   # B didn't respond so Player isn't considered gone
+        assert tracker.end_cycle() == {}
+        tracker.begin_cycle()
+        assert not any(tracker.observe('2.2.2.2:2', 'B', {'Player'}).values())
+        tracker.end_cycle()
+
+        tracker.renotify_interval = 0
+        tracker.begin_cycle()
+        assert tracker.observe('2.2.2.2:2', 'B', {'Player'})['renotify'] == {'Player'}
+        tracker.end_cycle()
+
+        tracker.ttl = 0     # B doesn't respond for too long
+        tracker.begin_cycle()
+        assert tracker.end_cycle() == {} and not list(tracker.presence_map.keys())
+    CONSOLE.print('All transitions are detected')
+    CONSOLE.print('[END PRESENCE TRACKER TEST PROCEDURE]')
+
+
+if __name__ == '__main__':
+    test_presence_tracker_procedure()
@@ -0,0 +1,244 @@
+"""
+This is a module with extractors of name, status and game from Steam account (profile) pages.
+
+A full BeautifulSoup tree of a heavy profile page is the CPU hot spot of name parsing
+while only three elements of it are needed. So there are cheaper ways to get them:
+    streaming — html.parser.HTMLParser subclass that keeps no tree and stops as soon as all three elements are found
+    strainer  — BeautifulSoup that only builds the tree of the needed elements (SoupStrainer)
+    soup      — full BeautifulSoup tree (the old way)
+All of them return the same results. Name parsers pick one by PROFILE_EXTRACTOR in config.
+
+Run this module to check that the extractors agree and to benchmark them on synthetic profile pages.
+"""
+
+from html.parser import HTMLParser
+from typing import Callable, Optional
+
+import bs4
+
+from helpers import CONFIG
+
+
+PROFILE_EXTRACTOR = CONFIG['NAME_PARSERS']['PROFILE_EXTRACTOR']
+
+NAME_CLASS = 'actual_persona_name'
+STATUS_CLASS = 'profile_in_game_header'
+INGAME_CLASS = 'profile_in_game_name'
+FIELDS_CLASSES = (NAME_CLASS, STATUS_CLASS, INGAME_CLASS)
+
+
+class ProfileParseError(AttributeError):
+    """
+    Raised when a page has no name on it (didn't load properly or isn't a profile page).
+    It's an AttributeError because that's what the soup extractor has always raised so name parsers catch it already.
+    """
+
+
+class ProfileFieldsFound(Exception):
+    """
+    Raised by the streaming extractor to stop parsing the rest of the page.
+    """
+
+
+def format_name_status_ingame(name: Optional[str], status: Optional[str], ingame: Optional[str]) -> tuple[str, str, str]:
+    """
+    Turns first texts of the found elements (None if an element wasn't found or is empty) into the parsing result.
+    """
+    if name is None:
+        raise ProfileParseError(f"'.{NAME_CLASS}' was not found on the page")
+    return name, 'Private' if status is None else status.strip(), '' if ingame is None else ingame.strip()
+
+
+class ProfileFieldsParser(HTMLParser):
+    """
+    Remembers the first text inside the first element of each of FIELDS_CLASSES (like .contents[0] of select_one does).
+    """
+    fields: dict[str, Optional[str]]    # class: text. None if the element has no children, empty if its first child is a tag
+    _found: set[str]                    # classes of the found elements
+    _current_class: Optional[str]       # class of the element whose first child is awaited
+
+    def __init__(self):
+        super().__init__()
+        self.fields = dict.fromkeys(FIELDS_CLASSES)
+        self._found = set()
+        self._current_class = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._current_class:     # first child is a tag
+            self._set_field('')
+        for attr, value in attrs:
+            if attr == 'class' and value:
+                for class_ in value.split():
+                    if class_ in self.fields and class_ not in self._found:
+                        self._current_class = class_
+                        return
+
+    def handle_endtag(self, tag):
+        if self._current_class:     # no children
+            self._set_field(None)
+
+    def handle_data(self, data):
+        if self._current_class:
+            self._set_field(data)
+
+    def _set_field(self, text: Optional[str]):
+        self.fields[self._current_class] = text    # type: ignore
+        self._found.add(self._current_class)       # type: ignore
+        self._current_class = None
+        if len(self._found) == len(self.fields):
+            raise ProfileFieldsFound
+
+
+def extract_streaming(content: bytes) -> tuple[str, str, str]:
+    parser = ProfileFieldsParser()
+    try:
+        parser.feed(content.decode('utf-8', errors='replace'))
+        parser.close()
+    except ProfileFieldsFound:
+        pass
+    return format_name_status_ingame(*(parser.fields[class_] for class_ in FIELDS_CLASSES))
+
+
+def parse_soup_name_status_ingame(parser: bs4.BeautifulSoup) -> tuple[str, str, str]:
+    """
+    Parses retrieved content from a Steam account link page.
+    """
+    name = str(parser.select_one('.' + NAME_CLASS).contents[0])  # it's always available if link opened
+    status = parser.select_one('.' + STATUS_CLASS)
+    if status and len(status.contents) > 0:
+        status = str(status.contents[0].strip())
+    else:
+        status = 'Private'
+    ingame = parser.select_one('.' + INGAME_CLASS)
+    if ingame and len(ingame.contents) > 0:
+        ingame = str(ingame.contents[0].strip())
+    else:
+        ingame = ''
+    return name, status, ingame
+
+
+def extract_strainer(content: bytes) -> tuple[str, str, str]:
+    return parse_soup_name_status_ingame(bs4.BeautifulSoup(content, 'html.parser', parse_only=bs4.SoupStrainer(class_=FIELDS_CLASSES)))
+
+
+def extract_soup(content: bytes) -> tuple[str, str, str]:
+    return parse_soup_name_status_ingame(bs4.BeautifulSoup(content, 'html.parser'))
+
+
+EXTRACTORS_MAP: dict[str, Callable[[bytes], tuple[str, str, str]]] = {
+    'streaming': extract_streaming,
+    'strainer': extract_strainer,
+    'soup': extract_soup,
+}
+
+
+def get_extractor(name: str = PROFILE_EXTRACTOR) -> Callable[[bytes], tuple[str, str, str]]:
+    if name not in EXTRACTORS_MAP:
+        raise ValueError(f'Profile extractor must be one of {list(EXTRACTORS_MAP)}.')
+    return EXTRACTORS_MAP[name]
+
+
+# TESTING/BENCHMARKING
+
+BENCHMARK_PAGES = 50
+FILLER_BLOCKS = 300     # makes pages about as heavy as real ones (~150 KiB)
+
+
+def make_profile_page(name: str, status: Optional[str], ingame: Optional[str], filler_blocks: int = FILLER_BLOCKS) -> bytes:
+    """
+    Makes a fixture of a Steam account page: the needed elements are in the middle of a lot of markup like on real pages.
+    None status or ingame means the page hasn't the element (private profiles).
+    """
+    head_block = ('<script type="text/javascript" src="https://community.akamai.steamstatic.com/public/javascript/x.js?v=1"></script>'
+                  '<link href="https://community.akamai.steamstatic.com/public/css/x.css?v=1" rel="stylesheet" type="text/css">\n')
+    menu_block = ('<div class="submenu_community"><a class="submenuitem" href="https://steamcommunity.com/">Home</a>'
+                  '<a class="submenuitem" href="https://steamcommunity.com/discussions/">Discussions &amp; more</a></div>\n')
+    comment_block = ('<div class="commentthread_comment responsive_body_text"><div class="commentthread_comment_avatar playerAvatar offline">'
+                     '<a href="https://steamcommunity.com/id/someone"><img src="https://avatars.akamai.steamstatic.com/x.jpg"></a></div>'
+                     '<div class="commentthread_comment_content"><div class="commentthread_comment_author">'
+                     '<a class="hoverunderline commentthread_author_link" href="https://steamcommunity.com/id/someone">'
+                     '<bdi>someone</bdi></a><span class="commentthread_comment_timestamp">Jan 1 @ 1:00am</span></div>'
+                     '<div class="commentthread_comment_text">+rep nice player &lt;3</div></div></div>\n')
+    fields = f'<div class="persona_name" style="font-size: 24px;"><span class="{NAME_CLASS}">{name}</span></div>\n'
+    if status is not None:
+        fields += f'<div class="profile_in_game persona in-game"><div class="{STATUS_CLASS}">{status}</div>\n'
+        if ingame is not None:
+            fields += f'<div class="{INGAME_CLASS}">{ingame}</div>\n'
+        fields += '</div>\n'
+    page = ('<!DOCTYPE html>\n<html class="responsive"><head><meta charset="utf-8"><title>Steam Community :: ' + name + '</title>\n'
+            + head_block * (filler_blocks//10) + '</head><body class="flat_page profile_page">\n'
+            + menu_block * (filler_blocks//3) + fields + comment_block * filler_blocks + '</body></html>')
+    return page.encode()
+
+
+def make_profile_pages(count: int = BENCHMARK_PAGES) -> list[tuple[bytes, tuple[str, str, str]]]:
+    """
+    Makes pages fixtures along with expected results.
+    """
+    from random import Random
+
+    from cache.synthetic_data import GAMES, SEED, make_name
+
+    rng = Random(SEED)
+    pages = []
+    for i in range(count):
+        name = make_name(rng)
+        kind = i % 4
+        if kind == 0:
+            page, expected = make_profile_page(name, 'Currently In-Game', (game := rng.choice(GAMES))), (name, 'Currently In-Game', game)
+        elif kind == 1:
+            page, expected = make_profile_page(name, 'Currently Online', ''), (name, 'Currently Online', '')
+        elif kind == 2:
+            page, expected = make_profile_page(name, '\n\t\tCurrently Offline\t', None), (name, 'Currently Offline', '')
+        else:
+            page, expected = make_profile_page(name, None, None), (name, 'Private', '')
+        pages.append((page, expected))
+    return pages
+
+
+def test_extractors_procedure():
+    from helpers import CONSOLE
+
+    CONSOLE.print('[START PROFILE EXTRACTORS TEST PROCEDURE]')
+    for page, expected in make_profile_pages(8):
+        for extractor_name, extractor in EXTRACTORS_MAP.items():
+            result = extractor(page)
+            assert result == expected, f'{extractor_name}: {result} != {expected}'
+    for extractor_name, extractor in EXTRACTORS_MAP.items():
+        try:
+            extractor(b'<html><body>Sorry! An error was encountered while processing your request.</body></html>')
+        except AttributeError:
+            pass
+        else:
+            raise AssertionError(f'{extractor_name} parsed an error page')
+    CONSOLE.print('All extractors agree')
+    CONSOLE.print('[END PROFILE EXTRACTORS TEST PROCEDURE]')
+
+
+def benchmark_extractors_procedure(count: int = BENCHMARK_PAGES):
+    from time import perf_counter
+
+    from rich.table import Table
+
+    from helpers import CONSOLE
+
+    CONSOLE.print('[START PROFILE EXTRACTORS BENCHMARK PROCEDURE]')
+    pages = [page for page, _ in make_profile_pages(count)]
+    table = Table(title=f'{count} profile pages ({sum(map(len, pages))/count/1024:.0f} KiB avg)')
+    for column in ('Extractor', 'Total, ms', 'Per page, ms', 'Speedup'):
+        table.add_column(column)
+    times = {}
+    for extractor_name, extractor in EXTRACTORS_MAP.items():
+        start_time = perf_counter()
+        for page in pages:
+            extractor(page)
+        times[extractor_name] = perf_counter() - start_time
+    for extractor_name, elapsed in times.items():
+        table.add_row(extractor_name, f'{elapsed*1000:.1f}', f'{elapsed/count*1000:.2f}', f'{times["soup"]/elapsed:.1f}x')
+    CONSOLE.print(table)
+    CONSOLE.print('[END PROFILE EXTRACTORS BENCHMARK PROCEDURE]')
+
+
+if __name__ == '__main__':
+    test_extractors_procedure()
+    benchmark_extractors_procedure()
@@ -0,0 +1,200 @@
+"""
+This is a module with a leveled log of what scanning does (servers requested, their failures, A2S_INFO replies, master server packets).
+
+Printing to a terminal is slow and used to be done right in the scanning loops, so verbose output throttled them.
+Now the loops only put records into a bounded queue of SCAN_LOG and go on: records below LOG_LEVEL are dropped
+before anything is formatted and records that don't fit in the queue are counted and dropped.
+A worker thread formats records and prints them in batches (one console write per LOG_FLUSH_INTERVAL at most).
+Levels are "debug" (every server and reply), "info" (failures), "warning", "error" and "quiet". The default is quiet enough
+to print only what needs attention.
+"""
+
+import queue
+from threading import Lock, Thread
+from time import asctime, localtime, monotonic, time
+from typing import Any, NamedTuple, Optional
+
+from rich.console import Console
+
+from helpers import CONFIG, CONSOLE
+
+
+LOG_LEVELS_MAP = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'quiet': 100}
+DEBUG, INFO, WARNING, ERROR = (LOG_LEVELS_MAP[level] for level in ('debug', 'info', 'warning', 'error'))
+LOG_QUEUE_SIZE = 65536      # records waiting to be printed at most
+LOG_FLUSH_INTERVAL = 0.1    # in secs. Records that come within it are printed at once
+
+
+def get_log_level(level_name: str) -> int:
+    """
+    Gets a level by its name. Raises ValueError if there's no such level.
+    """
+    if level_name not in LOG_LEVELS_MAP:
+        raise ValueError(f'Log level must be one of {tuple(LOG_LEVELS_MAP)}.')
+    return LOG_LEVELS_MAP[level_name]
+
+
+LOG_LEVEL = get_log_level(CONFIG['MAIN']['LOG_LEVEL'])
+
+
+class LogRecord(NamedTuple):
+    created: float                  # secs since epoch
+    objects: tuple[Any, ...]        # formatted only by the worker
+    style: Optional[str]
+
+
+class ScanLog:
+    """
+    Prints records of enabled levels in a worker thread. Logging never blocks: records are dropped when the queue is full.
+    """
+    level: int
+    console: Console
+    flush_interval: float       # in secs
+    queue: queue.Queue
+    dropped_count: int          # Records dropped because the queue was full
+    _worker: Optional[Thread]   # Started on the first record
+    _lock: Lock                 # for starting the worker once
+
+    def __init__(self, level=LOG_LEVEL, console=CONSOLE, queue_size=LOG_QUEUE_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        self.level = level
+        self.console = console
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(queue_size)
+        self.dropped_count = 0
+        self._worker = None
+        self._lock = Lock()
+
+    def is_enabled(self, level: int) -> bool:
+        """
+        Use it to skip building costly objects for disabled levels.
+        """
+        return level >= self.level
+
+    def log(self, level: int, *objects: Any, style: Optional[str] = None):
+        if level < self.level:
+            return
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = Thread(target=self.run, name='scan log', daemon=True)
+                    self._worker.start()
+        try:
+            self.queue.put_nowait(LogRecord(time(), objects, style))
+        except queue.Full:
+            self.dropped_count += 1
+
+    def debug(self, *objects: Any, style: Optional[str] = None):
+        self.log(DEBUG, *objects, style=style)
+
+    def info(self, *objects: Any, style: Optional[str] = None):
+        self.log(INFO, *objects, style=style)
+
+    def warning(self, *objects: Any, style: Optional[str] = None):
+        self.log(WARNING, *objects, style=style)
+
+    def error(self, *objects: Any, style: Optional[str] = None):
+        self.log(ERROR, *objects, style=style)
+
+    def print_records(self, records: list[LogRecord]):
+        with self.console:  # the console buffers everything printed inside and writes it once
+            for record in records:
+                # markup=False since server and player names might have brackets
+                self.console.print(asctime(localtime(record.created)), *record.objects, style=record.style, markup=False)
+
+    def run(self):
+        closing = False
+        while not closing:
+            record = self.queue.get()
+            if record is None:
+                return
+            records = [record]
+            deadline = monotonic() + self.flush_interval
+            while (timeout := deadline - monotonic()) > 0:
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    closing = True
+                    break
+                records.append(record)
+            try:
+                self.print_records(records)
+            except Exception as e:  # a record that can't be printed shouldn't kill the worker
+                CONSOLE.print(f'[SCAN LOG] {len(records)} records failed to print: {e!r}', style='bold red', markup=False)
+
+    def close(self, timeout: float = 10):
+        """
+        Prints waiting records and stops the worker. Records that come after it are queued but not printed.
+        """
+        if self._worker is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._worker.join(timeout)
+
+
+SCAN_LOG = ScanLog()
+
+
+# TESTING/BENCHMARKING
+
+
+def test_scan_log_procedure():
+    from io import StringIO
+
+    print('[START SCAN LOG TEST PROCEDURE]')
+    console = Console(file=StringIO(), width=200)
+    scan_log = ScanLog(INFO, console, flush_interval=0.05)
+    scan_log.debug('skipped')
+    assert scan_log._worker is None and scan_log.queue.empty()
+    for i in range(100):
+        scan_log.info(f'[/bad] server {i}', '1.1.1.1:1', style='red')
+    scan_log.error('last')
+    scan_log.close()
+    lines = console.file.getvalue().splitlines()
+    assert len(lines) == 101 and lines[0].endswith('[/bad] server 0 1.1.1.1:1') and lines[-1].endswith('last'), lines[:3]
+    assert not scan_log._worker.is_alive()
+
+    scan_log = ScanLog(DEBUG, console, queue_size=1)
+    scan_log._worker = Thread()     # never started so nothing is taken from the queue
+    scan_log.debug('queued')
+    scan_log.debug('dropped')
+    assert scan_log.dropped_count == 1
+    try:
+        get_log_level('verbose')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Unknown level was accepted')
+    print('Records of enabled levels are printed in order, others are skipped')
+    print('[END SCAN LOG TEST PROCEDURE]')
+
+
+def benchmark_scan_log_procedure(records_amount=20000):
+    """
+    Time the calling thread spends on logging a line per server: printing right away vs queueing for the worker.
+    """
+    from os import devnull
+    from time import perf_counter
+    with open(devnull, 'w') as f:
+        console = Console(file=f, force_terminal=True, width=120)
+        start_time = perf_counter()
+        for i in range(records_amount):
+            console.print(f'{asctime()} server {i}', markup=False)
+        sync_time = perf_counter() - start_time
+        for level_name in ('debug', 'warning'):
+            scan_log = ScanLog(LOG_LEVELS_MAP[level_name], console, queue_size=records_amount)
+            start_time = perf_counter()
+            for i in range(records_amount):
+                scan_log.debug('server', i)
+            queued_time = perf_counter() - start_time
+            scan_log.close(60)
+            print(f'{records_amount} records: printed right away {sync_time:.3f} s, '
+                  f'logged at {level_name} level {queued_time:.3f} s ({scan_log.dropped_count} dropped)')
+
+if __name__ == '__main__':
+    test_scan_log_procedure()
+    benchmark_scan_log_procedure()
@@ -0,0 +1,402 @@
+"""
+This is a module with records of what server parsers found in a cycle: a ServerScan per server with matched players on it
+and a PlayerRecord per matched player. Numbers are kept as numbers and are formatted only when records are printed.
+Records use __slots__ since there's one per matched player per cycle.
+
+All players of a cycle (not only matched ones) are also kept in a columnar ScanBatch: arrays of server ids, player name ids,
+scores and durations. Statistics of it are computed with numpy if it's installed (pure python otherwise, much slower).
+Batches are exported to .npz files (written without numpy) for offline analysis: numpy.load(path) reads them.
+"""
+
+import ast
+import struct
+import sys
+import zipfile
+from array import array
+from itertools import repeat
+from typing import Any, Iterable, Optional
+
+try:
+    import numpy as np
+except ImportError:     # statistics are computed in pure python then
+    np = None
+
+
+PERCENTS = (50, 90, 99)     # percentiles of KPM and playtime in statistics
+NPY_MAGIC = b'\x93NUMPY\x01\x00'   # .npy format version 1.0
+BYTE_ORDER = '<' if sys.byteorder == 'little' else '>'
+
+
+def format_playtime(duration: float) -> str:
+    hours = int(duration // 3600)
+    minutes = int(duration // 60 % 60)
+    seconds = int(duration % 60)
+    return f'{hours:2} H, {minutes:2} M, {seconds:2} S'
+
+
+class PlayerRecord:
+    """
+    A player on a server whose name matched a tracked name.
+    """
+    __slots__ = ('player_name', 'name', 'score', 'duration')
+    player_name: str        # Name the player has on the server
+    name: Optional[str]     # Tracked name (or pattern) the player name matched
+    score: int
+    duration: float         # Playtime in seconds. Never 0 (see AbstractServerParser.get_player_duration)
+
+    def __init__(self, player_name: str, name: Optional[str], score: int, duration: float):
+        self.player_name = player_name
+        self.name = name
+        self.score = score
+        self.duration = duration
+
+    @property
+    def playtime(self) -> str:
+        return format_playtime(self.duration)
+
+    @property
+    def kpm(self) -> float:
+        return self.score*60/self.duration     # if playtime contributed to only one round
+
+    def as_dict(self) -> dict[str, Any]:
+        return {'player_name': self.player_name, 'name': self.name, 'score': self.score, 'duration': self.duration}
+
+    def __eq__(self, other):
+        if not isinstance(other, PlayerRecord):
+            return NotImplemented
+        return (self.player_name, self.name, self.score, self.duration) == (other.player_name, other.name, other.score, other.duration)
+
+    def __str__(self):
+        return f'{self.player_name}, {self.score}, {self.playtime.strip()}'
+
+    def __repr__(self):
+        return f'PlayerRecord({self.player_name!r}, {self.name!r}, {self.score!r}, {self.duration!r})'
+
+
+class ServerScan:
+    """
+    Matched players found on a server in one cycle. Players are appended in place.
+    """
+    __slots__ = ('server_name', 'address', 'scan_time', 'players')
+    server_name: str
+    address: str                # ip:port
+    scan_time: float            # Time of the response in secs since epoch
+    players: list[PlayerRecord]
+
+    def __init__(self, server_name: str, address: str, scan_time: float, players: Optional[list[PlayerRecord]] = None):
+        self.server_name = server_name
+        self.address = address
+        self.scan_time = scan_time
+        self.players = players if players is not None else []
+
+    def add(self, player_record: PlayerRecord):
+        self.players.append(player_record)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {'server_name': self.server_name, 'address': self.address, 'scan_time': self.scan_time,
+                'players': [player_record.as_dict() for player_record in self.players]}
+
+    def __len__(self):
+        return len(self.players)
+
+    def __iter__(self):
+        return iter(self.players)
+
+    def __str__(self):
+        return str([self.address] + [str(player_record) for player_record in self.players])   # same as the lists they replaced
+
+    def __repr__(self):
+        return f'ServerScan({self.server_name!r}, {self.address!r}, {self.scan_time!r}, {self.players!r})'
+
+
+def get_descr(values: array) -> str:
+    """
+    Gets numpy dtype string of an array, ex. '<f4' for array('f').
+    """
+    kind = 'f' if values.typecode in 'fd' else 'u' if values.typecode.isupper() else 'i'
+    return f'{BYTE_ORDER}{kind}{values.itemsize}'
+
+
+TYPECODES_MAP = {}  # numpy dtype strings to array typecodes
+for typecode in 'bBhHiIlLqQfd':
+    TYPECODES_MAP.setdefault(get_descr(array(typecode)), typecode)
+
+
+def get_percentiles(sorted_values: list[float], percents: Iterable[float] = PERCENTS) -> dict[float, float]:
+    """
+    Gets percentiles of sorted values with linear interpolation (same as numpy.percentile). Zeros if there are no values.
+    """
+    percentiles = {}
+    for percent in percents:
+        if not sorted_values:
+            percentiles[percent] = 0.
+            continue
+        position = (len(sorted_values) - 1) * percent / 100
+        lower = int(position)
+        upper = min(lower + 1, len(sorted_values) - 1)
+        percentiles[percent] = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+    return percentiles
+
+
+def get_npy_header(descr: str, length: int) -> bytes:
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({length},), }}"
+    header += ' ' * (-(len(NPY_MAGIC) + 2 + len(header) + 1) % 64) + '\n'    # data is aligned to 64 bytes
+    return NPY_MAGIC + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+def encode_strings(strings: list[str]) -> tuple[str, bytes]:
+    """
+    Encodes strings as a numpy unicode array: descr and UTF-32 data of strings padded with nulls to the longest one.
+    """
+    length = max(map(len, strings), default=0) or 1
+    encoding = 'utf-32-le' if BYTE_ORDER == '<' else 'utf-32-be'
+    return f'{BYTE_ORDER}U{length}', b''.join(string.ljust(length, '\0').encode(encoding, 'surrogatepass') for string in strings)
+
+
+def write_npz(path: str, columns: dict[str, array | list[str]]):
+    """
+    Writes arrays and lists of strings to a compressed .npz file (like numpy.savez_compressed).
+    """
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as npz_file:   # fast, sizes are about the same
+        for key, values in columns.items():
+            if isinstance(values, array):
+                descr, data = get_descr(values), memoryview(values).cast('B')
+            else:
+                descr, data = encode_strings(values)
+            with npz_file.open(f'{key}.npy', 'w', force_zip64=True) as npy_file:
+                npy_file.write(get_npy_header(descr, len(values)))
+                npy_file.write(data)
+
+
+def read_npz(path: str) -> dict[str, array | list[str]]:
+    """
+    Reads a .npz file written with write_npz without numpy. Arrays are read as arrays, unicode arrays as lists of strings.
+    """
+    columns: dict[str, array | list[str]] = {}
+    with zipfile.ZipFile(path) as npz_file:
+        for file_name in npz_file.namelist():
+            data = npz_file.read(file_name)
+            header_length, = struct.unpack('<H', data[len(NPY_MAGIC):len(NPY_MAGIC) + 2])
+            data_start = len(NPY_MAGIC) + 2 + header_length
+            descr = ast.literal_eval(data[len(NPY_MAGIC) + 2:data_start].decode('latin1'))['descr']
+            if descr[1] == 'U':
+                length = int(descr[2:])
+                encoding = 'utf-32-le' if descr[0] == '<' else 'utf-32-be'
+                text = data[data_start:].decode(encoding, 'surrogatepass')
+                columns[file_name[:-4]] = [text[i:i+length].rstrip('\0') for i in range(0, len(text), length)]
+            else:
+                values = array(TYPECODES_MAP[BYTE_ORDER + descr[1:]])
+                values.frombytes(data[data_start:])
+                if descr[0] != BYTE_ORDER:
+                    values.byteswap()
+                columns[file_name[:-4]] = values
+    return columns
+
+
+class ScanBatch:
+    """
+    All players of servers that responded in a cycle in columns. Row i is a player: server_ids[i] indexes server columns
+    (server_names, addresses, scan_times), name_ids[i] indexes player_names. Player names are interned per batch.
+    """
+    __slots__ = ('start_time', 'server_names', 'addresses', 'scan_times', 'player_names', '_name_ids_map',
+                 'server_ids', 'name_ids', 'scores', 'durations')
+    start_time: float           # Time the cycle started in secs since epoch
+    server_names: list[str]
+    addresses: list[str]
+    scan_times: array           # Times of responses in secs since epoch
+    player_names: list[str]
+    _name_ids_map: dict[str, int]
+    server_ids: array
+    name_ids: array
+    scores: array
+    durations: array            # Playtimes in secs. Never 0 (see AbstractServerParser.get_player_duration)
+
+    def __init__(self, start_time: float):
+        self.start_time = start_time
+        self.server_names = []
+        self.addresses = []
+        self.scan_times = array('d')
+        self.player_names = []
+        self._name_ids_map = {}
+        self.server_ids = array('I')
+        self.name_ids = array('I')
+        self.scores = array('i')
+        self.durations = array('f')     # a2s durations are 32 bit floats
+
+    def add_server(self, server_name: str, address: str, scan_time: float, player_names: list[str], scores: Iterable[int],
+                   durations: Iterable[float]):
+        """
+        Adds a server that responded and columns of its players.
+        """
+        server_id = len(self.server_names)
+        self.server_names.append(server_name)
+        self.addresses.append(address)
+        self.scan_times.append(scan_time)
+        for player_name in player_names:
+            name_id = self._name_ids_map.get(player_name)
+            if name_id is None:
+                name_id = self._name_ids_map[player_name] = len(self.player_names)
+                self.player_names.append(player_name)
+            self.name_ids.append(name_id)
+        self.server_ids.extend(repeat(server_id, len(player_names)))
+        self.scores.extend(scores)
+        self.durations.extend(durations)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def get_servers_stats(self) -> dict[str, Any]:
+        """
+        Gets population, mean KPM and mean playtime (in secs) of every server. Values are in lists (numpy arrays with numpy)
+        indexed by server ids.
+        """
+        if np is not None:
+            server_ids = np.frombuffer(self.server_ids, get_descr(self.server_ids))
+            durations = np.frombuffer(self.durations, get_descr(self.durations)).astype(np.float64)
+            kpms = np.frombuffer(self.scores, get_descr(self.scores)) * 60 / durations
+            population = np.bincount(server_ids, minlength=len(self.server_names))
+            with np.errstate(invalid='ignore'):     # servers without players have nan means
+                return {'population': population,
+                        'kpm_mean': np.bincount(server_ids, kpms, len(self.server_names)) / population,
+                        'playtime_mean': np.bincount(server_ids, durations, len(self.server_names)) / population}
+        population = [0] * len(self.server_names)
+        kpms_sums = [0.] * len(self.server_names)
+        durations_sums = [0.] * len(self.server_names)
+        for server_id, score, duration in zip(self.server_ids, self.scores, self.durations):
+            population[server_id] += 1
+            kpms_sums[server_id] += score*60/duration
+            durations_sums[server_id] += duration
+        return {'population': population,
+                'kpm_mean': [kpm_sum / count if count else float('nan') for kpm_sum, count in zip(kpms_sums, population)],
+                'playtime_mean': [duration_sum / count if count else float('nan') for duration_sum, count in zip(durations_sums, population)]}
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        Gets amounts of servers, players and distinct names, mean and max population and percentiles of KPM and playtime (in secs).
+        """
+        stats: dict[str, Any] = {'servers': len(self.server_names), 'players': len(self), 'names': len(self.player_names),
+                                 'population_mean': len(self) / len(self.server_names) if self.server_names else 0.}
+        if np is not None:
+            durations = np.frombuffer(self.durations, get_descr(self.durations)).astype(np.float64)
+            kpms = np.frombuffer(self.scores, get_descr(self.scores)) * 60 / durations
+            population = np.bincount(np.frombuffer(self.server_ids, get_descr(self.server_ids)), minlength=len(self.server_names))
+            stats['population_max'] = int(population.max()) if len(population) else 0
+            stats['kpm'] = dict(zip(PERCENTS, np.percentile(kpms, PERCENTS).tolist() if len(kpms) else [0.] * len(PERCENTS)))
+            stats['playtime'] = dict(zip(PERCENTS, np.percentile(durations, PERCENTS).tolist() if len(durations) else [0.] * len(PERCENTS)))
+            return stats
+        stats['population_max'] = max(self.get_servers_stats()['population'], default=0)
+        stats['kpm'] = get_percentiles(sorted(score*60/duration for score, duration in zip(self.scores, self.durations)))
+        stats['playtime'] = get_percentiles(sorted(self.durations))
+        return stats
+
+    def export(self, path: str):
+        """
+        Writes the batch to a compressed .npz file. Read it with numpy.load(path) or read_npz(path).
+        """
+        write_npz(path, {'start_time': array('d', [self.start_time]), 'server_names': self.server_names, 'addresses': self.addresses,
+                         'scan_times': self.scan_times, 'player_names': self.player_names, 'server_ids': self.server_ids,
+                         'name_ids': self.name_ids, 'scores': self.scores, 'durations': self.durations})
+
+
+# TESTING/BENCHMARKING
+
+
+def benchmark_records_procedure(records_amount=100000, players_per_server=64):
+    """
+    Time of building results of a cycle with records appended in place and with copied lists of formatted strings they replaced.
+    Also memory of both. Player names, scores and durations are already in memory (they come with responses).
+    """
+    import tracemalloc
+    from timeit import timeit
+    player_names = [f'player {i}' for i in range(records_amount)]
+    durations = [i * 1.5 + 1 for i in range(records_amount)]
+
+    def build_records():
+        results = {}
+        for i in range(records_amount):
+            server_name = f'server {i // players_per_server}'
+            server_scan = results.get(server_name)
+            if server_scan is None:
+                server_scan = results[server_name] = ServerScan(server_name, '127.0.0.1:27015', 0.)
+            server_scan.add(PlayerRecord(player_names[i], player_names[i], i % 50, durations[i]))
+        return results
+
+    def build_strings():
+        results = {}
+        for i in range(records_amount):
+            server_name = f'server {i // players_per_server}'
+            results[server_name] = results.get(server_name, ['127.0.0.1:27015']) + [
+                f'{player_names[i]}, {i % 50}, {format_playtime(durations[i]).strip()}']
+        return results
+
+    for build in (build_records, build_strings):
+        tracemalloc.start()
+        results = build()
+        size = tracemalloc.get_traced_memory()[0]
+        del results
+        tracemalloc.stop()
+        print(f'{build.__name__}: {timeit(build, number=3) / 3:.3f} s, {size / 2**20:.1f} MiB for {records_amount} players')
+
+
+def test_scan_batch_procedure():
+    import tempfile
+    from os.path import join
+    print('[START SCAN BATCH TEST PROCEDURE]')
+    scan_batch = ScanBatch(1000.)
+    scan_batch.add_server('server', '127.0.0.1:27015', 1001., ['a', 'b', 'b'], [10, 0, 5], [60., 120., 300.])
+    scan_batch.add_server('empty', '127.0.0.1:27016', 1002., [], [], [])
+    scan_batch.add_server('сервер', '127.0.0.1:27017', 1003., ['a'], [-1], [30.])
+    assert list(scan_batch.name_ids) == [0, 1, 1, 0] and scan_batch.player_names == ['a', 'b']
+    stats = scan_batch.get_stats()
+    assert (stats['servers'], stats['players'], stats['names'], stats['population_max']) == (3, 4, 2, 3), stats
+    assert stats['kpm'][50] == 0.5 and stats['playtime'][50] == 90., stats
+    servers_stats = scan_batch.get_servers_stats()
+    assert list(servers_stats['population']) == [3, 0, 1] and servers_stats['kpm_mean'][0] == 11/3, servers_stats
+    assert get_percentiles([1., 2., 3., 4.], (0, 50, 90, 100)) == {0: 1., 50: 2.5, 90: 3.7, 100: 4.}
+    with tempfile.TemporaryDirectory() as directory:
+        scan_batch.export(join(directory, 'batch.npz'))
+        columns = read_npz(join(directory, 'batch.npz'))
+        assert columns['server_names'] == ['server', 'empty', 'сервер'] and columns['player_names'] == ['a', 'b']
+        assert columns['scores'] == scan_batch.scores and columns['durations'] == scan_batch.durations
+        assert columns['server_ids'] == scan_batch.server_ids and columns['start_time'][0] == 1000.
+        if np is not None:
+            assert np.load(join(directory, 'batch.npz'))['server_names'].tolist() == ['server', 'empty', 'сервер']
+    print('Statistics are right, exported batch is read back the same')
+    print('[END SCAN BATCH TEST PROCEDURE]')
+
+
+def benchmark_scan_batch_procedure(servers_amount=20000, players_per_server=50):
+    """
+    Time of building a batch of a cycle, computing its statistics and exporting it. And size of the export.
+    """
+    import tempfile
+    from os.path import getsize, join
+    from random import random, randrange
+    from time import perf_counter
+    players = [([f'player {randrange(servers_amount * 10)}' for _ in range(players_per_server)],
+                [randrange(-5, 100) for _ in range(players_per_server)], [random() * 7200 + 1 for _ in range(players_per_server)])
+               for _ in range(servers_amount)]
+    start_time = perf_counter()
+    scan_batch = ScanBatch(0.)
+    for i, (player_names, scores, durations) in enumerate(players):
+        scan_batch.add_server(f'server {i}', f'10.0.{i // 256}.{i % 256}:27015', 0., player_names, scores, durations)
+    build_time = perf_counter()
+    scan_batch.get_stats()
+    scan_batch.get_servers_stats()
+    stats_time = perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        scan_batch.export(join(directory, 'batch.npz'))
+        export_time = perf_counter()
+        size = getsize(join(directory, 'batch.npz'))
+    print(f'{len(scan_batch)} players (numpy: {np is not None}): building {build_time - start_time:.2f} s, '
+          f'statistics {stats_time - build_time:.2f} s, export {export_time - stats_time:.2f} s ({size / 2**20:.1f} MiB)')
+
+
+if __name__ == '__main__':
+    server_scan = ServerScan('server', '127.0.0.1:27015', 0.)
+    server_scan.add(PlayerRecord('[TAG] name', 'name', 12, 600.))
+    assert str(server_scan) == "['127.0.0.1:27015', '[TAG] name, 12, 0 H, 10 M,  0 S']", str(server_scan)
+    assert server_scan.players[0].kpm == 1.2 and len(server_scan) == 1
+    benchmark_records_procedure()
+    test_scan_batch_procedure()
+    benchmark_scan_batch_procedure()
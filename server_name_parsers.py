@@ -11,20 +11,31 @@ import asyncio
 import concurrent.futures
 from time import perf_counter
 from cache.cacheable_data import PickleCacheableData
+from cache.write_behind_cacheable_data import WriteBehindCacheableData
+from cache.sharing import SHARED, SHARED_FRESHNESS, HOT_COPY
 from cache.cache_managers import ServerNameParserCacheManager
 from helpers import CONFIG, CONSOLE, SERVER_IPS_PATH, ip_to_addr, create_file_if_file_does_not_exist, validate_address
 from master_server_querier import MasterServerQuery
+from scan_log import SCAN_LOG
 
 
 # max consecutive fails for one server. If zero only sync would work and will also behave like it's equal to one.
 MAX_FAILS_CON = CONFIG['SERVER_NAME_PARSERS']['MAX_FAILS_CON']
 INFO_TIMEOUT_TIME = CONFIG['SERVER_NAME_PARSERS']['INFO_TIMEOUT_TIME']   # a2s.ainfo timeout time
+SERVER_NAMES_CAPACITY = CONFIG['CACHE']['SERVER_NAMES_CAPACITY']     # max amount of cached server names
+SERVER_NAMES_TTL = CONFIG['CACHE']['SERVER_NAMES_TTL']               # in secs
+SERVER_NAMES_EVICTION = CONFIG['CACHE']['SERVER_NAMES_EVICTION']     # 'lru' or 'age'
 
 TEXT_SERVERS_NAMES_PATH = SERVER_IPS_PATH[:-4:] + '_cache_prod.txt'
 PICKLE_SERVER_NAMES_PATH = SERVER_IPS_PATH[:-4:] + '_cache_prod.bin'
 HJSON_SERVER_NAMES_PATH = SERVER_IPS_PATH[:-4:] + '_cache_prod.hjson'
 
 
+def get_default_servers_info_map() -> PickleCacheableData:
+    return PickleCacheableData(PICKLE_SERVER_NAMES_PATH, capacity=SERVER_NAMES_CAPACITY, ttl=SERVER_NAMES_TTL, eviction=SERVER_NAMES_EVICTION,
+                               shared=SHARED, hot_copy=HOT_COPY)
+
+
 class ServerNameParser(Protocol):
     max_fails_con: int
     timeout_time: float
@@ -43,16 +54,25 @@ class ServerNameParser(Protocol):
     def reset(self) -> None:
         ...
 
+    def flush_cache(self) -> None:
+        ...
+
+    def get_evicted_count(self) -> int:
+        ...
+
 
 class AbstractServerNameParser(ABC, ServerNameParserCacheManager):
     max_fails_con: int
     timeout_time: float
+    shared_freshness: float     # Server names other instances got less than this secs ago aren't requested again
     _ip_ports: list[str]
     _extras: list[Any]
 
-    def __init__(self, max_fails_con=MAX_FAILS_CON, timeout_time=INFO_TIMEOUT_TIME, servers_info_map=PickleCacheableData(PICKLE_SERVER_NAMES_PATH)):
+    def __init__(self, max_fails_con=MAX_FAILS_CON, timeout_time=INFO_TIMEOUT_TIME, servers_info_map=get_default_servers_info_map(),
+                 shared_freshness=SHARED_FRESHNESS):
         self.max_fails_con = max_fails_con
         self.timeout_time = timeout_time
+        self.shared_freshness = shared_freshness
         self._ip_ports = []
         self._extras = []
         super().__init__(servers_info_map)
@@ -74,6 +94,14 @@ class AbstractServerNameParser(ABC, ServerNameParserCacheManager):
             self._ip_ports.append(ip_port)
             self._extras.append('[IMPORTED FROM SET]')
 
+    def get_own_servers_info(self) -> dict[str, tuple[str, int]]:
+        """
+        Gets servers info to parse. Shared cache is narrowed down to the servers of this instance.
+        """
+        if not self.servers_info_map.is_shared:
+            return self.servers_info_map    # type: ignore # it's a mapping anyway
+        return self.get_servers_info_for({ip_to_addr(ip_port) for ip_port in self._ip_ports if validate_address(ip_port)})
+
     @abstractmethod
     def get_servers_dict(self) -> dict[str, tuple[str, int]]:
         ...
@@ -99,6 +127,8 @@ class SyncServerNameParser(AbstractServerNameParser):
     def get_servers_dict(self):
         self.load_ips_with_extras_from_file()
         self.load_ips_from_set(MasterServerQuery().request_for_ip_ports())
+        self.refresh_cache()
+        fresh_addrs = self.get_fresh_shared_addrs(self.shared_freshness)
         fails_con = 0   # current amount of consecutive timeouts
         start_i = 0
         while True:
@@ -110,17 +140,19 @@ class SyncServerNameParser(AbstractServerNameParser):
                     fails_con = self.max_fails_con
                     break
                 addr = ip_to_addr(ip_port)
+                if addr in fresh_addrs:     # another instance has just got its name
+                    continue
                 try:
                     info = a2s.info(addr, timeout=self.timeout_time)
                     server_name = str(info.server_name)
                     fails_con = 0
-                    CONSOLE.print(f"[SYNC] {server_name} {ip_port}\n{info}\n")
+                    SCAN_LOG.debug('[SYNC]', server_name, ip_port, info)
                     self.servers_info_map[server_name] = addr
                 except (TimeoutError, ConnectionResetError, OSError) as e:
                     fails_con += 1
-                    CONSOLE.print(f'[SYNC FAIL] {ip_port} {extra} [{e}] {fails_con} of {self.max_fails_con}\n')
+                    SCAN_LOG.info(f'[SYNC FAIL] {ip_port} {extra} [{e}] {fails_con} of {self.max_fails_con}')
                     if addr in self.servers_info_map.values():
-                        CONSOLE.print(f'[GRABBED FROM CACHE] {addr}')
+                        SCAN_LOG.debug('[GRABBED FROM CACHE]', addr)
                         break
                     start_i = i
                     break
@@ -133,7 +165,7 @@ class SyncServerNameParser(AbstractServerNameParser):
                 fails_con = 0
                 continue
         self.save_cache()
-        return self.servers_info_map
+        return self.get_own_servers_info()
 
     def reset(self):
         self._ip_ports = []
@@ -142,8 +174,11 @@ class SyncServerNameParser(AbstractServerNameParser):
 
 
 class AsyncServerNameParser(AbstractServerNameParser):
-    def __init__(self, max_fails_con=MAX_FAILS_CON, timeout_time=INFO_TIMEOUT_TIME, servers_info_map=PickleCacheableData(PICKLE_SERVER_NAMES_PATH)):
-        super().__init__(max_fails_con=max_fails_con, timeout_time=timeout_time, servers_info_map=servers_info_map)
+    def __init__(self, max_fails_con=MAX_FAILS_CON, timeout_time=INFO_TIMEOUT_TIME,
+                 servers_info_map=WriteBehindCacheableData(get_default_servers_info_map()),    # saving off the event loop
+                 shared_freshness=SHARED_FRESHNESS):
+        super().__init__(max_fails_con=max_fails_con, timeout_time=timeout_time, servers_info_map=servers_info_map,
+                         shared_freshness=shared_freshness)
         self._tasks = []
 
     async def load_tasks_from_ips_extras(self):
@@ -152,7 +187,10 @@ class AsyncServerNameParser(AbstractServerNameParser):
         It's best performing when you create tasks as soon as possible.
         """
         # ips, extras, tasks = [], [], []
+        fresh_addrs = self.get_fresh_shared_addrs(self.shared_freshness)
         for ip_port, extra in zip(self._ip_ports, self._extras):                                                        # type: ignore
+            if validate_address(ip_port) and ip_to_addr(ip_port) in fresh_addrs:
+                continue    # another instance has just got its name
             self._tasks.append(asyncio.create_task(self.get_server_name_task(ip_port, extra)))
 
     async def get_server_name_task(self, ip_port, extra):
@@ -164,18 +202,19 @@ class AsyncServerNameParser(AbstractServerNameParser):
             try:
                 info = await a2s.ainfo(addr, timeout=self.timeout_time)
                 server_name = str(info.server_name)                                                                                                  # type: ignore
-                CONSOLE.print(f"[ASYNC] {server_name} {ip_port}\n{info}\n")
+                SCAN_LOG.debug('[ASYNC]', server_name, ip_port, info)
                 break
             except (asyncio.exceptions.TimeoutError, ConnectionResetError, OSError) as e:
-                CONSOLE.print(f"[ASYNC FAIL]\t{ip_port}\t{extra} [{e}] {fails_con} of {self.max_fails_con}\n")
+                SCAN_LOG.info(f"[ASYNC FAIL]\t{ip_port}\t{extra} [{e}] {fails_con} of {self.max_fails_con}")
                 if addr in self.servers_info_map.values():
-                    CONSOLE.print(f'[GRABBED FROM CACHE]\t{addr}\n')
+                    SCAN_LOG.debug('[GRABBED FROM CACHE]', addr)
                     break   # if there was a server name in cache doesn't bother try more. Remove break to try anyway.
         return server_name, addr
 
     async def run(self):
         self.load_ips_with_extras_from_file()
         self.load_ips_from_set(MasterServerQuery().request_for_ip_ports())
+        self.refresh_cache()
         await self.load_tasks_from_ips_extras()
         # await self.load_tasks_from_set(MasterServerQuery().request_for_ips())
         results = await asyncio.gather(*self._tasks)     # [(server_name, adr), ...]
@@ -186,7 +225,7 @@ class AsyncServerNameParser(AbstractServerNameParser):
                 self.servers_info_map[server_name] = addr
         self.remove_duplicates()
         self.save_cache()
-        return self.servers_info_map
+        return self.get_own_servers_info()
 
     def reset(self):
         # self._extras = []
@@ -16,14 +16,22 @@ import asyncio
 from math import isnan
 import a2s
 
-from time import sleep, asctime
+from time import sleep, time
 
 from rich.traceback import install
 from rich.table import Table
 from rich.markup import MarkupError
 
-from helpers import CONFIG, CONSOLE, addr_to_ip, remove_diacritics
+from helpers import CONFIG, CONSOLE, addr_to_ip, ip_to_addr, remove_diacritics
+from exclusions import ExclusionIndex
+from name_matching import NameMatcher
+from name_parsers import NamesChanges
 from notifications import notify_onserver
+from output import OUTPUT_MODE
+from presence import NOTIFY_LEAVES, PresenceTracker
+from scan_log import SCAN_LOG
+from scan_results import PlayerRecord, ScanBatch, ServerScan, format_playtime
+from snapshots import PlayersDelta, SnapshotStore
 
 install()
 
@@ -35,50 +43,92 @@ TIMEOUT_TIME = CONFIG['SERVER_PARSERS']['TIMEOUT_TIME']     # in seconds
 # and the sleeping coro can unblock and send red retry request with low enough MAX_REQUESTS_PER_SECOND value (50 ex.)
 MAX_REQUESTS_PER_SECOND = CONFIG['SERVER_PARSERS']['MAX_REQUESTS_PER_SECOND']
 ASYNC_REQUEST_COOLDOWN = 1/MAX_REQUESTS_PER_SECOND    # in seconds
+RENDER_TABLES = OUTPUT_MODE == 'log'    # tables of changes aren't even built in other output modes
 
 
-def get_players_table_scaffold(title):
-    players_table = Table(title=title)
-    players_table.add_column('Name', style='green')
-    players_table.add_column('Score', style='cyan1')
-    players_table.add_column('Playtime', style='red')
-    players_table.add_column('KPM (if playtime contributed to only one round)', style='magenta')
-    return players_table
+def get_changes_table_scaffold(title):
+    changes_table = Table(title=title)
+    changes_table.add_column('', style='bold')     # + joined, - left
+    changes_table.add_column('Name', style='green')
+    changes_table.add_column('Score', style='cyan1')
+    changes_table.add_column('Playtime', style='red')
+    changes_table.add_column('KPM (if playtime contributed to only one round)', style='magenta')
+    return changes_table
 
 
 class ServerParser(Protocol):
     names: set[str]
+    patterns: set[str]
     servers: dict[str, tuple[str, int]]
     server_names: list[str]
     names_info_map: dict[str, OrderedDict[str, bool]]
-    names_on_all_servers: dict[str, list[Any]]
-    excluded_servers_names_map: dict[str, set[str]]
+    names_on_all_servers: dict[str, ServerScan]
+    exclusion_index: ExclusionIndex
     timeout_time: int
     max_fails_con: int
+    name_matcher: NameMatcher
+    snapshot_store: SnapshotStore
+    scan_batch: ScanBatch
+
+    @staticmethod
+    def get_player_duration(player: a2s.Player) -> float:
+        ...
 
     @staticmethod
     def parse_player(player: a2s.Player) -> tuple[str, int, float, str]:
         ...
 
+    def apply_names_changes(self, names_changes: NamesChanges):
+        ...
+
+    def apply_config(self, settings: dict[str, Any]):
+        ...
+
+    def begin_cycle(self):
+        ...
+
+    def handle_presence(self, names_on_server: set[str], server_name: str, addr: tuple[str, int]):
+        ...
+
     def check_if_player_in_names(self, player_name) -> Optional[str]:
         ...
 
     def handle_player(self, names_on_server: set[str], server_name: str, addr: tuple[str, int], **kwargs):
         ...
 
+    def handle_players(self, players: list[a2s.Player], server_name: str, addr: tuple[str, int]) -> tuple[set[str], Optional[Table]]:
+        ...
+
     def parse_servers(self):
         ...
 
 
 class AbstractServerParser(ABC):
     names: set[str]
+    patterns: set[str]                                  # Names that are matched as patterns (see name_matching.py)
     servers: dict[str, tuple[str, int]]                 # Map of server names to their addrs
     server_names: list[str]
     names_info_map: dict[str, OrderedDict[str, bool]]   # Map of names to their flag maps
-    names_on_all_servers: dict[str, list[Any]]          # Server name: list containing server addr and names on the server
-    excluded_servers_names_map: dict[str, set[str]]     # Map of server addresses to names excluded
+    names_on_all_servers: dict[str, ServerScan]         # Server names to matched players on them
+    exclusion_index: ExclusionIndex                     # Exclusions of names, servers and names on servers
     timeout_time: int                                   # Maximum time for one A2S response
     max_fails_con: int                                  # Maximum amount of consecutive A2S requests' fails
+    name_matcher: NameMatcher                           # Index of normalized names. Updated with names changes
+    presence_tracker: PresenceTracker                   # Remembers where names are so only transitions are notified about
+    notify_leaves: bool
+    render_tables: bool                                 # Build and print tables of players that joined or left
+    snapshot_store: SnapshotStore                       # Players of servers from their previous scans and matches of their names
+    scan_batch: ScanBatch                               # All players of servers that responded this cycle in columns
+    _matcher_state: tuple[NameMatcher, int]             # Name matcher and its version the matches in snapshot_store are of
+    config_attributes_map = {   # SERVER_PARSERS settings that can be changed at runtime to attributes they're in
+        'TIMEOUT_TIME': 'timeout_time',
+        'MAX_FAILS_CON': 'max_fails_con',
+        'NOTIFY_LEAVES': 'notify_leaves',
+    }
+
+    @staticmethod
+    def get_player_duration(player: a2s.Player) -> float:
+        return player.duration if not isnan(player.duration) and player.duration != 0 else 1  # not 0 cuz program divides by duration later
 
     @staticmethod
     def parse_player(player: a2s.Player) -> tuple[str, int, float, str]:
@@ -88,55 +138,180 @@ class AbstractServerParser(ABC):
         """
         player_name = player.name if player.name else ''    # single line ifs for validation
         player_score = player.score if player.score else 0
-        player_duration = player.duration if not isnan(player.duration) and player.duration != 0 else 1  # not 0 cuz program divides by duration later
-        hours = int(player_duration // 3600)
-        minutes = int(player_duration // 60 % 60)
-        seconds = int(player_duration % 60)
-        playtime = f'{hours:2} H, {minutes:2} M, {seconds:2} S'
-        return player_name, player_score, player_duration, playtime
+        player_duration = AbstractServerParser.get_player_duration(player)
+        return player_name, player_score, player_duration, format_playtime(player_duration)
 
     def __init__(
             self, names=set(), servers=dict(), server_names=[], names_info_map=dict(),
-            timeout_time=TIMEOUT_TIME, max_fails_con=MAX_FAILS_CON):
-        self.names = names
+            timeout_time=TIMEOUT_TIME, max_fails_con=MAX_FAILS_CON, presence_tracker=None, notify_leaves=NOTIFY_LEAVES,
+            exclusion_index=None, snapshot_store=None, render_tables=RENDER_TABLES, patterns=set()):
+        self.names = set(names)     # copies since names changes are applied in place
+        self.patterns = set(patterns)
         self.servers = servers
         self.server_names = server_names
-        self.names_info_map = names_info_map
+        self.names_info_map = dict(names_info_map)
         self.names_on_all_servers = dict()
-        self.excluded_servers_names_map = {'__all__': set()}
+        self.exclusion_index = exclusion_index if exclusion_index is not None else ExclusionIndex()
         self.timeout_time = timeout_time
         self.max_fails_con = max_fails_con
+        self.name_matcher = NameMatcher(self.names - self.patterns, patterns=self.patterns)
+        self.presence_tracker = presence_tracker if presence_tracker is not None else PresenceTracker()
+        self.notify_leaves = notify_leaves
+        self.snapshot_store = snapshot_store if snapshot_store is not None else SnapshotStore()
+        self.render_tables = render_tables
+        self._matcher_state = (self.name_matcher, self.name_matcher.version)
+        self.scan_batch = ScanBatch(time())
+
+    def apply_names_changes(self, names_changes: NamesChanges):
+        """
+        Updates names, their flags and the matcher indexes with only what has changed since the previous cycle.
+        Only injected names can be patterns, names of links are matched literally.
+        Raises ValueError if there's an invalid name pattern (nothing is changed then).
+        """
+        if not (names_changes.added or names_changes.removed or names_changes.changed_flags):
+            return
+        names = (self.names - names_changes.removed) | names_changes.added.keys()
+        patterns = set(names_changes.patterns)
+        self.name_matcher.update(names - patterns, patterns)    # only the difference is indexed
+        self.names -= names_changes.removed
+        self.names |= names_changes.added.keys()
+        self.patterns = patterns
+        for name in names_changes.removed:
+            self.names_info_map.pop(name, None)
+        self.names_info_map |= names_changes.added | names_changes.changed_flags
+
+    def apply_config(self, settings: dict[str, Any]):
+        """
+        Applies changed SERVER_PARSERS config settings between cycles. Settings that can't be changed at runtime are ignored.
+        The name matcher is built anew only if normalization settings have changed.
+        """
+        for key, attribute in self.config_attributes_map.items():
+            if key in settings:
+                setattr(self, attribute, settings[key])
+        if 'RENOTIFY_INTERVAL' in settings:
+            self.presence_tracker.renotify_interval = settings['RENOTIFY_INTERVAL']
+        if 'JOIN_TIME_TOLERANCE' in settings:
+            self.snapshot_store.tolerance = settings['JOIN_TIME_TOLERANCE']
+        if settings.keys() & {'FOLD_HOMOGLYPHS', 'STRIP_CLAN_TAGS', 'NAME_MEMO_SIZE'}:
+            self.name_matcher = NameMatcher(
+                self.names - self.patterns, settings.get('FOLD_HOMOGLYPHS', self.name_matcher.fold_homoglyphs),
+                settings.get('STRIP_CLAN_TAGS', self.name_matcher.strip_clan_tags),
+                settings.get('NAME_MEMO_SIZE', self.name_matcher.normalize.cache_info().maxsize), self.patterns)   # type: ignore
+
+    def begin_cycle(self):
+        """
+        Prepares name matcher, snapshots and presence for a new cycle. Call it before parsing servers.
+        Cached matches of player names are forgotten if names have changed since the previous cycle.
+        """
+        self.names_on_all_servers = dict()     # scans of the previous cycle aren't kept
+        self.scan_batch = ScanBatch(time())
+        self.name_matcher.update(self.names - self.patterns, self.patterns)    # no-op if names only changed with apply_names_changes
+        if self._matcher_state != (self.name_matcher, self.name_matcher.version):
+            self.snapshot_store.clear_matches()
+            self._matcher_state = (self.name_matcher, self.name_matcher.version)
+        self.snapshot_store.prune()
+        self.presence_tracker.begin_cycle()
+
+    def handle_presence(self, names_on_server: set[str], server_name: str, addr: tuple[str, int]):
+        """
+        Records names on a server that responded (might be none) and notifies about the ones that appeared or moved to it
+        or have been on it for the renotify interval. Call it for every server that responded.
+        """
+        transitions = self.presence_tracker.observe(addr_to_ip(addr), server_name, names_on_server)
+        if transitions['appeared'] | transitions['renotify']:
+            notify_onserver(self.exclusion_index, transitions['appeared'] | transitions['renotify'], server_name, addr)
+        if transitions['moved']:
+            notify_onserver(self.exclusion_index, transitions['moved'], server_name, addr, 'moved')
+
+    def handle_leaves(self):
+        """
+        Notifies about names that left servers this cycle. Call it after all servers were parsed.
+        """
+        for address, (server_name, names) in self.presence_tracker.end_cycle().items():
+            if self.notify_leaves:
+                notify_onserver(self.exclusion_index, names, server_name, ip_to_addr(address), 'left')
+
+    def is_server_excluded(self, server_name: str) -> bool:
+        """
+        Checks if the server is excluded for all names so it's not worth requesting.
+        """
+        return self.exclusion_index.is_server_excluded(addr_to_ip(self.servers[server_name]))
 
     def check_if_player_in_names(self, player_name) -> Optional[str]:
         """
         If player_name is in names return name else None.
         Note that it does not return player_name which may be different from name.
+        Normalized player name has to end with normalized name cuz of name prefixes sometimes (see name_matching.py).
         """
-        for name in self.names:
-            if player_name.endswith(name):  # have to do it like this cuz of name prefixes sometimes
-                return name
-        return None
+        return self.name_matcher.match(player_name)
 
     def handle_player(self, names_on_server: set[str], server_name: str, addr: tuple[str, int], **kwargs):
         """
-        Adds player name to names_on_server and self.names_on_all_servers if it's in names.
+        Adds player name to names_on_server and its record to self.names_on_all_servers if it's in names.
 
         Using kwargs here because there's too much parameters.
-        kwargs: [player_name: str], [server_name: str], [playtime: str]
+        kwargs: [player_name: str], [player_score: int], [player_duration: float],
+                [name: Optional[str]] (if player name was already matched), [scan_time: float] (now by default)
         """
-        playtime, player_name, player_score = kwargs['playtime'], kwargs['player_name'], kwargs['player_score']
-        name = self.check_if_player_in_names(player_name)
+        player_name, player_score, player_duration = kwargs['player_name'], kwargs['player_score'], kwargs['player_duration']
+        name = kwargs['name'] if 'name' in kwargs else self.check_if_player_in_names(player_name)
         if name:
-            self.names_on_all_servers[server_name] = self.names_on_all_servers.get(server_name, [addr_to_ip(addr)]) + [
-                f'{player_name}, {player_score}, {playtime.strip()}']
+            server_scan = self.names_on_all_servers.get(server_name)
+            if server_scan is None:
+                server_scan = self.names_on_all_servers[server_name] = ServerScan(
+                    server_name, addr_to_ip(addr), kwargs.get('scan_time') or time())
+            server_scan.add(PlayerRecord(player_name, name, player_score, player_duration))
             if self.names_info_map[name]['on_server']:
                 names_on_server.add(player_name)
 
+    def handle_players(self, players: list[a2s.Player], server_name: str, addr: tuple[str, int]) -> tuple[set[str], Optional[Table]]:
+        """
+        Adds players of a server that responded (might be none) to the scan batch and diffs them with its previous scan. Only names of players that joined are matched,
+        the ones that stayed use cached matches. Matched players are handled with handle_player.
+        Returns names on the server and a table of players that joined and left (None if nothing has changed or tables aren't rendered).
+        """
+        address, scan_time = addr_to_ip(addr), time()
+        player_names = [player.name or '' for player in players]
+        durations = [self.get_player_duration(player) for player in players]
+        self.scan_batch.add_server(server_name, address, scan_time, player_names, (player.score or 0 for player in players), durations)
+        players_delta = self.snapshot_store.update(address, zip(player_names, durations), scan_time)
+        matches = self.snapshot_store.get_matches(address)
+        for player_name in self.snapshot_store.get_unmatched(address):
+            matches[player_name] = self.check_if_player_in_names(player_name)
+        names_on_server = set()     # type: ignore # all names on one server
+        for player in players:
+            name = matches[player.name or '']
+            if name is not None:
+                player_name, player_score, player_duration, _ = self.parse_player(player)
+                self.handle_player(names_on_server, server_name, addr, player_name=player_name, player_score=player_score,
+                                   player_duration=player_duration, name=name, scan_time=scan_time)
+        if not self.render_tables:
+            return names_on_server, None
+        return names_on_server, self.get_changes_table(server_name, players, players_delta, scan_time)
+
+    def get_changes_table(self, server_name: str, players: list[a2s.Player], players_delta: PlayersDelta, scan_time: float
+                          ) -> Optional[Table]:
+        """
+        Gets a table of players (sorted by score) that joined and then of players that left. None if nothing has changed.
+        """
+        if not players_delta:
+            return None
+        changes_table = get_changes_table_scaffold(server_name)
+        joined = set(players_delta.joined)
+        for player in sorted(players, key=lambda d: d.score, reverse=True):
+            if (player.name or '', scan_time - self.get_player_duration(player)) in joined:
+                player_name, player_score, player_duration, playtime = self.parse_player(player)
+                changes_table.add_row('+', remove_diacritics(player_name), str(player_score), playtime,
+                                      f'{player_score*60/player_duration:.2f}', style='green')
+        for player_name, join_time in players_delta.left:
+            changes_table.add_row('-', remove_diacritics(player_name), '', format_playtime(scan_time - join_time), '', style='red')
+        return changes_table
+
     @abstractmethod
     def parse_servers(self):
         """
-        Parses gameservers implementing A2S protocol, prints players tables to console and notifies when name in names is found.
-        Returns matched names on all servers.
+        Parses gameservers implementing A2S protocol, prints changes of players to console and notifies when name in names is found.
+        Returns scans of servers with matched players on them by server names.
         """
 
 
@@ -144,22 +319,16 @@ class SyncServerParser(AbstractServerParser):
     def parse_server(self, server_name, fails_con) -> Optional[int]:
         addr = self.servers[server_name]
         try:
-            players = sorted(a2s.players(addr), key=lambda d: d.score, reverse=True)
+            players = a2s.players(addr)
         except (TimeoutError, OSError) as e:
-            CONSOLE.print(server_name, f'[{repr(type(e))[8:-2].upper()}:FAIL] {fails_con+1} of {self.max_fails_con}', style='red bold')
+            SCAN_LOG.info(server_name, f'[{repr(type(e))[8:-2].upper()}:FAIL] {fails_con+1} of {self.max_fails_con}', style='red bold')
             return -1
-        if not players:
+        names_on_server, changes_table = self.handle_players(players, server_name, addr)
+        if changes_table is None:   # only changes are printed
+            self.handle_presence(names_on_server, server_name, addr)
             return None
-        players.sort(key=lambda d: d.score, reverse=True)
-        players_table = get_players_table_scaffold(server_name)
-        names_on_server = set()     # type: ignore # all names on one server
-        for player in players:
-            player_name, player_score, player_duration, playtime = self.parse_player(player)
-            players_table.add_row(remove_diacritics(player_name), str(player_score), playtime, f'{player_score*60/player_duration:.2f}')
-            self.handle_player(names_on_server, server_name, addr,
-                               playtime=playtime, player_name=player_name, player_score=player_score)
         try:
-            CONSOLE.print(players_table, end='\n\n')
+            CONSOLE.print(changes_table, end='\n\n')
         except MarkupError:         # names with forward slashes may cause this error
             CONSOLE.print('\t\t\t\tBAD NAME ON SERVER', style="red on white")
         if names_on_server:
@@ -167,29 +336,45 @@ class SyncServerParser(AbstractServerParser):
                 CONSOLE.print(names_on_server)
             except MarkupError:     # names with forward slashes may cause this error
                 CONSOLE.print('\t\t\t\tBAD NAME ON SERVER', style="red on white")
-            notify_onserver(self.excluded_servers_names_map, names_on_server, server_name, addr)
+        self.handle_presence(names_on_server, server_name, addr)
         return None
 
-    def parse_servers(self) -> dict[str, list]:
+    def parse_servers(self) -> dict[str, ServerScan]:
+        self.begin_cycle()
         for i in range(0, len(self.server_names)):
+            if self.is_server_excluded(self.server_names[i]):
+                continue
             for fails_con in range(self.max_fails_con):
                 server_name = self.server_names[i]
-                CONSOLE.print(f'{asctime()} {server_name}')
+                SCAN_LOG.debug(server_name)
                 if self.parse_server(server_name, fails_con) != -1:
                     break
+        self.handle_leaves()
         return self.names_on_all_servers
 
 
 class AsyncServerParser(AbstractServerParser):
     request_cooldown: float                             # Time to sleep for after each request
 
-    def __init__(self, names=set(), servers=dict(), server_names=[], names_info_map=dict(), timeout_time=TIMEOUT_TIME, max_fails_con=MAX_FAILS_CON, request_cooldown=ASYNC_REQUEST_COOLDOWN):
-        super().__init__(names, servers, server_names, names_info_map, timeout_time, max_fails_con)
+    def __init__(self, names=set(), servers=dict(), server_names=[], names_info_map=dict(), timeout_time=TIMEOUT_TIME, max_fails_con=MAX_FAILS_CON, request_cooldown=ASYNC_REQUEST_COOLDOWN,
+                 presence_tracker=None, notify_leaves=NOTIFY_LEAVES, exclusion_index=None, snapshot_store=None, render_tables=RENDER_TABLES,
+                 patterns=set()):
+        super().__init__(names, servers, server_names, names_info_map, timeout_time, max_fails_con, presence_tracker, notify_leaves,
+                         exclusion_index, snapshot_store, render_tables, patterns)
         self.request_cooldown = request_cooldown
 
-    def parse_servers(self) -> dict[str, list]:
-        self.names_on_all_servers = dict()
-        return asyncio.run(self.main())
+    def apply_config(self, settings: dict[str, Any]):
+        if 'MAX_REQUESTS_PER_SECOND' in settings and not settings['MAX_REQUESTS_PER_SECOND'] > 0:
+            raise ValueError('Max requests per second must be positive.')
+        super().apply_config(settings)
+        if 'MAX_REQUESTS_PER_SECOND' in settings:
+            self.request_cooldown = 1/settings['MAX_REQUESTS_PER_SECOND']
+
+    def parse_servers(self) -> dict[str, ServerScan]:
+        self.begin_cycle()
+        names_on_all_servers = asyncio.run(self.main())
+        self.handle_leaves()
+        return names_on_all_servers
 
     async def parse_server(self, server_name, fails_con=0) -> Optional[Table] | Literal[-1]:
         addr = self.servers[server_name]
@@ -197,26 +382,16 @@ class AsyncServerParser(AbstractServerParser):
         try:    # could have just written this [{repr(type(e))[8:-2].upper()}:FAIL]
             players = await a2s.aplayers(addr, timeout=self.timeout_time)
         except (asyncio.TimeoutError, OSError, a2s.BufferExhaustedError, a2s.BrokenMessageError) as e:
-            CONSOLE.print(server_name, f'[{repr(type(e))[8:-2].split(".")[-1].upper()}:FAIL] {fails_con} of {self.max_fails_con}', style='red bold')
+            SCAN_LOG.info(server_name, f'[{repr(type(e))[8:-2].split(".")[-1].upper()}:FAIL] {fails_con} of {self.max_fails_con}', style='red bold')
             return -1
-        if not players:
-            return None
-        players.sort(key=lambda d: d.score, reverse=True)
-        players_table = get_players_table_scaffold(server_name)
-        names_on_server = set()     # type: ignore # all names on one server
-        for player in players:
-            player_name, player_score, player_duration, playtime = self.parse_player(player)
-            players_table.add_row(remove_diacritics(player_name), str(player_score), playtime, f'{player_score*60/player_duration:.2f}')
-            self.handle_player(names_on_server, server_name, addr,
-                               playtime=playtime, player_name=player_name, player_score=player_score, player_duration=player_duration)
-        # console.print(players_table)
-        if names_on_server:
+        names_on_server, changes_table = self.handle_players(players, server_name, addr)
+        if names_on_server and changes_table is not None:   # only changes are printed
             try:
                 CONSOLE.print(server_name, addr, names_on_server)
             except MarkupError:
                 CONSOLE.print('BAD SERVER NAME OR NAMES ON SERVER', addr)
-            notify_onserver(self.excluded_servers_names_map, names_on_server, server_name, addr)
-        return players_table
+        self.handle_presence(names_on_server, server_name, addr)
+        return changes_table
 
     async def get_players_table(self, server_name) -> Optional[Table] | Literal[-1]:
         for fails_con in range(1, self.max_fails_con+1):
@@ -226,13 +401,15 @@ class AsyncServerParser(AbstractServerParser):
             sleep(self.request_cooldown)    # affects all subsequent requests
         return None
 
-    async def main(self) -> dict[str, list]:
+    async def main(self) -> dict[str, ServerScan]:
         tasks = []
         # names_on_all_servers = dict()   # noqa: F841      <- this blocks flake8 linting error
-        CONSOLE.print(f'{asctime()} {__name__} {__package__}')
+        SCAN_LOG.debug(__name__, __package__)
         for i in range(len(self.server_names)):
             server_name = self.server_names[i]
-            CONSOLE.print(f'{asctime()} {server_name}')
+            if self.is_server_excluded(server_name):
+                continue
+            SCAN_LOG.debug(server_name)
             tasks.append(asyncio.create_task(self.get_players_table(server_name)))
             await asyncio.sleep(self.request_cooldown)  # forces coro switch which might request while awaiting cooldown
             # sleep(self.request_cooldown)
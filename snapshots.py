@@ -0,0 +1,194 @@
+"""
+This is a module that keeps snapshots of players on servers between cycles so only changes of their populations are processed.
+A player in a snapshot is a (name, join time estimate) pair. Join time is estimated as scan time minus player's duration,
+so one player gets about the same estimate every scan and a player who rejoined gets a later one.
+Estimates of one player drift by network latency and rounding of durations so they're compared with JOIN_TIME_TOLERANCE.
+
+Matches of player names to tracked names are cached per server too so only players that joined are matched
+(all players again only when tracked names change).
+Snapshots aren't saved: everyone joins on the first scan after a restart.
+"""
+
+from time import time
+from typing import Iterable, NamedTuple, Optional
+
+from helpers import CONFIG
+
+
+JOIN_TIME_TOLERANCE = CONFIG['SERVER_PARSERS']['JOIN_TIME_TOLERANCE']   # in secs
+SNAPSHOT_TTL = CONFIG['SERVER_PARSERS']['PRESENCE_TTL']                 # in secs. Same as presence's since they go together
+
+
+class PlayersDelta(NamedTuple):
+    """
+    Changes of players on a server between two scans. Players are (player name, join time estimate) pairs.
+    """
+    joined: list[tuple[str, float]]
+    left: list[tuple[str, float]]
+    stayed: list[tuple[str, float]]
+
+    def __bool__(self):
+        return bool(self.joined or self.left)
+
+
+def get_players_map(players: Iterable[tuple[str, float]], scan_time: float) -> dict[str, list[float]]:
+    """
+    Gets a snapshot (map of player names to sorted join time estimates) of players' names and durations (in secs).
+    """
+    players_map: dict[str, list[float]] = {}
+    for player_name, duration in players:
+        players_map.setdefault(player_name, []).append(scan_time - duration)
+    for join_times in players_map.values():
+        join_times.sort()
+    return players_map
+
+
+def diff_players_maps(old_players_map: dict[str, list[float]], new_players_map: dict[str, list[float]],
+                      tolerance: float = JOIN_TIME_TOLERANCE) -> PlayersDelta:
+    """
+    Pairs players of two snapshots of one server by names and join times that differ by no more than tolerance.
+    Unpaired players of the new snapshot joined, of the old one left. Several players might have one name (ex. unnamed ones).
+    """
+    joined, left, stayed = [], [], []
+    for player_name, join_times in new_players_map.items():
+        old_join_times = old_players_map.get(player_name, [])
+        i = 0
+        for join_time in join_times:    # both are sorted so pairing is a merge
+            while i < len(old_join_times) and old_join_times[i] < join_time - tolerance:
+                left.append((player_name, old_join_times[i]))
+                i += 1
+            if i < len(old_join_times) and old_join_times[i] <= join_time + tolerance:
+                stayed.append((player_name, join_time))
+                i += 1
+            else:
+                joined.append((player_name, join_time))
+        left.extend((player_name, join_time) for join_time in old_join_times[i:])
+    for player_name, old_join_times in old_players_map.items():
+        if player_name not in new_players_map:
+            left.extend((player_name, join_time) for join_time in old_join_times)
+    return PlayersDelta(joined, left, stayed)
+
+
+class SnapshotStore:
+    """
+    Keeps the last snapshot of players of every server that responded and matches of their names.
+    Call update with players of every server that responded, then match only its get_unmatched player names.
+    """
+    snapshots: dict[str, dict[str, list[float]]]        # Addresses to the last snapshots of their servers
+    scan_times: dict[str, float]                        # Addresses to times of the last snapshots
+    matches: dict[str, dict[str, Optional[str]]]        # Addresses to player names on servers to names they match (None if none)
+    tolerance: float
+    ttl: float
+
+    def __init__(self, tolerance=JOIN_TIME_TOLERANCE, ttl=SNAPSHOT_TTL):
+        self.snapshots = {}
+        self.scan_times = {}
+        self.matches = {}
+        self.tolerance = tolerance
+        self.ttl = ttl
+
+    def update(self, address: str, players: Iterable[tuple[str, float]], scan_time: Optional[float] = None) -> PlayersDelta:
+        """
+        Replaces the snapshot of a server with its players' names and durations and gets what has changed.
+        Matches of player names that aren't on the server anymore are forgotten.
+        """
+        scan_time = time() if scan_time is None else scan_time
+        players_map = get_players_map(players, scan_time)
+        players_delta = diff_players_maps(self.snapshots.get(address, {}), players_map, self.tolerance)
+        self.snapshots[address] = players_map
+        self.scan_times[address] = scan_time
+        matches = self.matches.setdefault(address, {})
+        for player_name, _ in players_delta.left:
+            if player_name not in players_map:
+                matches.pop(player_name, None)
+        return players_delta
+
+    def get_unmatched(self, address: str) -> set[str]:
+        """
+        Gets player names on a server that weren't matched yet.
+        """
+        return self.snapshots.get(address, {}).keys() - self.matches.get(address, {}).keys()
+
+    def get_matches(self, address: str) -> dict[str, Optional[str]]:
+        return self.matches.setdefault(address, {})
+
+    def clear_matches(self):
+        """
+        Forgets all matches. Call it when tracked names change.
+        """
+        self.matches = {}
+
+    def prune(self, now: Optional[float] = None) -> list[str]:
+        """
+        Forgets snapshots of servers that didn't respond for ttl. Returns their addresses.
+        """
+        now = time() if now is None else now
+        stale_addresses = [address for address, scan_time in self.scan_times.items() if now - scan_time > self.ttl]
+        for address in stale_addresses:
+            del self.snapshots[address], self.scan_times[address]
+            self.matches.pop(address, None)
+        return stale_addresses
+
+
+# TESTING/BENCHMARKING
+
+
+def test_snapshots_procedure():
+    print('[START SNAPSHOTS TEST PROCEDURE]')
+    store = SnapshotStore(tolerance=5, ttl=600)
+    address = '127.0.0.1:27015'
+    players_delta = store.update(address, [('a', 100), ('b', 50), ('', 10), ('', 20)], scan_time=1000)
+    assert sorted(players_delta.joined) == [('', 980), ('', 990), ('a', 900), ('b', 950)] and not players_delta.left
+    assert store.get_unmatched(address) == {'a', 'b', ''}
+    store.get_matches(address).update({'a': 'A', 'b': None, '': None})
+    assert not store.get_unmatched(address)
+
+    # 60 secs later durations grew by about 60 (with jitter), b rejoined, one unnamed left, c joined
+    players_delta = store.update(address, [('a', 161.5), ('b', 3), ('', 69), ('c', 1)], scan_time=1060)
+    assert sorted(players_delta.stayed) == [('', 991), ('a', 898.5)], players_delta
+    assert sorted(players_delta.joined) == [('b', 1057), ('c', 1059)], players_delta
+    assert sorted(players_delta.left) == [('', 980), ('b', 950)], players_delta
+    assert store.get_unmatched(address) == {'c'} and 'b' in store.get_matches(address)
+
+    # nothing changed
+    players_delta = store.update(address, [('a', 221), ('b', 63), ('', 129), ('c', 61)], scan_time=1120)
+    assert not players_delta and len(players_delta.stayed) == 4
+
+    # everyone left
+    players_delta = store.update(address, [], scan_time=1180)
+    assert len(players_delta.left) == 4 and not store.get_matches(address)
+
+    store.clear_matches()
+    store.update(address, [('a', 1)], scan_time=1200)
+    assert store.get_unmatched(address) == {'a'}
+    assert store.prune(now=1700) == [] and store.prune(now=1801) == [address] and not store.snapshots
+    print('Joins, leaves, rejoins and stays are told apart')
+    print('[END SNAPSHOTS TEST PROCEDURE]')
+
+
+def benchmark_snapshots_procedure(players_amount=64, servers_amount=5000, churn=2):
+    """
+    Time of diffing snapshots of all servers in a cycle where churn players of every server changed.
+    """
+    from timeit import timeit
+    store = SnapshotStore()
+    servers_players = {f'10.0.{i // 256}.{i % 256}:27015': [(f'player {j}', j * 10.) for j in range(players_amount)]
+                       for i in range(servers_amount)}
+    for address, players in servers_players.items():
+        store.update(address, players, scan_time=0)
+    scan_time = 60.
+
+    def cycle():
+        nonlocal scan_time
+        scan_time += 60
+        for address, players in servers_players.items():
+            players[:] = [(f'player {scan_time} {j}', 1.) for j in range(churn)] + [
+                (name, duration + 60) for name, duration in players[churn:]]
+            store.update(address, players, scan_time)
+    time_taken = timeit(cycle, number=3) / 3
+    print(f'{servers_amount} servers with {players_amount} players and churn {churn}: {time_taken:.3f} s per cycle')
+
+
+if __name__ == '__main__':
+    test_snapshots_procedure()
+    benchmark_snapshots_procedure()
@@ -11,6 +11,8 @@ from os.path import join
 
 from rich.traceback import install
 from cache.cacheable_data import PickleCacheableData
+from cache.write_behind_cacheable_data import WriteBehindCacheableData
+from cache.sharing import SHARED, HOT_COPY
 
 from name_parsers import AsyncNameParser, SyncNameParser
 from helpers import BASE_DIR
@@ -22,4 +24,4 @@ install()
 if __name__ == '__main__':
     main(AsyncServerNameParser(),
          SyncServerParser(),
-         AsyncNameParser(PickleCacheableData(join(BASE_DIR, 'data/async_names_cache.bin')), is_silent=True))
+         AsyncNameParser(WriteBehindCacheableData(PickleCacheableData(join(BASE_DIR, 'data/async_names_cache.bin'), shared=SHARED, hot_copy=HOT_COPY)), is_silent=True))
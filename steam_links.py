@@ -0,0 +1,161 @@
+"""
+This is a module with helpers for Steam account links: parsing, canonicalizing them and resolving vanity names to steamid64.
+
+There are two types of links:
+    https://steamcommunity.com/profiles/<steamid64>
+    https://steamcommunity.com/id/<vanity name>
+Vanity names can be changed by their owners but steamid64 can't, so resolved steamids are cached.
+Canonical link of an account is its /profiles/ link if its steamid is known. So all variants of links to one account
+(http/https, www, trailing slashes, vanity name case, /id/ and /profiles/) are requested and cached once.
+"""
+
+import asyncio
+import re
+from typing import Callable, Optional
+
+import aiohttp
+
+from cache.abstract_cacheable_data import CacheableData
+from cache.cacheable_data import PickleCacheableData
+from helpers import CONFIG, NAMES_PATH
+from scan_log import SCAN_LOG
+
+
+STEAM_API_KEY = CONFIG['NAME_PARSERS']['STEAM_API_KEY']     # https://steamcommunity.com/dev/apikey
+RESOLVE_VANITY_URL = CONFIG['NAME_PARSERS']['RESOLVE_VANITY_URL']
+VANITY_XML_URL = CONFIG['NAME_PARSERS']['VANITY_XML_URL']   # used to resolve vanity names without STEAM_API_KEY
+STEAMIDS_PATH = NAMES_PATH + '_steamids_cache_prod.bin'
+
+STEAM_COMMUNITY_URL = 'https://steamcommunity.com'
+STEAM_LINK_PATTERN = re.compile(r'^(?:https?://)?(?:www\.)?steamcommunity\.com/(profiles|id)/([^/?#]+)', re.IGNORECASE)
+STEAMID64_XML_PATTERN = re.compile(rb'<steamID64>\s*(\d+)\s*</steamID64>')
+
+
+def parse_steam_link(link: str) -> Optional[tuple[str, str]]:
+    """
+    Parses link into its type ('profiles' or 'id') and steamid64 or vanity name. Returns None if it's not a Steam account link.
+    """
+    match = STEAM_LINK_PATTERN.match(link.strip())
+    if not match:
+        return None
+    return match.group(1).lower(), match.group(2)
+
+
+def canonicalize_link(link: str) -> str:
+    """
+    Normalizes a link without resolving it: https, no www, no trailing slash, query or fragment, lowercase vanity name.
+    Links that aren't Steam account links are only stripped.
+    """
+    parsed_link = parse_steam_link(link)
+    if parsed_link is None:
+        return link.strip()
+    link_type, value = parsed_link
+    return f'{STEAM_COMMUNITY_URL}/{link_type}/{value.lower() if link_type == "id" else value}'
+
+
+def merge_links_flags(links_flags_map: dict[str, dict[str, bool]], get_canonical_link: Callable[[str], str] = canonicalize_link
+                      ) -> dict[str, dict[str, bool]]:
+    """
+    Gets links flags map keyed by canonical links. Flags of links to the same account are merged: a flag is on if it's on in any of them.
+    """
+    canonical_links_flags_map: dict[str, dict[str, bool]] = {}
+    for link, flags in links_flags_map.items():
+        merged_flags = canonical_links_flags_map.setdefault(get_canonical_link(link), {})
+        for flag, value in flags.items():
+            merged_flags[flag] = merged_flags.get(flag, False) or value
+    return canonical_links_flags_map
+
+
+class SteamIdResolver:
+    """
+    Gets steamid64 of links. Vanity names are resolved once and cached by their lowercase form (they're case insensitive).
+    They're resolved with the Steam Web API if there's an API key, otherwise with XML version of profile pages.
+    """
+    steamids_map: CacheableData     # Cacheable map of vanity names to steamid64
+    resolve_vanity_url: str         # ResolveVanityURL endpoint (configurable for testing with a local stand-in server)
+    vanity_xml_url: str             # Profile XML URL template with {vanity} placeholder
+    api_key: str
+    not_found: set[str]             # Vanity names that don't exist. Aren't requested again until restart
+
+    def __init__(self, steamids_map=None, resolve_vanity_url=RESOLVE_VANITY_URL, api_key=STEAM_API_KEY, vanity_xml_url=VANITY_XML_URL):
+        self.steamids_map = steamids_map if steamids_map is not None else PickleCacheableData(STEAMIDS_PATH)
+        self.resolve_vanity_url = resolve_vanity_url
+        self.vanity_xml_url = vanity_xml_url
+        self.api_key = api_key
+        self.not_found = set()
+
+    def get_steamid(self, link: str) -> Optional[str]:
+        """
+        Gets steamid64 of the link without requests. None if it's a vanity link that wasn't resolved yet.
+        """
+        parsed_link = parse_steam_link(link)
+        if parsed_link is None:
+            return None
+        link_type, value = parsed_link
+        if link_type == 'profiles':
+            return value
+        return self.steamids_map.get(value.lower())
+
+    def get_canonical_link(self, link: str) -> str:
+        """
+        Gets /profiles/ link of the account if its steamid is known. Otherwise normalized link.
+        """
+        steamid = self.get_steamid(link)
+        if steamid is None:
+            return canonicalize_link(link)
+        return f'{STEAM_COMMUNITY_URL}/profiles/{steamid}'
+
+    def get_unresolved_vanities(self, links) -> set[str]:
+        """
+        Gets lowercase vanity names of links that weren't resolved yet and weren't found not to exist.
+        """
+        unresolved_vanities = set()
+        for link in links:
+            parsed_link = parse_steam_link(link)
+            if parsed_link and parsed_link[0] == 'id' and self.get_steamid(link) is None and parsed_link[1].lower() not in self.not_found:
+                unresolved_vanities.add(parsed_link[1].lower())
+        return unresolved_vanities
+
+    async def resolve_vanity(self, vanity: str, session: aiohttp.ClientSession) -> Optional[str]:
+        if not self.api_key:
+            async with session.get(self.vanity_xml_url.format(vanity=vanity)) as reqt:
+                match = STEAMID64_XML_PATTERN.search(await reqt.read())
+            return match.group(1).decode() if match else None
+        async with session.get(self.resolve_vanity_url, params={'key': self.api_key, 'vanityurl': vanity}) as reqt:
+            response = (await reqt.json(content_type=None))['response']
+        if response.get('success') != 1:
+            return None
+        return response['steamid']
+
+    async def resolve(self, links, session: aiohttp.ClientSession, max_fails_con: int = 1) -> dict[str, str]:
+        """
+        Resolves steamid64 of links. Unknown vanity names are requested concurrently and cached.
+        Returns a map of links to their steamid64. Links that couldn't be resolved aren't in it.
+        """
+        unresolved_vanities = self.get_unresolved_vanities(links)
+        if unresolved_vanities:
+            vanities = list(unresolved_vanities)
+            for fails_con in range(max_fails_con):
+                results = await asyncio.gather(*(self.resolve_vanity(vanity, session) for vanity in vanities), return_exceptions=True)
+                failed = []
+                for vanity, steamid in zip(vanities, results):
+                    if isinstance(steamid, (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError)):
+                        failed.append(vanity)
+                    elif isinstance(steamid, BaseException):
+                        raise steamid
+                    elif steamid is not None:
+                        self.steamids_map.set(vanity, steamid)
+                    else:
+                        self.not_found.add(vanity)
+                        SCAN_LOG.warning('[VANITY NAME NOT FOUND]', vanity)
+                if not failed:
+                    break
+                SCAN_LOG.info(f'[{len(failed)} VANITY NAMES NOT RESOLVED] {fails_con+1} of {max_fails_con}')
+                vanities = failed
+            self.steamids_map.update_external_cache()
+        steamids = {}
+        for link in links:
+            steamid = self.get_steamid(link)
+            if steamid is not None:
+                steamids[link] = steamid
+        return steamids